@@ -0,0 +1,165 @@
+# cache.py
+"""
+Content-addressed cache of generation results.
+
+Entries are keyed on a hash of everything that determines the output (see
+cache_key()) and point at the already uploaded GCS object, so a hit only needs
+a freshly signed URL. Two tiers:
+
+  * memory: a bounded LRU of entry metadata;
+  * disk:   <root>/<key[:2]>/<key>.json (+ the .ply) with size-based LRU
+            eviction, so the cache survives restarts and the PLY can be
+            re-uploaded if needed.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def cache_key(params: Dict[str, Any]) -> str:
+    """sha256 over a canonical JSON encoding of the generation parameters."""
+    blob = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def _same_file(a: Path, b: Path) -> bool:
+    # Already linked: replacing one hard link with another of the same file is a no-op.
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+
+class ResultCache:
+    def __init__(
+        self,
+        root: Path,
+        max_memory_entries: int = 1024,
+        max_disk_bytes: int = 1 << 30,
+        max_age: Optional[float] = None,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.max_age = max_age
+
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = dict(
+            memory_hits=0, disk_hits=0, misses=0, puts=0, memory_evictions=0, disk_evictions=0
+        )
+        self._disk_bytes = sum(p.stat().st_size for p in self.root.glob("*/*") if p.is_file())
+
+    def _paths(self, key: str):
+        d = self.root / key[:2]
+        return d / f"{key}.json", d / f"{key}.ply"
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return self.max_age is not None and time.time() - entry["created"] > self.max_age
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the entry metadata (incl. object_path) or None on a miss."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry):
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return dict(entry)
+
+            meta_path, ply_path = self._paths(key)
+            try:
+                entry = json.loads(meta_path.read_text())
+            except (OSError, ValueError):
+                entry = None
+            if entry is None or self._expired(entry):
+                self._counters["misses"] += 1
+                return None
+            now = time.time()
+            for p in (meta_path, ply_path):
+                try:
+                    os.utime(p, (now, now))  # LRU order for disk eviction
+                except OSError:
+                    pass
+            self._remember(key, entry)
+            self._counters["disk_hits"] += 1
+            return dict(entry)
+
+    def put(self, key: str, object_path: str, ply_path: Optional[Path] = None, **extra) -> Dict[str, Any]:
+        entry = {"key": key, "object_path": object_path, "created": time.time(), **extra}
+        meta_path, cached_ply = self._paths(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            # Re-putting a key replaces its files, whose sizes are already counted.
+            added = -_file_size(meta_path)
+            if ply_path is not None and Path(ply_path).exists() and not _same_file(ply_path, cached_ply):
+                added -= _file_size(cached_ply)
+                tmp = cached_ply.with_suffix(".tmp")
+                try:
+                    os.link(ply_path, tmp)
+                except OSError:
+                    shutil.copyfile(ply_path, tmp)
+                os.replace(tmp, cached_ply)
+                added += cached_ply.stat().st_size
+            meta_path.write_text(json.dumps(entry))
+            added += meta_path.stat().st_size
+            self._disk_bytes += added
+            self._remember(key, entry)
+            self._counters["puts"] += 1
+            self._evict_disk()
+        return entry
+
+    def ply_path(self, key: str) -> Optional[Path]:
+        """The cached local copy of an entry's PLY, if it is still on disk."""
+        path = self._paths(key)[1]
+        return path if path.exists() else None
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["memory_evictions"] += 1
+
+    def _evict_disk(self):
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        metas = sorted(self.root.glob("*/*.json"), key=lambda p: p.stat().st_mtime)
+        for meta_path in metas:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            for p in (meta_path, meta_path.with_suffix(".ply")):
+                try:
+                    size = p.stat().st_size
+                    p.unlink()
+                    self._disk_bytes -= size
+                except OSError:
+                    pass
+            # The uploaded object is still valid, so a memory entry may outlive its disk copy.
+            self._counters["disk_evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = lookups - self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": hits / lookups if lookups else None,
+                "memory_entries": len(self._memory),
+                "memory_capacity": self.max_memory_entries,
+                "disk_bytes": self._disk_bytes,
+                "disk_capacity_bytes": self.max_disk_bytes,
+            }
@@ -0,0 +1,727 @@
+# engine.py
+"""
+Long-lived Point-E inference engine.
+
+Models are loaded once (in a background thread, so the API can come up and
+report readiness), kept warm, and requests are served by a fixed number of
+worker threads pulling from a bounded queue. Loading builds each model without
+weights and backs it with the memory-mapped checkpoint: no random init, no
+copy, and processes on one host share the weights' pages.
+On many-core CPU hosts, workers.WorkerPool runs one engine per group of
+cores, in processes forked after the models are loaded.
+
+Each worker micro-batches: it takes the oldest request, then gathers any other
+queued requests with compatible sampling settings (up to max_batch_size,
+waiting at most batch_window seconds) and runs them as one batched diffusion.
+Requests can observe every sampling step through on_progress and be cancelled
+mid-run through cancel_event.
+
+Batches are traced (see telemetry): queue wait, batch size and every span of
+the run, down to each stage's solve (and single solver steps with
+TRACE_STEPS), are attributed to the trace of each request in the batch, and a
+request can ask for a torch.profiler capture.
+
+A job's base-stage output can be fed back in (GenerationRequest.base) to run
+only the upsampler, e.g. with a new seed or point count: refinements skip
+the guided base stage, and variants of one base batch together like any
+other requests. Point counts above 4096 run several upsampler passes per
+request and keep a farthest-point subset of the new points.
+
+Named LoRA adapters (e.g. styles) are merged into the shared base model on
+demand (lora.registry.AdapterRegistry): a batch samples with exactly one
+adapter at the full speed of the base model, and switching adapters between
+batches costs one in-place weight update instead of a model reload.
+"""
+import hashlib
+import math
+import queue
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+# Vendored point-e: <repo>/backend/vendor/point-e (contains top-level package folder `point_e`)
+_BACKEND_DIR = Path(__file__).resolve().parent.parent
+_VENDORED_POINT_E_DIR = _BACKEND_DIR / "vendor" / "point-e"
+for _path in (_VENDORED_POINT_E_DIR, _BACKEND_DIR):  # backend/ for the `lora` package
+    if str(_path) not in sys.path:
+        sys.path.insert(0, str(_path))
+
+from point_e.diffusion.configs import DIFFUSION_CONFIGS, diffusion_from_config
+from point_e.diffusion.k_diffusion import SAMPLERS
+from point_e.diffusion.sampler import PointCloudSampler
+from point_e.models.clip_cache import cache_clip_embeddings
+from point_e.models.configs import MODEL_CONFIGS, model_from_config
+from point_e.models.inference import optimize_for_inference
+from point_e.models.download import default_cache_dir, load_checkpoint
+from point_e.models.meta_init import check_materialized, empty_weights
+from point_e.util import tracing
+from point_e.util.point_cloud import PointCloud
+from point_e.util.spatial import farthest_point_sample_batch
+
+from lora.registry import AdapterRegistry
+
+from .telemetry import BATCH_SIZE, QUEUE_WAIT, Trace, use_traces
+
+
+BASE_POINTS = 1024
+UPSAMPLED_POINTS = 4096 - 1024  # added by one upsampler pass
+
+
+class EngineNotReady(RuntimeError):
+    """Models are still loading (or failed to load)."""
+
+
+class EngineBusy(RuntimeError):
+    """The request queue is full; the caller should retry later."""
+
+
+class GenerationCancelled(RuntimeError):
+    """The request was cancelled before sampling finished."""
+
+
+class CancelEvent(threading.Event):
+    """
+    A cancel_event that also runs callbacks once set, e.g. to pass the
+    cancellation on to a worker process (see workers.WorkerPool) right away.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks: List[Callable[[], None]] = []
+        self._callbacks_lock = threading.Lock()
+
+    def add_callback(self, fn: Callable[[], None]):
+        """Run fn when the event is set; right away if it already is."""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def set(self):
+        super().set()
+        with self._callbacks_lock:
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn()
+
+
+@dataclass
+class Progress:
+    stage: int                # 0-based stage index
+    num_stages: int
+    step: int                 # 1-based step within the stage
+    total_steps: int
+    samples: torch.Tensor     # [C x N] current pred_xstart for this request
+    stage_done: bool = False  # True once for the final sample of each stage
+
+
+@dataclass
+class GenerationRequest:
+    prompt: str
+    seed: Optional[int] = None
+    guidance: Optional[float] = None
+    no_upsample: bool = False
+    # Per-stage Karras solver names (see SAMPLERS) and step counts; a single
+    # value applies to every stage, None means the engine default.
+    sampler: Optional[Sequence[str]] = None
+    steps: Optional[Sequence[int]] = None
+    # Name of a registered LoRA adapter to sample the base stage with
+    adapter: Optional[str] = None
+    # A saved base-stage output (BASE_POINTS points) to resume from: only the
+    # upsampler runs, and prompt, guidance and adapter are ignored.
+    base: Optional[PointCloud] = field(default=None, repr=False)
+    # Points in the final cloud (default: BASE_POINTS + UPSAMPLED_POINTS).
+    num_points: Optional[int] = None
+    # Per-request hooks; they don't affect sampling, so batch_key() ignores them.
+    on_progress: Optional[Callable[[Progress], None]] = field(default=None, repr=False)
+    cancel_event: Optional[threading.Event] = field(default=None, repr=False)
+    # Collects the request's spans (see telemetry); a batch is attributed to all its requests.
+    trace: Optional[Trace] = field(default=None, repr=False)
+    # If set, write a torch.profiler (Chrome trace) capture of the request's batch here.
+    profile: Optional[str] = None
+    enqueued: float = field(default=0.0, init=False, repr=False)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+
+class _RequestQueue(queue.Queue):
+    """A queue.Queue whose consumers can hand items back to the front."""
+
+    def put_front(self, items: Sequence):
+        """Requeue items (in order) ahead of everything else; maxsize doesn't apply."""
+        if not items:
+            return
+        with self.not_empty:
+            self.queue.extendleft(reversed(items))
+            self.unfinished_tasks += len(items)
+            self.not_empty.notify(len(items))
+
+
+def default_device() -> torch.device:
+    if torch.cuda.is_available(): return torch.device("cuda")
+    if torch.backends.mps.is_available(): return torch.device("mps")
+    return torch.device("cpu")
+
+
+class InferenceEngine:
+    def __init__(
+        self,
+        device: Optional[torch.device] = None,
+        base_name: str = "base40M-textvec",
+        upsampler_name: str = "upsample",
+        concurrency: int = 1,
+        max_queue: int = 8,
+        default_guidance: float = 3.0,
+        num_threads: Optional[int] = None,
+        max_batch_size: int = 4,
+        batch_window: float = 0.01,
+        clip_cache_bytes: int = 256 * 2**20,
+        clip_cache_dir: Optional[str] = None,
+        default_sampler: Sequence[str] = ("heun",),
+        default_steps: Sequence[int] = (64,),
+        max_steps: int = 256,
+        inference_dtype: Optional[str] = None,
+        quantize: bool = False,
+        compile: Optional[str] = None,
+        adapters: Optional[Mapping[str, str]] = None,
+        adapter_alpha: float = 16,
+        max_points: int = 16384,
+    ):
+        assert concurrency > 0 and max_queue > 0 and max_batch_size > 0
+        self.device = device or default_device()
+        self.base_name = base_name
+        self.upsampler_name = upsampler_name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.default_guidance = default_guidance
+        self.num_threads = num_threads
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.clip_cache_bytes = clip_cache_bytes
+        self.clip_cache_dir = clip_cache_dir
+        self.clip_caches = {}
+        self.default_sampler = tuple(default_sampler)
+        self.default_steps = tuple(default_steps)
+        self.max_steps = max_steps
+        # See point_e.models.inference.optimize_for_inference()
+        self.inference_dtype = inference_dtype
+        self.quantize = quantize
+        self.compile = compile
+        # name -> adapter file, registered on the base model once it's loaded
+        self.adapter_paths = dict(adapters or {})
+        self.adapter_alpha = adapter_alpha
+        self.adapters: Optional[AdapterRegistry] = None
+        self.max_points = max_points
+
+        self._queue = _RequestQueue(maxsize=max_queue)
+        self._ready = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._batches = 0
+        self._batched_requests = 0
+        self.load_error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+
+    # ------------------------- lifecycle -------------------------
+
+    def start(self):
+        """Load the models in the background and start the workers once they're warm."""
+        t = threading.Thread(target=self._load_and_serve, name="engine-loader", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def shutdown(self, timeout: Optional[float] = None):
+        self._stopping.set()
+        for _ in range(self.concurrency):
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        for t in self._threads:
+            t.join(timeout)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def _load_and_serve(self):
+        if self.load_models():
+            self.serve()
+
+    def load_models(self) -> bool:
+        """Load the models and adapters; on failure, record load_error and return False."""
+        t0 = time.perf_counter()
+        try:
+            if self.num_threads:
+                torch.set_num_threads(self.num_threads)
+            self.base_model, self.base_diffusion = self._load(self.base_name)
+            self.upsampler_model, self.upsampler_diffusion = self._load(self.upsampler_name)
+            self.adapters = AdapterRegistry(self.base_model, snapshot_dir=default_cache_dir())
+            for name, path in self.adapter_paths.items():
+                self.adapters.register(name, path, alpha=self.adapter_alpha)
+        except Exception as e:  # surfaced through /readyz
+            self.load_error = f"{type(e).__name__}: {e}"
+            return False
+        self.load_seconds = time.perf_counter() - t0
+        return True
+
+    def serve(self):
+        """Start the worker threads over the loaded models."""
+        for i in range(self.concurrency):
+            t = threading.Thread(target=self._worker, name=f"engine-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        self._ready.set()
+
+    def _load(self, name: str):
+        with tracing.span("engine.load_model", model=name):
+            # Built without weights, then backed directly by the memory-mapped checkpoint:
+            # no random init, no second copy, and worker processes share the pages.
+            with empty_weights():
+                model = model_from_config(MODEL_CONFIGS[name], self.device)
+            model.eval()
+            model.load_state_dict(load_checkpoint(name, self.device, mmap=True), assign=True)
+            check_materialized(model)
+            optimize_for_inference(
+                model, dtype=self.inference_dtype, quantize=self.quantize, compile=self.compile
+            )
+        if self.clip_cache_bytes:
+            cached = cache_clip_embeddings(
+                model, max_bytes=self.clip_cache_bytes, cache_dir=self.clip_cache_dir
+            )
+            if cached is not None:
+                self.clip_caches[name] = cached
+        return model, diffusion_from_config(DIFFUSION_CONFIGS[name])
+
+    # ------------------------- requests -------------------------
+
+    def submit(self, req: GenerationRequest) -> Future:
+        """
+        Enqueue a request and return a Future resolving to a PointCloud.
+
+        Raises EngineNotReady while models load and EngineBusy when the queue
+        is full, so callers can map them to 503 / 429 without blocking.
+        """
+        if not self.ready or self._stopping.is_set():
+            raise EngineNotReady(self.load_error or "models are still loading")
+        self.stage_options(req)  # raises ValueError for bad sampler settings
+        self.check_adapter(req)
+        self.check_base(req)
+        self.upsample_passes(req)
+        fut: Future = Future()
+        # Already set if the request was queued elsewhere first (see workers.WorkerPool).
+        req.enqueued = req.enqueued or time.perf_counter()
+        try:
+            self._queue.put_nowait((req, fut))
+        except queue.Full:
+            raise EngineBusy(f"queue is full ({self.max_queue} pending)")
+        return fut
+
+    def register_adapter(self, name: str, path: str, alpha: Optional[float] = None):
+        """Add or replace an adapter at runtime; requests can use it right away."""
+        if self.adapters is None:
+            raise EngineNotReady(self.load_error or "models are still loading")
+        self.adapters.register(name, path, alpha=self.adapter_alpha if alpha is None else alpha)
+        self.adapter_paths[name] = path
+
+    def generate(self, req: GenerationRequest, timeout: Optional[float] = None) -> PointCloud:
+        return self.submit(req).result(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "device": str(self.device),
+            "models": [self.base_name, self.upsampler_name],
+            "concurrency": self.concurrency,
+            "queue_size": self._queue.qsize(),
+            "queue_capacity": self.max_queue,
+            "in_flight": self._in_flight,
+            "max_batch_size": self.max_batch_size,
+            "batch_window": self.batch_window,
+            "batches": self._batches,
+            "mean_batch_size": self._batched_requests / self._batches if self._batches else None,
+            "load_seconds": self.load_seconds,
+            "load_error": self.load_error,
+            "clip_cache": {name: c.stats() for name, c in self.clip_caches.items()},
+            "precision": self.precision,
+            "adapters": self.adapters.stats() if self.adapters is not None else None,
+        }
+
+    @property
+    def precision(self) -> str:
+        return "int8" if self.quantize else (self.inference_dtype or "float32")
+
+    def stage_options(self, req: GenerationRequest) -> Tuple[Tuple[str, ...], Tuple[int, ...]]:
+        """Resolve a request's per-stage solver names and step counts, validating them."""
+        n = 1 if req.no_upsample else 2
+        samplers = _per_stage(req.sampler or self.default_sampler, n, "sampler")
+        steps = _per_stage(req.steps or self.default_steps, n, "steps")
+        for name in samplers:
+            if name not in SAMPLERS:
+                raise ValueError(f"unknown sampler {name!r}; expected one of {sorted(SAMPLERS)}")
+        for count in steps:
+            if not 2 <= count <= self.max_steps:
+                raise ValueError(f"steps must be between 2 and {self.max_steps}, got {count}")
+        return samplers, steps
+
+    def check_adapter(self, req: GenerationRequest):
+        """Raise ValueError unless the request's adapter (if any) is registered."""
+        if req.adapter is None:
+            return
+        names = self.adapters.names if self.adapters is not None else []
+        if req.adapter not in names:
+            raise ValueError(f"unknown adapter {req.adapter!r}; expected one of {names}")
+
+    def check_base(self, req: GenerationRequest):
+        """Raise ValueError unless the request's base (if any) can be upsampled."""
+        if req.base is None:
+            return
+        if req.no_upsample:
+            raise ValueError("resuming from a base output needs the upsampler")
+        if len(req.base.coords) != BASE_POINTS:
+            raise ValueError(f"base must have {BASE_POINTS} points, got {len(req.base.coords)}")
+        missing = [name for name in "RGB" if name not in req.base.channels]
+        if missing:
+            raise ValueError(f"base is missing channels {missing}")
+
+    def upsample_passes(self, req: GenerationRequest) -> int:
+        """The number of upsampler rows needed for the request's num_points (validating it)."""
+        if req.num_points is None:
+            return 1
+        if req.no_upsample:
+            raise ValueError("num_points needs the upsampler")
+        if not BASE_POINTS < req.num_points <= self.max_points:
+            raise ValueError(
+                f"num_points must be between {BASE_POINTS + 1} and {self.max_points}, "
+                f"got {req.num_points}"
+            )
+        return math.ceil((req.num_points - BASE_POINTS) / UPSAMPLED_POINTS)
+
+    def batch_key(self, req: GenerationRequest) -> Tuple:
+        """Requests can share a batch iff they sample with identical settings."""
+        if req.base is not None:
+            # Upsample-only: the base stage's settings don't apply.
+            samplers, steps = self.stage_options(req)
+            return ("upsample", samplers[1], steps[1])
+        guidance = self.default_guidance if req.guidance is None else req.guidance
+        return (float(guidance), bool(req.no_upsample), *self.stage_options(req), req.adapter)
+
+    def settings(self, req: GenerationRequest) -> dict:
+        """Everything that determines a request's output, e.g. for content-addressed caching."""
+        sampler = self.sampler_for(req.guidance, not req.no_upsample, *self.stage_options(req))
+        models = [self.base_name] + ([] if req.no_upsample else [self.upsampler_name])
+        out = {
+            "prompt": req.prompt,
+            "seed": req.seed,
+            "models": models,
+            "num_points": list(sampler.num_points),
+            "guidance_scale": list(sampler.guidance_scale),
+            "karras_steps": list(sampler.karras_steps),
+            "sigma_min": list(sampler.sigma_min),
+            "sigma_max": list(sampler.sigma_max),
+            "s_churn": list(sampler.s_churn),
+            "sampler": list(sampler.karras_sampler),
+            "precision": self.precision,
+            "adapter": None if req.adapter is None else {
+                "name": req.adapter,
+                "digest": self.adapters.digest(req.adapter),
+            },
+        }
+        if req.num_points is not None:
+            out["total_points"] = req.num_points
+        if req.base is not None:
+            # The base stage is skipped: only the base itself and the upsampler's settings count.
+            out.update(prompt=None, adapter=None, base=_digest(req.base))
+            for key in _STAGE_SETTINGS:
+                out[key] = out[key][1:]
+        return out
+
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            batch = [(req, fut) for req, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            with self._lock:
+                self._in_flight += len(batch)
+                self._batches += 1
+                self._batched_requests += len(batch)
+            started = time.perf_counter()
+            BATCH_SIZE.observe(len(batch))
+            for req, _ in batch:
+                QUEUE_WAIT.observe(started - req.enqueued)
+                if req.trace is not None:
+                    req.trace.set(queue_wait_seconds=started - req.enqueued, batch_size=len(batch))
+            try:
+                reqs = [req for req, _ in batch]
+                with use_traces(req.trace for req in reqs):
+                    pcs = self._run_profiled(reqs)
+                for (req, fut), pc in zip(batch, pcs):
+                    if req.cancelled:
+                        fut.set_exception(GenerationCancelled("cancelled"))
+                    else:
+                        fut.set_result(pc)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+            finally:
+                with self._lock:
+                    self._in_flight -= len(batch)
+
+    def _next_batch(self) -> Optional[List[Tuple[GenerationRequest, Future]]]:
+        """
+        Collect the next batch for this worker.
+
+        Requests that don't match the batch's settings go back to the front of
+        the queue (in arrival order) once the batch is collected, so the oldest
+        of them seeds the next batch of whichever worker is free first.
+        """
+        first = self._queue.get()
+        if first is None:
+            return None
+        key = self.batch_key(first[0])
+        batch = [first]
+        skipped: List[Tuple[GenerationRequest, Future]] = []
+
+        # Take whatever is already queued without waiting, then linger for at
+        # most batch_window for stragglers. At low load the queue is empty and
+        # a lone request only pays the (small) window.
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size and len(skipped) < self.max_batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                # Shutdown sentinel: hand it back for this (or another) worker.
+                try:
+                    self._queue.put_nowait(None)
+                except queue.Full:
+                    pass
+                break
+            if self.batch_key(item[0]) == key:
+                batch.append(item)
+            else:
+                skipped.append(item)
+        self._queue.put_front(skipped)
+        return batch
+
+    def sampler_for(
+        self,
+        guidance: Optional[float] = None,
+        upsample: bool = True,
+        sampler: Optional[Sequence[str]] = None,
+        steps: Optional[Sequence[int]] = None,
+    ) -> PointCloudSampler:
+        """Build a sampler over the warm models; this is cheap and holds no state of its own."""
+        guidance = self.default_guidance if guidance is None else guidance
+        n = 2 if upsample else 1
+        sampler = _per_stage(sampler or self.default_sampler, n, "sampler")
+        steps = _per_stage(steps or self.default_steps, n, "steps")
+        if not upsample:
+            return PointCloudSampler(
+                device=self.device,
+                models=[self.base_model],
+                diffusions=[self.base_diffusion],
+                num_points=[BASE_POINTS],
+                aux_channels=['R', 'G', 'B'],
+                guidance_scale=[guidance],
+                use_karras=[True],
+                karras_steps=list(steps),
+                karras_sampler=list(sampler),
+                sigma_min=[1e-3],
+                sigma_max=[120],
+                s_churn=[3],
+                model_kwargs_key_filter=('texts',),
+            )
+        return PointCloudSampler(
+            device=self.device,
+            models=[self.base_model, self.upsampler_model],
+            diffusions=[self.base_diffusion, self.upsampler_diffusion],
+            num_points=[BASE_POINTS, UPSAMPLED_POINTS],
+            aux_channels=['R', 'G', 'B'],
+            guidance_scale=[guidance, 0.0],
+            use_karras=[True, True],
+            karras_steps=list(steps),
+            karras_sampler=list(sampler),
+            model_kwargs_key_filter=('texts', ''),
+        )
+
+    def _run_profiled(self, reqs: List[GenerationRequest]) -> List[PointCloud]:
+        """_run_batch(), under torch.profiler if any request asked for a capture."""
+        paths = [req.profile for req in reqs if req.profile]
+        if not paths:
+            with tracing.span("engine.batch", batch_size=len(reqs)):
+                return self._run_batch(reqs)
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if self.device.type == "cuda":
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        with torch.profiler.profile(activities=activities) as prof:
+            with tracing.span("engine.batch", batch_size=len(reqs), profiled=True):
+                pcs = self._run_batch(reqs)
+        with tracing.span("engine.export_profile"):
+            prof.export_chrome_trace(paths[0])
+            for path in paths[1:]:
+                shutil.copyfile(paths[0], path)
+        return pcs
+
+    def _run_batch(self, reqs: List[GenerationRequest]) -> List[PointCloud]:
+        """Sample every request in one batched diffusion; all must share batch_key()."""
+        req = reqs[0]
+        sampler = self.sampler_for(req.guidance, not req.no_upsample, *self.stage_options(req))
+        # A private generator per row keeps each request's seed reproducible
+        # no matter which other requests it was batched with. The stages run
+        # as separate calls sharing these generators, which samples exactly
+        # like a single call.
+        generators = [_generator(req.seed) for req in reqs]
+        with torch.no_grad():
+            if req.base is not None:
+                base = sampler.point_clouds_to_output([req.base for req in reqs])
+            else:
+                # The base model's weights can't change under a concurrent
+                # batch of another adapter until its stage is done.
+                with self.adapters.use(req.adapter):
+                    base = self._sample_stage(
+                        reqs, sampler, 0, generators, dict(texts=[req.prompt for req in reqs])
+                    )
+            if sampler.num_stages == 1:
+                with tracing.span("engine.to_point_clouds", batch_size=len(reqs)):
+                    return sampler.output_to_point_clouds(base)
+
+            # One upsampler row per pass; a request's first pass continues
+            # its generator, extra passes get generators derived from its seed.
+            rows, row_generators = [], []
+            for i, (req, g) in enumerate(zip(reqs, generators)):
+                for p in range(self.upsample_passes(req)):
+                    rows.append(i)
+                    row_generators.append(
+                        g if p == 0 else _generator(None if req.seed is None else req.seed + p * 2**32)
+                    )
+            samples = self._sample_stage(
+                reqs, sampler, 1, row_generators, {}, rows=rows, low_res=base[rows]
+            )
+        return self._assemble(reqs, sampler, base, samples, rows)
+
+    def _sample_stage(
+        self, reqs, sampler, stage, generators, model_kwargs, rows=None, low_res=None
+    ) -> torch.Tensor:
+        """Run one stage over the batch rows (rows[j] is the request of row j)."""
+        # Progress reports a request's first row.
+        first = None if rows is None else [rows.index(i) for i in range(len(reqs))]
+        step, samples = 0, None
+        for x in sampler.sample_batch_progressive(
+            batch_size=len(generators),
+            model_kwargs=model_kwargs,
+            generators=generators,
+            start_stage=stage,
+            end_stage=stage + 1,
+            low_res=low_res,
+        ):
+            step += 1
+            samples = x
+            self._notify(reqs, sampler, stage, step, x if first is None else x[first])
+            if all(req.cancelled for req in reqs):
+                # Nobody is waiting for this batch any more; stop sampling.
+                raise GenerationCancelled("cancelled")
+        self._notify(
+            reqs, sampler, stage, step, samples if first is None else samples[first], stage_done=True
+        )
+        return samples
+
+    def _assemble(self, reqs, sampler, base, samples, rows) -> List[PointCloud]:
+        """Join each request's base and upsampled points, trimmed to its num_points."""
+        outputs, extra_coords, extra_counts = [], [], []
+        for i, req in enumerate(reqs):
+            new = samples[[j for j, r in enumerate(rows) if r == i], :, BASE_POINTS:]
+            new = new.permute(1, 0, 2).reshape(new.shape[1], -1)
+            outputs.append(new)
+            extra_coords.append(new[:3].t().cpu().numpy())
+            extra_counts.append((req.num_points or BASE_POINTS + UPSAMPLED_POINTS) - BASE_POINTS)
+        # Farthest point sampling keeps the surplus points evenly spread.
+        for n in sorted(set(extra_counts)):
+            todo = [i for i, c in enumerate(extra_coords) if extra_counts[i] == n and len(c) > n]
+            if not todo:
+                continue
+            keep = farthest_point_sample_batch(
+                [extra_coords[i] for i in todo], n, init_idx=[0] * len(todo)
+            )
+            for i, idx in zip(todo, keep):
+                outputs[i] = outputs[i][:, torch.from_numpy(np.sort(idx)).to(outputs[i].device)]
+        with tracing.span("engine.to_point_clouds", batch_size=len(reqs)):
+            return sampler.output_to_point_clouds(
+                [torch.cat([base[i], new], dim=-1) for i, new in enumerate(outputs)]
+            )
+
+    def _notify(self, reqs, sampler, stage, step, samples, stage_done=False):
+        total = sampler.karras_steps[stage]
+        for i, req in enumerate(reqs):
+            if req.on_progress is None or req.cancelled:
+                continue
+            progress = Progress(
+                stage=stage,
+                num_stages=sampler.num_stages,
+                step=min(step, total),
+                total_steps=total,
+                samples=samples[i],
+                stage_done=stage_done,
+            )
+            try:
+                req.on_progress(progress)
+            except Exception:
+                pass  # a broken observer must not fail the rest of the batch
+
+
+# Per-stage entries of settings()
+_STAGE_SETTINGS = (
+    "models", "num_points", "guidance_scale", "karras_steps", "sigma_min", "sigma_max", "s_churn", "sampler",
+)
+
+
+def _generator(seed: Optional[int]) -> torch.Generator:
+    g = torch.Generator(device="cpu")
+    if seed is not None:
+        g.manual_seed(seed)
+    else:
+        g.seed()
+    return g
+
+
+def _digest(pc: PointCloud) -> str:
+    h = hashlib.sha256(np.ascontiguousarray(pc.coords, dtype=np.float32).tobytes())
+    for name in sorted(pc.channels):
+        h.update(name.encode())
+        h.update(np.ascontiguousarray(pc.channels[name], dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+def _per_stage(values: Sequence, n: int, name: str) -> Tuple:
+    values = tuple(values)
+    if len(values) == 1:
+        values = values * n
+    if len(values) != n:
+        raise ValueError(f"{name} needs a single value or one per stage ({n}), got {len(values)}")
+    return values
@@ -0,0 +1,145 @@
+# jobs.py
+"""
+In-memory job registry for asynchronous generation.
+
+A Job records its status plus an append-only list of events (progress,
+previews, stage completions, the final result). HTTP handlers read the list
+by index, so any number of clients can follow the same job and reconnect
+without missing events.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .engine import CancelEvent
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = frozenset([SUCCEEDED, FAILED, CANCELLED])
+
+
+class Job:
+    def __init__(self, user: str, prompt: str):
+        self.id = str(uuid.uuid4())[:8]
+        self.user = user
+        self.prompt = prompt
+        self.status = QUEUED
+        self.stage: Optional[int] = None
+        self.num_stages: Optional[int] = None
+        self.step = 0
+        self.total_steps: Optional[int] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.error_code: Optional[int] = None  # HTTP status for synchronous callers
+        self.created = time.time()
+        self.updated = self.created
+        self.future: Optional[Future] = None
+        self.upload: Optional[Future] = None  # background upload of the result (objectstore.Uploader)
+        self.cache_key: Optional[str] = None
+        self.base_path: Optional[str] = None  # saved base-stage output (.npz), for upsample-only reruns
+        self.base_saved: Optional[Future] = None  # pending write of base_path
+        self.trace = None  # telemetry.Trace, if tracing is enabled
+        self.profile_path: Optional[str] = None  # torch.profiler capture, if one was requested
+        self.cancel_event = CancelEvent()
+        self.done = threading.Event()
+        self.events: List[Tuple[str, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def emit(self, event: str, data: Dict[str, Any]):
+        with self._lock:
+            self.events.append((event, data))
+            self.updated = time.time()
+
+    def events_since(self, idx: int) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            return self.events[idx:]
+
+    def set_status(self, status: str, **extra):
+        if self.finished:
+            return
+        self.status = status
+        self.emit("status", {"status": status, **extra})
+        if self.finished:
+            self.done.set()
+
+    def cancel(self) -> bool:
+        """Request cancellation; returns False if the job had already finished."""
+        if self.finished:
+            return False
+        self.cancel_event.set()
+        if self.future is not None and self.future.cancel():
+            # Still queued: the engine will never pick it up.
+            self.set_status(CANCELLED)
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "prompt": self.prompt,
+            "stage": self.stage,
+            "num_stages": self.num_stages,
+            "step": self.step,
+            "total_steps": self.total_steps,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "updated": self.updated,
+            "trace": self.trace.summary() if self.trace is not None else None,
+        }
+
+
+class JobStore:
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def create(self, user: str, prompt: str) -> Job:
+        job = Job(user=user, prompt=prompt)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        out: Dict[str, int] = {}
+        for job in jobs:
+            out[job.status] = out.get(job.status, 0) + 1
+        return out
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [k for k, j in self._jobs.items() if j.finished and j.updated < cutoff]:
+            del self._jobs[job_id]
+
+
+def preview_points(pc, max_points: int) -> List[List[float]]:
+    """
+    Downsample a PointCloud to at most max_points rows of [x, y, z, r, g, b]
+    (colours 0..255) for streaming to clients.
+    """
+    stride = max(1, int(np.ceil(len(pc.coords) / max_points)))
+    coords = np.round(pc.coords[::stride], 4)
+    if all(c in pc.channels for c in "RGB"):
+        rgb = pc.select_channels(["R", "G", "B"])[::stride]
+    else:
+        rgb = np.zeros_like(coords)
+    return np.concatenate([coords, rgb], axis=1).tolist()
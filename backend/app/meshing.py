@@ -0,0 +1,106 @@
+# meshing.py
+"""
+Point cloud -> decimated, vertex-coloured triangle mesh (GLB).
+
+The SDF model is loaded on first use and kept warm. Meshes come from the
+narrow-band sparse marching cubes in point_e.util.pc_to_mesh, which evaluates
+the SDF only near the surface, so high grid resolutions stay affordable on
+CPU. The result is decimated to a face budget for download / web viewing:
+with Open3D's quadric decimation when it is installed, otherwise by vertex
+clustering (TriMesh.decimate).
+"""
+import threading
+from typing import Optional
+
+import numpy as np
+import torch
+
+from .engine import default_device  # also puts the vendored point_e on sys.path
+
+from point_e.models.configs import MODEL_CONFIGS, model_from_config
+from point_e.models.download import load_checkpoint
+from point_e.models.meta_init import check_materialized, empty_weights
+from point_e.models.inference import optimize_for_inference
+from point_e.util.mesh import TriMesh
+from point_e.util import tracing
+from point_e.util.pc_to_mesh import sparse_marching_cubes_mesh
+from point_e.util.point_cloud import PointCloud
+
+try:
+    import open3d as o3d
+except ImportError:  # optional: falls back to vertex clustering
+    o3d = None
+
+
+class Mesher:
+    def __init__(
+        self,
+        device: Optional[torch.device] = None,
+        grid_size: int = 256,
+        target_faces: int = 20000,
+        band: float = 1.0,
+    ):
+        self.device = device or default_device()
+        self.grid_size = grid_size
+        self.target_faces = target_faces
+        self.band = band
+        self.model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self.model is None:
+                with tracing.span("engine.load_model", model="sdf"):
+                    with empty_weights():
+                        model = model_from_config(MODEL_CONFIGS["sdf"], self.device)
+                    model.eval()
+                    model.load_state_dict(load_checkpoint("sdf", self.device, mmap=True), assign=True)
+                    check_materialized(model)
+                    self.model = optimize_for_inference(model)
+        return self.model
+
+    def mesh(
+        self,
+        pc: PointCloud,
+        grid_size: Optional[int] = None,
+        target_faces: Optional[int] = None,
+        progress: bool = False,
+    ) -> TriMesh:
+        """Reconstruct the surface of pc and decimate it to target_faces triangles."""
+        model = self.load()
+        grid_size = grid_size or self.grid_size
+        with tracing.span("mesh.marching_cubes", grid_size=grid_size) as span:
+            mesh = sparse_marching_cubes_mesh(
+                pc, model, grid_size=grid_size, band=self.band, progress=progress
+            )
+            span.set(faces=len(mesh.faces))
+        with tracing.span("mesh.decimate", faces=len(mesh.faces)):
+            return decimate(mesh, target_faces or self.target_faces)
+
+
+def decimate(mesh: TriMesh, target_faces: int) -> TriMesh:
+    """Quadric decimation via Open3D if available, else vertex clustering."""
+    if len(mesh.faces) <= target_faces:
+        return mesh
+    if o3d is None:
+        return mesh.decimate(target_faces)
+
+    o3_mesh = o3d.geometry.TriangleMesh(
+        o3d.utility.Vector3dVector(mesh.verts.astype(np.float64)),
+        o3d.utility.Vector3iVector(mesh.faces.astype(np.int32)),
+    )
+    if mesh.has_vertex_colors():
+        rgb = np.stack([mesh.vertex_channels[x] for x in "RGB"], axis=1)
+        o3_mesh.vertex_colors = o3d.utility.Vector3dVector(rgb.astype(np.float64))
+    o3_mesh = o3_mesh.simplify_quadric_decimation(target_number_of_triangles=target_faces)
+    o3_mesh.remove_unreferenced_vertices()
+    o3_mesh.compute_vertex_normals()
+    out = TriMesh(
+        verts=np.asarray(o3_mesh.vertices, dtype=np.float32),
+        faces=np.asarray(o3_mesh.triangles, dtype=np.int64),
+        normals=np.asarray(o3_mesh.vertex_normals, dtype=np.float32),
+    )
+    if mesh.has_vertex_colors():
+        rgb = np.asarray(o3_mesh.vertex_colors, dtype=np.float32)
+        out.vertex_channels = dict(R=rgb[:, 0], G=rgb[:, 1], B=rgb[:, 2])
+    return out
@@ -0,0 +1,253 @@
+# objectstore.py
+"""
+Where published files go: a GCS bucket (or a fake-gcs-server standing in for
+one) or a local directory, behind one small interface.
+
+An ObjectStore puts bytes and hands out signed GET URLs. Signing may cost a
+round trip (e.g. IAM signBlob on workload credentials) and every cache hit
+needs a URL, so URLs are reused until shortly before they expire.
+
+Uploader runs put() on its own threads with retries, so a request can finish
+as soon as its file is safely on local disk.
+"""
+import collections
+import contextvars
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import random
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+
+class ObjectStore(ABC):
+    """Base class: subclasses implement uri(), _put() and _sign()."""
+
+    def __init__(self, url_ttl: float = 900.0, url_refresh: Optional[float] = None, max_cached_urls: int = 4096):
+        self.url_ttl = url_ttl
+        # A cached URL is handed out while at least this many seconds of it are left
+        self.url_refresh = url_ttl / 3 if url_refresh is None else url_refresh
+        self.max_cached_urls = max_cached_urls
+        self._urls: "collections.OrderedDict[Tuple[str, str], Tuple[str, float]]" = collections.OrderedDict()
+        self._urls_lock = threading.Lock()
+
+    @abstractmethod
+    def uri(self, path: str) -> str:
+        """A URI naming the object, for logs and job records."""
+
+    def put(
+        self,
+        path: str,
+        data: bytes,
+        content_type: str,
+        cache_control: Optional[str] = None,
+        content_encoding: Optional[str] = None,
+    ):
+        self._put(path, data, content_type, cache_control, content_encoding)
+
+    def signed_url(self, path: str, filename: str = "output.ply") -> str:
+        """A temporary GET URL; the object doesn't have to exist (yet)."""
+        key = (path, filename)
+        now = time.time()
+        with self._urls_lock:
+            hit = self._urls.get(key)
+            if hit is not None and hit[1] - now > self.url_refresh:
+                self._urls.move_to_end(key)
+                return hit[0]
+        url = self._sign(path, filename, self.url_ttl)
+        with self._urls_lock:
+            self._urls[key] = (url, now + self.url_ttl)
+            self._urls.move_to_end(key)
+            while len(self._urls) > self.max_cached_urls:
+                self._urls.popitem(last=False)
+        return url
+
+    @abstractmethod
+    def _put(self, path, data, content_type, cache_control, content_encoding):
+        """Store data at path, replacing any existing object."""
+
+    @abstractmethod
+    def _sign(self, path: str, filename: str, ttl: float) -> str:
+        """A GET URL for path, valid for ttl seconds, that downloads as filename."""
+
+
+class GCSStore(ObjectStore):
+    """
+    A bucket, through a single storage.Client whose HTTP session keeps
+    connections and credentials warm across uploads.
+
+    With STORAGE_EMULATOR_HOST set the client talks to that server (e.g.
+    fake-gcs-server) anonymously; anonymous credentials can't sign, so URLs
+    are plain media links on the emulator instead.
+    """
+
+    def __init__(self, bucket: str, client_factory: Optional[Callable] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.bucket_name = bucket
+        self._client_factory = client_factory
+        self._bucket = None
+        self._lock = threading.Lock()
+        emulator = os.getenv("STORAGE_EMULATOR_HOST")
+        if emulator and "://" not in emulator:
+            emulator = "http://" + emulator
+        self.emulator = emulator.rstrip("/") if emulator else None
+
+    @property
+    def bucket(self):
+        with self._lock:
+            if self._bucket is None:
+                if self._client_factory is None:
+                    from google.cloud import storage
+
+                    self._client_factory = storage.Client
+                self._bucket = self._client_factory().bucket(self.bucket_name)
+            return self._bucket
+
+    def uri(self, path: str) -> str:
+        return f"gs://{self.bucket_name}/{path}"
+
+    def _put(self, path, data, content_type, cache_control, content_encoding):
+        blob = self.bucket.blob(path)
+        blob.cache_control = cache_control
+        blob.content_encoding = content_encoding
+        # Sent straight from memory (a single request for small files, resumable above 8 MB)
+        blob.upload_from_string(data, content_type=content_type)
+
+    def _sign(self, path, filename, ttl):
+        if self.emulator is not None:
+            return f"{self.emulator}/storage/v1/b/{self.bucket_name}/o/{quote(path, safe='')}?alt=media"
+        return self.bucket.blob(path).generate_signed_url(
+            version="v4",
+            expiration=datetime.timedelta(seconds=ttl),
+            method="GET",
+            response_disposition=f'inline; filename="{filename}"',
+        )
+
+
+class LocalStore(ObjectStore):
+    """
+    Objects as files under root, each with a JSON sidecar of its headers.
+    URLs point at base_url/<path> (served by the API, see server.get_object)
+    and carry an HMAC signature and expiry, like GCS v4 URLs. Without a
+    secret, a random one is made, so URLs don't outlive the process.
+    """
+
+    def __init__(self, root, base_url: str, secret: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.base_url = base_url.rstrip("/")
+        self._key = secret.encode() if secret else secrets.token_bytes(32)
+
+    def file(self, path: str) -> Path:
+        """The file behind an object path. Raises ValueError for paths outside root."""
+        target = (self.root / path).resolve()
+        if self.root not in target.parents:
+            raise ValueError(f"Invalid object path: {path}")
+        return target
+
+    def metadata(self, path: str) -> Dict[str, Optional[str]]:
+        """The object's content_type, cache_control and content_encoding. Raises OSError if missing."""
+        return json.loads(self._meta_path(self.file(path)).read_text())
+
+    def uri(self, path: str) -> str:
+        return self.file(path).as_uri()
+
+    def verify(self, path: str, expires: int, filename: str, signature: str) -> bool:
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(path, expires, filename), signature)
+
+    def _put(self, path, data, content_type, cache_control, content_encoding):
+        target = self.file(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        meta = dict(content_type=content_type, cache_control=cache_control, content_encoding=content_encoding)
+        self._meta_path(target).write_text(json.dumps(meta))
+        tmp = target.with_name(target.name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+
+    def _sign(self, path, filename, ttl):
+        expires = int(time.time() + ttl)
+        query = urlencode(dict(expires=expires, filename=filename, signature=self._signature(path, expires, filename)))
+        return f"{self.base_url}/{quote(path)}?{query}"
+
+    def _signature(self, path: str, expires: int, filename: str) -> str:
+        message = f"{path}\n{expires}\n{filename}".encode()
+        return hmac.new(self._key, message, hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def _meta_path(target: Path) -> Path:
+        return target.with_name(target.name + ".meta.json")
+
+
+class Uploader:
+    """
+    Background put()s with exponential backoff and jitter between attempts.
+
+    submit() returns a Future; on_done(error) is called (error None on success)
+    before the future resolves, so anything it records is visible to whoever
+    waits on the future. span, if given, is a tracing.span-like factory used
+    to time each attempt; the submitter's context variables (e.g. the traces
+    set by telemetry.use_traces) are carried over to the upload thread.
+    """
+
+    def __init__(self, store: ObjectStore, workers: int = 4, attempts: int = 5, backoff: float = 0.5, span=None):
+        self.store = store
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self._span = span or (lambda name, **attrs: nullcontext())
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+        self._lock = threading.Lock()
+        self._counters = {"pending": 0, "succeeded": 0, "failed": 0, "retries": 0}
+
+    def submit(
+        self,
+        path: str,
+        data: bytes,
+        content_type: str,
+        on_done: Optional[Callable[[Optional[BaseException]], None]] = None,
+        **metadata,
+    ) -> Future:
+        with self._lock:
+            self._counters["pending"] += 1
+        ctx = contextvars.copy_context()
+        return self._pool.submit(ctx.run, self._upload, path, data, content_type, on_done, metadata)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def _upload(self, path, data, content_type, on_done, metadata):
+        error = None
+        for attempt in range(1, self.attempts + 1):
+            try:
+                with self._span("publish.upload", bytes=len(data), attempt=attempt):
+                    self.store.put(path, data, content_type, **metadata)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if attempt < self.attempts:
+                    with self._lock:
+                        self._counters["retries"] += 1
+                    time.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        with self._lock:
+            self._counters["pending"] -= 1
+            self._counters["succeeded" if error is None else "failed"] += 1
+        if on_done is not None:
+            on_done(error)
+        if error is not None:
+            raise error
@@ -1,17 +1,49 @@
 # server.py
+import io
 import os
-import uuid
-import datetime
-import subprocess
+import gzip
+import json
+import time
+import random
+import shutil
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
-import sys
-
-from fastapi.responses import RedirectResponse, Response
-from fastapi import FastAPI, HTTPException, Query
+from typing import Literal
+
+import torch
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from google.cloud import storage
+from pydantic import AliasChoices, BaseModel, Field
+
+from .engine import (
+    EngineBusy,
+    EngineNotReady,
+    GenerationCancelled,
+    GenerationRequest,
+    InferenceEngine,
+    Progress,
+)
+from .cache import ResultCache, cache_key
+from .meshing import Mesher
+from .objectstore import GCSStore, LocalStore, Uploader
+from .jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, Job, JobStore, preview_points
+from .telemetry import HTTP_SECONDS, REGISTRY, Gauge, Trace, Tracer, use_traces
+from .workers import WorkerPool
+
+from point_e.models.clip_cache import normalize_prompt  # vendored; on sys.path via .engine
+from point_e.util import tracing
+from point_e.util.point_cloud import PointCloud
 
 # ------------------------- Paths & Config -------------------------
 
@@ -26,6 +58,9 @@ VENDORED_POINT_E_DIR = BACKEND_DIR / "vendor" / "point-e"
 
 OUTPUT_DIR = BACKEND_DIR / "data" / "outputs" / "pointclouds"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+# Base-stage (1024-point) outputs, kept per job so the upsampler can be re-run alone
+BASE_DIR = OUTPUT_DIR / "base"
+BASE_DIR.mkdir(parents=True, exist_ok=True)
 
 def _sanitize_bucket(name: str) -> str:
     # Accept "gs://bucket" or "bucket" env values; normalize to "bucket"
@@ -33,13 +68,99 @@ def _sanitize_bucket(name: str) -> str:
 
 BUCKET = _sanitize_bucket(os.getenv("POINTCLOUD_BUCKET", "imagicle-473400-pointclouds-dev"))
 
-# If you ever want to invoke the file directly instead of -m:
-_env_point_e = os.getenv("POINT_E_SCRIPT")
-if _env_point_e:
-    _p = Path(_env_point_e)
-    POINT_E_SCRIPT = _p if _p.is_absolute() else (REPO_ROOT / _p)
-else:
-    POINT_E_SCRIPT = BACKEND_DIR / "vendor/point-e/point_e/evals/scripts/generate.py"
+# Object storage: STORAGE_BACKEND=gcs uploads to BUCKET (to a fake-gcs-server instead
+# when STORAGE_EMULATOR_HOST is set); STORAGE_BACKEND=local keeps objects under
+# STORAGE_LOCAL_DIR and serves them from PUBLIC_URL/api/objects through signed links
+# (STORAGE_SECRET keeps those valid across restarts).
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gcs")
+STORAGE_LOCAL_DIR = Path(os.getenv("STORAGE_LOCAL_DIR", str(BACKEND_DIR / "data" / "objects")))
+if not STORAGE_LOCAL_DIR.is_absolute():
+    STORAGE_LOCAL_DIR = BACKEND_DIR / STORAGE_LOCAL_DIR
+STORAGE_SECRET = os.getenv("STORAGE_SECRET") or None
+PUBLIC_URL = os.getenv("PUBLIC_URL", "http://localhost:8000").rstrip("/")
+SIGNED_URL_TTL_SECONDS = float(os.getenv("SIGNED_URL_TTL_SECONDS", "900"))
+# Uploads run in the background once the output is on local disk, retried with backoff
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_ATTEMPTS = int(os.getenv("UPLOAD_ATTEMPTS", "5"))
+
+# In-process inference engine: models are loaded once at startup and requests
+# are served by ENGINE_CONCURRENCY workers behind a queue of ENGINE_QUEUE_SIZE.
+POINT_E_DEVICE = os.getenv("POINT_E_DEVICE")  # e.g. "cpu", "cuda"; autodetected if unset
+# Checkpoints are cached (and converted for memory-mapping) in POINT_E_CACHE_DIR,
+# default ~/.cache/point_e; POINT_E_VERIFY_CHECKPOINTS=1 re-hashes them at startup.
+ENGINE_CONCURRENCY = int(os.getenv("ENGINE_CONCURRENCY", "1"))
+ENGINE_QUEUE_SIZE = int(os.getenv("ENGINE_QUEUE_SIZE", "8"))
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0")) or None
+# Many-core CPU hosts: ENGINE_PROCESSES=N forks N worker processes that share the
+# loaded models, each pinned to ENGINE_CORES_PER_PROCESS cores (default: an even
+# split) with TORCH_NUM_THREADS threads (default: one per core). 0 keeps sampling
+# in this process, on ENGINE_CONCURRENCY threads.
+ENGINE_PROCESSES = int(os.getenv("ENGINE_PROCESSES", "0"))
+ENGINE_CORES_PER_PROCESS = int(os.getenv("ENGINE_CORES_PER_PROCESS", "0")) or None
+# Micro-batching: concurrent prompts with the same settings are sampled together
+ENGINE_MAX_BATCH = int(os.getenv("ENGINE_MAX_BATCH", "4"))
+ENGINE_BATCH_WINDOW_MS = float(os.getenv("ENGINE_BATCH_WINDOW_MS", "10"))
+# CLIP embedding memo (0 disables); CLIP_CACHE_DIR persists embeddings across restarts
+CLIP_CACHE_BYTES = int(os.getenv("CLIP_CACHE_MB", "256")) * 1024 * 1024
+CLIP_CACHE_DIR = os.getenv("CLIP_CACHE_DIR") or None
+# Inference precision / graph capture: ENGINE_DTYPE=bfloat16, or ENGINE_QUANTIZE=1
+# (dynamic int8, CPU only); ENGINE_COMPILE=inductor|trace
+ENGINE_DTYPE = os.getenv("ENGINE_DTYPE") or None
+ENGINE_QUANTIZE = os.getenv("ENGINE_QUANTIZE", "0") == "1"
+ENGINE_COMPILE = os.getenv("ENGINE_COMPILE") or None
+# Default Karras solver and step count, one value or one per stage (base,upsample),
+# e.g. KARRAS_SAMPLER=dpmpp_2m KARRAS_STEPS=20; requests may override both.
+KARRAS_SAMPLER = [s.strip() for s in os.getenv("KARRAS_SAMPLER", "heun").split(",") if s.strip()]
+KARRAS_STEPS = [int(s) for s in os.getenv("KARRAS_STEPS", "64").split(",") if s.strip()]
+# LoRA adapters for the base model, selectable per request ("adapter" or "style"),
+# e.g. ADAPTERS=lowpoly=/models/lowpoly.pt,voxel=/models/voxel.pt
+ADAPTERS = dict(
+    item.strip().split("=", 1) for item in os.getenv("ADAPTERS", "").split(",") if item.strip()
+)
+ADAPTER_ALPHA = float(os.getenv("ADAPTER_ALPHA", "16"))
+
+# Upsample-only reruns (/api/jobs/{id}/upsample): variants per request, and the
+# largest num_points (above 4096 the upsampler runs several passes)
+UPSAMPLE_MAX_VARIANTS = int(os.getenv("UPSAMPLE_MAX_VARIANTS", "8"))
+MAX_POINTS = int(os.getenv("MAX_POINTS", "16384"))
+
+# Async jobs: preview every N sampling steps, downsampled to this many points
+JOB_PREVIEW_EVERY = int(os.getenv("JOB_PREVIEW_EVERY", "4"))
+JOB_PREVIEW_POINTS = int(os.getenv("JOB_PREVIEW_POINTS", "512"))
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", "3600"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", "4"))
+
+# Result cache (only seeded requests, or ones opting into CACHE_DEFAULT_SEED, are cacheable)
+CACHE_DIR = OUTPUT_DIR / "cache"
+CACHE_MEMORY_ENTRIES = int(os.getenv("CACHE_MEMORY_ENTRIES", "1024"))
+CACHE_DISK_BYTES = int(os.getenv("CACHE_DISK_MB", "1024")) * 1024 * 1024
+CACHE_MAX_AGE_SECONDS = float(os.getenv("CACHE_MAX_AGE_SECONDS", "0")) or None
+CACHE_DEFAULT_SEED = int(os.getenv("CACHE_DEFAULT_SEED", "0"))
+
+# Output encoding: "ply" (float32 binary) or "compact" (16-bit quantized coords,
+# 9 instead of 15 bytes per point). PLY_GZIP=1 additionally gzips compact uploads
+# and serves them with Content-Encoding: gzip, which browsers inflate transparently.
+PLY_FORMAT = os.getenv("PLY_FORMAT", "ply")
+PLY_GZIP = os.getenv("PLY_GZIP", "0") == "1"
+PLY_CONTENT_TYPE = "application/octet-stream"
+
+# Mesh export (/api/mesh): sparse marching cubes on a MESH_GRID_SIZE**3 grid, then
+# decimation to MESH_TARGET_FACES triangles, on MESH_WORKERS dedicated threads
+MESH_GRID_SIZE = int(os.getenv("MESH_GRID_SIZE", "256"))
+MESH_MAX_GRID_SIZE = int(os.getenv("MESH_MAX_GRID_SIZE", "384"))
+MESH_TARGET_FACES = int(os.getenv("MESH_TARGET_FACES", "20000"))
+MESH_WORKERS = int(os.getenv("MESH_WORKERS", "1"))
+GLB_CONTENT_TYPE = "model/gltf-binary"
+
+# Tracing spans and latency histograms (served on /metrics); TRACING=0 turns them off.
+# A torch.profiler capture is taken for requests sent with "X-Profile: 1", and for a
+# PROFILE_SAMPLE_RATE fraction of all others; GET /api/jobs/{id}/profile returns it.
+TRACING = os.getenv("TRACING", "1") == "1"
+# Per-step spans ("karras.step") cost a little on every solver step; TRACE_STEPS=1 adds them.
+TRACE_STEPS = os.getenv("TRACE_STEPS", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(OUTPUT_DIR / "profiles")))
 
 # Where to store optional local copies of generated PLYs for dev viewing
 _env_artifacts = os.getenv("ARTIFACTS_DIR", str(BACKEND_DIR / "artifacts"))
@@ -56,7 +177,85 @@ ALLOWED_ORIGINS = [o.strip() for o in os.getenv(
 
 # ------------------------- App & Middleware -------------------------
 
-app = FastAPI(title="imagicle API")
+tracing.set_tracer(Tracer(step_spans=TRACE_STEPS) if TRACING else None)
+
+engine_options = dict(
+    device=torch.device(POINT_E_DEVICE) if POINT_E_DEVICE else None,
+    concurrency=ENGINE_CONCURRENCY,
+    max_queue=ENGINE_QUEUE_SIZE,
+    num_threads=TORCH_NUM_THREADS,
+    max_batch_size=ENGINE_MAX_BATCH,
+    batch_window=ENGINE_BATCH_WINDOW_MS / 1000.0,
+    clip_cache_bytes=CLIP_CACHE_BYTES,
+    clip_cache_dir=CLIP_CACHE_DIR,
+    default_sampler=KARRAS_SAMPLER,
+    default_steps=KARRAS_STEPS,
+    inference_dtype=ENGINE_DTYPE,
+    quantize=ENGINE_QUANTIZE,
+    compile=ENGINE_COMPILE,
+    adapters=ADAPTERS,
+    adapter_alpha=ADAPTER_ALPHA,
+    max_points=MAX_POINTS,
+)
+if ENGINE_PROCESSES:
+    engine = WorkerPool(
+        processes=ENGINE_PROCESSES, cores_per_process=ENGINE_CORES_PER_PROCESS, **engine_options
+    )
+else:
+    engine = InferenceEngine(**engine_options)
+jobs = JobStore(ttl=JOB_TTL_SECONDS)
+results = ResultCache(
+    CACHE_DIR,
+    max_memory_entries=CACHE_MEMORY_ENTRIES,
+    max_disk_bytes=CACHE_DISK_BYTES,
+    max_age=CACHE_MAX_AGE_SECONDS,
+)
+mesher = Mesher(
+    device=torch.device(POINT_E_DEVICE) if POINT_E_DEVICE else None,
+    grid_size=MESH_GRID_SIZE,
+    target_faces=MESH_TARGET_FACES,
+)
+# Meshing is CPU/GPU heavy; it gets its own threads so it never delays publishing
+mesh_pool = ThreadPoolExecutor(max_workers=MESH_WORKERS, thread_name_prefix="mesh")
+# PLY writing and signing happen here so engine workers go straight back to sampling
+publish_pool = ThreadPoolExecutor(max_workers=PUBLISH_WORKERS, thread_name_prefix="publish")
+if STORAGE_BACKEND == "local":
+    store = LocalStore(
+        STORAGE_LOCAL_DIR, f"{PUBLIC_URL}/api/objects", secret=STORAGE_SECRET, url_ttl=SIGNED_URL_TTL_SECONDS
+    )
+elif STORAGE_BACKEND == "gcs":
+    store = GCSStore(BUCKET, url_ttl=SIGNED_URL_TTL_SECONDS)
+else:
+    raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r} (expected gcs or local)")
+uploads = Uploader(store, workers=UPLOAD_WORKERS, attempts=UPLOAD_ATTEMPTS, span=tracing.span)
+
+REGISTRY.register(Gauge("imagicle_engine_ready", "1 once the models are loaded", lambda: engine.ready))
+REGISTRY.register(Gauge(
+    "imagicle_queue_size", "Requests waiting for an engine worker", lambda: engine.stats()["queue_size"]
+))
+REGISTRY.register(Gauge(
+    "imagicle_in_flight", "Requests being sampled", lambda: engine.stats()["in_flight"]
+))
+REGISTRY.register(Gauge(
+    "imagicle_jobs", "Jobs held in memory, by status",
+    lambda: {(status,): n for status, n in jobs.counts().items()}, labels=["status"],
+))
+REGISTRY.register(Gauge(
+    "imagicle_uploads_pending", "Published files still being uploaded", lambda: uploads.stats()["pending"]
+))
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Load models in the background; /readyz flips to 200 once they're warm
+    engine.start()
+    yield
+    engine.shutdown(timeout=5)
+    publish_pool.shutdown(wait=False)
+    mesh_pool.shutdown(wait=False, cancel_futures=True)
+    # Outputs are on local disk by now; let their uploads land before exiting
+    uploads.shutdown(wait=True)
+
+app = FastAPI(title="imagicle API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -76,6 +275,16 @@ def favicon():
     # Silence the 404 spam for /favicon.ico during dev
     return Response(status_code=204)
 
+if TRACING:
+    @app.middleware("http")
+    async def observe_latency(request: Request, call_next):
+        t0 = time.perf_counter()
+        response = await call_next(request)
+        # The route template, so /api/jobs/{job_id} is one series rather than one per job
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_SECONDS.observe(time.perf_counter() - t0, request.method, route, str(response.status_code))
+        return response
+
 # Serve local dev artifacts (optional)
 app.mount("/artifacts", StaticFiles(directory=str(ARTIFACTS_DIR)), name="artifacts")
 
@@ -88,6 +297,39 @@ class GenerateReq(BaseModel):
     guidance: float | None = None
     seed: int | None = None
     no_upsample: bool | None = None
+    # Without a seed, results are random and not cached; set this to use a fixed
+    # default seed instead so identical prompts can be served from the cache.
+    deterministic: bool = False
+    # Karras solver (heun, dpm, ancestral, dpmpp_2m, dpmpp_3m, unipc, adaptive) and
+    # step count, either one value for all stages or a list with one per stage
+    sampler: str | list[str] | None = None
+    steps: int | list[int] | None = None
+    # Opt into the compact quantized PLY (defaults to PLY_FORMAT)
+    format: Literal["ply", "compact"] | None = None
+    # Named LoRA adapter (see GET /api/adapters); "style" is accepted as an alias
+    adapter: str | None = Field(default=None, validation_alias=AliasChoices("adapter", "style"))
+    # Points in the final cloud (default 4096, up to MAX_POINTS)
+    num_points: int | None = None
+
+class UpsampleReq(BaseModel):
+    # Re-run only the upsampler on the job's saved base cloud. One job per seed:
+    # either explicit seeds, or `variants` seeds counting up from `seed`
+    # (random, uncached variants without either).
+    user_id: str | None = None
+    seed: int | None = None
+    seeds: list[int] | None = None
+    variants: int = 1
+    num_points: int | None = None
+    sampler: str | None = None
+    steps: int | None = None
+    format: Literal["ply", "compact"] | None = None
+
+class MeshReq(BaseModel):
+    # A finished generation job whose point cloud should be meshed
+    job_id: str
+    user_id: str | None = None
+    grid_size: int | None = None
+    target_faces: int | None = None
 
 # ------------------------- Routes -------------------------
 
@@ -97,95 +339,538 @@ def health():
         "ok": True,
         "service": "imagicle",
         "bucket": BUCKET,
-        "point_e_script": str(POINT_E_SCRIPT),
+        "storage": STORAGE_BACKEND,
         "vendored_point_e_dir": str(VENDORED_POINT_E_DIR),
         "artifacts_dir": str(ARTIFACTS_DIR),
+        "engine": engine.stats(),
+        "jobs": jobs.counts(),
+        "cache": results.stats(),
+        "uploads": uploads.stats(),
     }
 
-# ...existing imports and config...
-
-@app.post("/api/generate")
-def generate_pointcloud(req: GenerateReq):
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/readyz")
+def ready():
+    """Readiness probe: 200 once the models are loaded, 503 before (or if loading failed)."""
+    if not engine.ready:
+        return JSONResponse(status_code=503, content={"ready": False, "error": engine.load_error})
+    return {"ready": True, "load_seconds": engine.load_seconds}
+
+def _sign_url(object_path: str, filename: str = "output.ply") -> str:
+    with tracing.span("publish.sign_url"):
+        return store.signed_url(object_path, filename)
+
+def _object_path(user: str, job_id: str) -> str:
+    return f"pointclouds/{user}/{job_id}/output.ply"
+
+def _serialize(write) -> bytes:
+    buf = io.BytesIO()
+    write(buf)
+    return buf.getvalue()
+
+def _write_local(path: Path, data: bytes):
+    """Write a file atomically and fsync it, so it survives a crash once this returns."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _link_artifact(path: Path):
+    """Expose a local output under /artifacts: a hard link, or a copy across filesystems."""
+    dst = ARTIFACTS_DIR / path.name
+    tmp = dst.with_name(dst.name + ".tmp")
+    try:
+        tmp.unlink(missing_ok=True)
+        try:
+            os.link(path, tmp)
+        except OSError:
+            shutil.copyfile(path, tmp)
+        os.replace(tmp, dst)
+    except OSError:
+        pass  # non-fatal
 
-    job_id = str(uuid.uuid4())[:8]
-    user = (req.user_id or "anon").replace("/", "_")
-    local_out = OUTPUT_DIR / f"{job_id}.ply"
-
-    # Build the command, passing through optional knobs
-    cmd = [sys.executable, "-m", "point_e.evals.scripts.generate", "--out", str(local_out)]
-    cmd += ["--prompt", req.prompt]
-    if req.guidance is not None:
-        cmd += ["--guidance", str(req.guidance)]
-    if req.seed is not None:
-        cmd += ["--seed", str(req.seed)]
-    if req.no_upsample:
-        cmd += ["--no_upsample"]
-
-    env = {
-        **os.environ,
-        "PYTHONUNBUFFERED": "1",
-        "PYTHONPATH": f"{VENDORED_POINT_E_DIR}:{os.environ.get('PYTHONPATH','')}",
+def _upload(job: Job, object_path: str, data: bytes, content_type: str, filename: str,
+            content_encoding: str | None = None, on_uploaded=None) -> dict:
+    """
+    Queue the upload of a published file and return the job's result. The URL is
+    signed up front and works once the upload lands: result["upload"] goes from
+    "pending" to "done" (or "failed"), announced by an "upload" job event.
+    """
+    result = {
+        "job_id": job.id,
+        "gcs_uri": store.uri(object_path),
+        "url": _sign_url(object_path, filename),  # FE should fetch this
+        "upload": "pending",
     }
 
-    proc = subprocess.run(
-        cmd,
-        cwd=str(REPO_ROOT),
-        capture_output=True,
-        text=True,
-        env=env,
+    def on_done(error):
+        if error is None:
+            result["upload"] = "done"
+            if on_uploaded is not None:
+                on_uploaded()
+            job.emit("upload", {"status": "done", "gcs_uri": result["gcs_uri"]})
+        else:
+            result["upload"] = "failed"
+            job.emit("upload", {"status": "failed", "error": f"Upload failed: {str(error)[:4000]}"})
+
+    job.upload = uploads.submit(
+        object_path,
+        data,
+        content_type,
+        on_done=on_done,
+        cache_control="public, max-age=86400",
+        content_encoding=content_encoding,
+    )
+    return result
+
+def _publish(job: Job, pc, fmt: str = "ply", on_uploaded=None) -> dict:
+    """Write the PLY to local disk and queue its upload (see _upload)."""
+    local_out = OUTPUT_DIR / f"{job.id}.ply"
+    with tracing.span("publish.write_ply", format=fmt, points=len(pc.coords)):
+        data = _serialize(pc.write_compact_ply if fmt == "compact" else pc.write_ply)
+        _write_local(local_out, data)
+    # Local dev artifact (optional)
+    _link_artifact(local_out)
+
+    encoding = None
+    if fmt == "compact" and PLY_GZIP:
+        encoding = "gzip"
+        data = gzip.compress(data, compresslevel=6, mtime=0)
+    return _upload(
+        job, _object_path(job.user, job.id), data, PLY_CONTENT_TYPE, "output.ply",
+        content_encoding=encoding, on_uploaded=on_uploaded,
     )
 
-    if proc.returncode != 0:
-        msg = (proc.stderr or proc.stdout or "Point-E failed")[:4000]
-        raise HTTPException(status_code=500, detail=f"Point-E error:\n{msg}")
-    if not local_out.exists() or local_out.stat().st_size == 0:
-        msg = (proc.stderr or proc.stdout or "Output not found or empty")[:4000]
-        raise HTTPException(status_code=500, detail=f"Point-E output missing:\n{msg}")
-
-    object_path = f"pointclouds/{user}/{job_id}/output.ply"
+def _publish_mesh(job: Job, mesh) -> dict:
+    """Write the GLB to local disk and queue its upload (see _upload)."""
+    local_out = OUTPUT_DIR / f"{job.id}.glb"
+    with tracing.span("publish.write_glb", faces=len(mesh.faces)):
+        # Point-E samples are +Z up, glTF is +Y up
+        data = _serialize(lambda f: mesh.write_glb(f, z_up=True))
+        _write_local(local_out, data)
+    _link_artifact(local_out)
+
+    result = _upload(job, f"meshes/{job.user}/{job.id}/mesh.glb", data, GLB_CONTENT_TYPE, "mesh.glb")
+    result.update(faces=int(len(mesh.faces)), vertices=int(len(mesh.verts)))
+    return result
+
+def _traced(job: Job, fn, *args):
+    """Run fn(job, *args) with its spans attributed to job.trace, then record the job's total time."""
+    with use_traces([job.trace]):
+        try:
+            return fn(job, *args)
+        finally:
+            if job.trace is not None:
+                job.trace.set(total_seconds=round(time.time() - job.created, 6))
+
+def _run_mesh(job: Job, ply_path: Path, grid_size: int, target_faces: int):
+    """Mesh a published point cloud (runs on mesh_pool)."""
+    if job.cancel_event.is_set():
+        job.set_status(CANCELLED)
+        return
+    job.set_status(RUNNING)
     try:
-        client = storage.Client()
-        bucket = client.bucket(BUCKET)
-        blob = bucket.blob(object_path)
-        blob.content_type = "application/octet-stream"
-        blob.cache_control = "public, max-age=86400"
-        blob.upload_from_filename(str(local_out))
+        pc = PointCloud.load_ply(str(ply_path))
+        mesh = mesher.mesh(pc, grid_size=grid_size, target_faces=target_faces)
+        if job.cancel_event.is_set():
+            job.set_status(CANCELLED)
+            return
+        job.result = _publish_mesh(job, mesh)
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"GCS upload failed: {e}")
-
-    url = blob.generate_signed_url(
-        version="v4",
-        expiration=datetime.timedelta(minutes=15),
-        method="GET",
-        response_disposition='inline; filename="output.ply"',
+        job.error, job.error_code = f"Meshing error:\n{str(e)[:4000]}", 500
+        job.set_status(FAILED, error=job.error)
+        return
+    job.emit("result", dict(job.result))
+    job.set_status(SUCCEEDED)
+
+def _to_point_cloud(samples):
+    # [C x N] tensor -> PointCloud, with the same channel handling as the final output
+    return engine.sampler_for().output_to_point_clouds(samples[None])[0]
+
+def _save_base(job: Job, pc: PointCloud):
+    """Keep the base-stage cloud so /api/jobs/{id}/upsample can resume from it (runs on publish_pool)."""
+    path = BASE_DIR / f"{job.id}.npz"
+    try:
+        pc.save(str(path), compressed=True)
+    except OSError:
+        return  # best-effort: the job itself doesn't need it
+    job.base_path = str(path)
+
+def _wait_for_base(job: Job):
+    """Wait for a pending _save_base(), so job.base_path is final."""
+    if job.base_saved is not None:
+        job.base_saved.result()
+
+def _load_base(job: Job) -> PointCloud:
+    _wait_for_base(job)
+    if job.base_path is None:
+        if job.finished:
+            raise HTTPException(status_code=404, detail=f"Job {job.id} has no base point cloud")
+        raise HTTPException(status_code=409, detail=f"Job {job.id} hasn't finished its base stage yet")
+    try:
+        return PointCloud.load(job.base_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Base point cloud is no longer available locally")
+
+def _on_progress(job: Job, p: Progress):
+    """Engine-thread callback: record progress and emit (throttled) previews."""
+    if job.status == QUEUED:
+        job.set_status(RUNNING)
+    job.stage, job.num_stages = p.stage, p.num_stages
+    job.step, job.total_steps = p.step, p.total_steps
+    info = {"stage": p.stage, "num_stages": p.num_stages, "step": p.step, "total_steps": p.total_steps}
+    if p.stage_done:
+        # The whole stage output (e.g. the 1024-point base cloud), not a preview.
+        pc = _to_point_cloud(p.samples)
+        if p.stage == 0:
+            # Compressing and writing it would hold up the whole batch; publish_pool does it.
+            job.base_saved = publish_pool.submit(_save_base, job, pc)
+        job.emit("stage", {**info, "points": preview_points(pc, len(pc.coords))})
+    elif JOB_PREVIEW_EVERY and p.step % JOB_PREVIEW_EVERY == 0:
+        pc = _to_point_cloud(p.samples)
+        job.emit("preview", {**info, "points": preview_points(pc, JOB_PREVIEW_POINTS)})
+    else:
+        job.emit("progress", info)
+
+def _finish(job: Job, fut: Future, fmt: str = "ply"):
+    """Publish a finished sample (runs on publish_pool, never on an engine worker)."""
+    if fut.cancelled() or job.cancel_event.is_set():
+        job.set_status(CANCELLED)
+        return
+    e = fut.exception()
+    if isinstance(e, GenerationCancelled):
+        job.set_status(CANCELLED)
+        return
+    if e is not None:
+        job.error, job.error_code = f"Point-E error:\n{str(e)[:4000]}", 500
+        job.set_status(FAILED, error=job.error)
+        return
+    try:
+        job.result = _publish(job, fut.result(), fmt, on_uploaded=lambda: _cache_result(job))
+    except Exception as e:
+        job.error, job.error_code = str(e)[:4000], 500
+        job.set_status(FAILED, error=job.error)
+        return
+    job.emit("result", dict(job.result))
+    job.set_status(SUCCEEDED)
+
+def _cache_result(job: Job):
+    """Remember a job's output once it's uploaded, so cache hits never point at a missing object."""
+    if job.cache_key is None:
+        return
+    _wait_for_base(job)
+    try:
+        results.put(
+            job.cache_key,
+            object_path=_object_path(job.user, job.id),
+            ply_path=OUTPUT_DIR / f"{job.id}.ply",
+            base_path=job.base_path,
+        )
+    except OSError:
+        pass  # caching is best-effort
+
+def _trace_job(job: Job, gen: GenerationRequest, profile: bool = False):
+    """Give a job a Trace and, if asked for (or sampled), a torch.profiler capture."""
+    if TRACING:
+        job.trace = gen.trace = Trace()
+    if profile or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE):
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        job.profile_path = gen.profile = str(PROFILE_DIR / f"{job.id}.json")
+
+def _start_job(req: GenerateReq, profile: bool = False) -> Job:
+    user = (req.user_id or "anon").replace("/", "_")
+    job = jobs.create(user=user, prompt=req.prompt)
+    seed = req.seed
+    if seed is None and req.deterministic:
+        seed = CACHE_DEFAULT_SEED
+    gen = GenerationRequest(
+        prompt=req.prompt,
+        seed=seed,
+        guidance=req.guidance,
+        no_upsample=bool(req.no_upsample),
+        sampler=[req.sampler] if isinstance(req.sampler, str) else req.sampler,
+        steps=[req.steps] if isinstance(req.steps, int) else req.steps,
+        adapter=req.adapter,
+        num_points=req.num_points,
+        on_progress=lambda p: _on_progress(job, p),
+        cancel_event=job.cancel_event,
     )
+    _trace_job(job, gen, profile)
+    return _submit_job(job, gen, req.format or PLY_FORMAT, {"prompt": normalize_prompt(req.prompt)})
 
-    # Save a local dev artifact (optional)
+def _submit_job(job: Job, gen: GenerationRequest, fmt: str, cache_fields: dict) -> Job:
+    """Validate, serve from the cache or enqueue a job's generation. Raises HTTPException."""
     try:
-        (ARTIFACTS_DIR / f"{job_id}.ply").write_bytes(local_out.read_bytes())
-    except Exception:
-        pass  # non-fatal
+        engine.stage_options(gen)
+        engine.check_base(gen)
+        engine.upsample_passes(gen)
+        if engine.ready:
+            engine.check_adapter(gen)
+    except ValueError as e:
+        job.error = str(e)
+        job.set_status(FAILED, error=job.error)
+        raise HTTPException(status_code=422, detail=str(e))
+    if gen.seed is not None and engine.ready:
+        job.cache_key = cache_key({**engine.settings(gen), **cache_fields, "format": fmt})
+        hit = results.get(job.cache_key)
+        if hit is not None:
+            if job.base_path is None and hit.get("base_path") and os.path.exists(hit["base_path"]):
+                job.base_path = hit["base_path"]
+            try:
+                job.result = {
+                    "job_id": job.id,
+                    "gcs_uri": store.uri(hit["object_path"]),
+                    "url": _sign_url(hit["object_path"]),
+                    "cached": True,
+                }
+            except Exception:
+                job.result = None  # fall through and regenerate
+            if job.result is not None:
+                job.emit("result", job.result)
+                job.set_status(SUCCEEDED)
+                return job
+
+    try:
+        job.future = engine.submit(gen)
+    except (EngineNotReady, EngineBusy) as e:
+        job.error = str(e)
+        job.set_status(FAILED, error=job.error)
+        if isinstance(e, EngineBusy):
+            raise HTTPException(status_code=429, detail=f"Server busy: {e}", headers={"Retry-After": "5"})
+        raise HTTPException(status_code=503, detail=f"Model not ready: {e}", headers={"Retry-After": "10"})
+    job.emit("status", {"status": QUEUED})
+    job.future.add_done_callback(lambda fut: publish_pool.submit(_traced, job, _finish, fut, fmt))
+    return job
+
+def _start_upsample_jobs(source: Job, req: UpsampleReq, profile: bool = False) -> list[Job]:
+    base = _load_base(source)
+    if req.seeds:
+        seeds = list(req.seeds)
+    else:
+        seeds = [None if req.seed is None else req.seed + i for i in range(req.variants)]
+    if not 1 <= len(seeds) <= UPSAMPLE_MAX_VARIANTS:
+        raise HTTPException(status_code=422, detail=f"variants must be between 1 and {UPSAMPLE_MAX_VARIANTS}")
+    user = (req.user_id or source.user).replace("/", "_")
+    fmt = req.format or PLY_FORMAT
+    started = []
+    try:
+        # Submitted back to back, so the engine samples the variants as one batch
+        # (up to ENGINE_MAX_BATCH).
+        for seed in seeds:
+            job = jobs.create(user=user, prompt=source.prompt)
+            job.base_path = source.base_path
+            gen = GenerationRequest(
+                prompt=source.prompt,
+                seed=seed,
+                sampler=None if req.sampler is None else [req.sampler],
+                steps=None if req.steps is None else [req.steps],
+                base=base,
+                num_points=req.num_points,
+                on_progress=lambda p, job=job: _on_progress(job, p),
+                cancel_event=job.cancel_event,
+            )
+            _trace_job(job, gen, profile)
+            started.append(_submit_job(job, gen, fmt, {}))
+    except HTTPException:
+        for job in started:
+            job.cancel()
+        raise
+    return started
+
+@app.get("/api/adapters")
+def list_adapters():
+    """Adapters a request can select with "adapter" (or "style")."""
+    if engine.adapters is None:
+        return {"adapters": [], "active": None}
+    return {"adapters": engine.adapters.names, "active": engine.adapters.active}
+
+def _get_job(job_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _wants_profile(x_profile: str | None) -> bool:
+    return (x_profile or "").strip().lower() in ("1", "true", "yes")
 
+@app.post("/api/generate")
+def generate_pointcloud(
+    req: GenerateReq,
+    x_profile: str | None = Header(default=None),
+    wait_upload: bool = Query(True, description="false returns once the output is on the server's disk"),
+):
+    """
+    Synchronous generation (kept for existing clients): waits for the job to finish
+    and, unless ?wait_upload=false, for its upload, so the returned URL is live.
+    """
+    job = _start_job(req, profile=_wants_profile(x_profile))
+    job.done.wait()
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=job.error_code or 500, detail=job.error or job.status)
+    if wait_upload and job.upload is not None:
+        try:
+            job.upload.result()
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Upload failed: {e}")
+    return job.result
+
+@app.post("/api/jobs", status_code=202)
+def create_job(req: GenerateReq, x_profile: str | None = Header(default=None)):
+    """
+    Queue a generation and return immediately; follow it via the status or events URL.
+    Send "X-Profile: 1" to capture a torch.profiler trace (GET /api/jobs/{id}/profile).
+    """
+    job = _start_job(req, profile=_wants_profile(x_profile))
     return {
-        "job_id": job_id,
-        "gcs_uri": f"gs://{BUCKET}/{object_path}",
-        "url": url,  # FE should fetch this
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events",
     }
 
-# ...existing code...
+@app.post("/api/mesh", status_code=202)
+def create_mesh_job(req: MeshReq):
+    """Turn a finished generation into a decimated, vertex-coloured GLB (as a job)."""
+    source = _get_job(req.job_id)
+    if source.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job {req.job_id} is {source.status}")
+    ply_path = OUTPUT_DIR / f"{source.id}.ply"
+    if not ply_path.exists() and source.cache_key is not None:
+        ply_path = results.ply_path(source.cache_key) or ply_path
+    if not ply_path.exists():
+        raise HTTPException(status_code=404, detail="Point cloud is no longer available locally")
+    grid_size = req.grid_size or MESH_GRID_SIZE
+    if not 16 <= grid_size <= MESH_MAX_GRID_SIZE:
+        raise HTTPException(status_code=422, detail=f"grid_size must be between 16 and {MESH_MAX_GRID_SIZE}")
+    target_faces = req.target_faces or MESH_TARGET_FACES
+    if target_faces < 4:
+        raise HTTPException(status_code=422, detail="target_faces must be at least 4")
+
+    user = (req.user_id or source.user).replace("/", "_")
+    job = jobs.create(user=user, prompt=source.prompt)
+    if TRACING:
+        job.trace = Trace()
+    job.future = mesh_pool.submit(_traced, job, _run_mesh, ply_path, grid_size, target_faces)
+    job.emit("status", {"status": QUEUED})
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events",
+    }
+
+@app.post("/api/jobs/{job_id}/upsample", status_code=202)
+def upsample_job(job_id: str, req: UpsampleReq, x_profile: str | None = Header(default=None)):
+    """
+    Re-run only the upsampler on a job's base cloud, e.g. with new seeds or a
+    different num_points. The job may still be running once its base stage is
+    done. Each variant is a job of its own.
+    """
+    started = _start_upsample_jobs(_get_job(job_id), req, profile=_wants_profile(x_profile))
+    return {
+        "source_job_id": job_id,
+        "jobs": [
+            {
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": f"/api/jobs/{job.id}",
+                "events_url": f"/api/jobs/{job.id}/events",
+            }
+            for job in started
+        ],
+    }
+
+@app.get("/api/jobs/{job_id}")
+def job_status(job_id: str):
+    return _get_job(job_id).snapshot()
+
+@app.get("/api/jobs/{job_id}/profile")
+def job_profile(job_id: str):
+    """The job's torch.profiler capture, in Chrome trace format (chrome://tracing, Perfetto)."""
+    job = _get_job(job_id)
+    if job.profile_path is None:
+        raise HTTPException(status_code=404, detail="Job was not profiled")
+    if not os.path.exists(job.profile_path):
+        raise HTTPException(status_code=409 if not job.finished else 404, detail="Profile not available")
+    return FileResponse(job.profile_path, media_type="application/json", filename=f"{job.id}.trace.json")
+
+@app.delete("/api/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a job; a running batch stops sampling once none of its jobs are wanted."""
+    job = _get_job(job_id)
+    if not job.cancel():
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return job.snapshot()
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, since: int = 0):
+    """
+    Server-Sent Events stream of a job: status, progress, preview (downsampled
+    pred_xstart), stage (full output of a finished stage), result and upload
+    (the result's file reached storage, or failed to) events. The stream ends
+    after the upload event. Pass ?since=N to resume after the first N events.
+    """
+    job = _get_job(job_id)
+
+    async def stream():
+        idx = since
+        last_sent = time.monotonic()
+        while True:
+            events = job.events_since(idx)
+            for name, data in events:
+                yield f"id: {idx}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+                idx += 1
+            if events:
+                last_sent = time.monotonic()
+            elif job.finished and (job.upload is None or job.upload.done()):
+                break
+            elif await request.is_disconnected():
+                break
+            elif time.monotonic() - last_sent > SSE_KEEPALIVE_SECONDS:
+                # Comment line: keeps proxies from timing out idle streams.
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(0.1)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/api/pointcloud/url")
 def sign_existing(object_path: str = Query(..., description="e.g. pointclouds/anon/<job>/output.ply")):
-    """Sign an existing object path and return a temporary GET URL."""
-    client = storage.Client()
-    blob = client.bucket(BUCKET).blob(object_path)
-    if not blob.exists():
+    """
+    Return a temporary GET URL for a published object. Nothing is looked up: the
+    URL of an object that doesn't exist answers 404 itself.
+    """
+    if not object_path.startswith(("pointclouds/", "meshes/")) or ".." in object_path.split("/"):
+        raise HTTPException(status_code=400, detail="Not a published object path")
+    return {"url": _sign_url(object_path, filename=object_path.rsplit("/", 1)[-1])}
+
+@app.get("/api/objects/{object_path:path}", include_in_schema=False)
+def get_object(object_path: str, expires: int, filename: str, signature: str):
+    """Serve an object of the local store (STORAGE_BACKEND=local) through its signed URL."""
+    if not isinstance(store, LocalStore):
+        raise HTTPException(status_code=404, detail="Not found")
+    if not store.verify(object_path, expires, filename, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired signature")
+    try:
+        path, meta = store.file(object_path), store.metadata(object_path)
+    except (ValueError, OSError):
         raise HTTPException(status_code=404, detail="Object not found")
-    url = blob.generate_signed_url(
-        version="v4",
-        expiration=datetime.timedelta(minutes=15),
-        method="GET",
-        response_disposition='inline; filename="output.ply"',
+    headers = {"Cache-Control": meta["cache_control"], "Content-Encoding": meta["content_encoding"]}
+    return FileResponse(
+        path,
+        media_type=meta["content_type"],
+        filename=filename,
+        content_disposition_type="inline",
+        headers={k: v for k, v in headers.items() if v},
     )
-    return {"url": url}
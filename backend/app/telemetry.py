@@ -0,0 +1,312 @@
+# telemetry.py
+"""
+Request tracing and Prometheus metrics.
+
+Tracer implements the hooks in point_e.util.tracing. Every span's duration
+goes into a latency histogram labelled by span name, its model_evals into a
+counter, and - when the work was done for requests - into each request's
+Trace, which sums up where that request's time went (see Job.snapshot()).
+Spans find their requests through a context variable set with use_traces(),
+so the vendored sampler needs no knowledge of jobs; a batch shared by several
+requests is attributed to all of them.
+
+While torch.profiler is recording, spans also show up in the profile as
+record_function ranges.
+
+render() produces the Prometheus text exposition format; no client library
+is needed. Worker processes (see workers.py) drain() their histograms and
+counters after every request and the server merges them into its own, so
+/metrics covers the whole pool.
+"""
+import bisect
+import contextvars
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import torch
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# Seconds; covers a single sampling step up to a full CPU generation.
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600,
+)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+# Span attributes that are counts to add up; any other numeric attribute keeps its max.
+SUMMED_ATTRS = frozenset(["model_evals"])
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of this process so far."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # Linux reports KiB
+
+
+# ---- metrics ----
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # counts per bucket, +Inf, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def drain(self) -> dict:
+        """Return and reset the observations so far, for merge() in another process."""
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, series: dict):
+        with self._lock:
+            for label_values, counts in series.items():
+                mine = self._series.setdefault(label_values, [0] * len(counts))
+                for i, n in enumerate(counts):
+                    mine[i] += n
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for values, series in items:
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                total += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labels = _labels(self.labels, values, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {total}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + n
+
+    def drain(self) -> dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: dict):
+        with self._lock:
+            for label_values, n in values.items():
+                self._values[label_values] = self._values.get(label_values, 0) + n
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in items]
+        return lines
+
+
+class Gauge:
+    """A value read at scrape time: fn returns a number, or {label values: number}."""
+
+    def __init__(self, name: str, help: str, fn: Callable, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        value = self.fn()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for label_values, v in sorted(items):
+            if v is not None:
+                lines.append(f"{self.name}{_labels(self.labels, label_values)} {float(v)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for m in self.metrics for line in m.render()) + "\n"
+
+    def drain(self) -> Dict[str, dict]:
+        """Observations of every histogram and counter since the last drain(), by name."""
+        return {m.name: m.drain() for m in self.metrics if hasattr(m, "drain")}
+
+    def merge(self, drained: Dict[str, dict]):
+        for m in self.metrics:
+            if m.name in drained:
+                m.merge(drained[m.name])
+
+
+REGISTRY = Registry()
+SPAN_SECONDS = REGISTRY.register(Histogram(
+    "imagicle_span_seconds", "Duration of traced work (load, CLIP, stages, steps, publishing)", ["span"]
+))
+MODEL_EVALS = REGISTRY.register(Counter(
+    "imagicle_model_evals_total", "Diffusion model forward passes", ["span"]
+))
+QUEUE_WAIT = REGISTRY.register(Histogram(
+    "imagicle_queue_wait_seconds", "Time from submission until a request's batch starts"
+))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "imagicle_batch_size", "Requests per sampled batch", buckets=BATCH_BUCKETS
+))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    "imagicle_http_request_seconds", "HTTP request latency", ["method", "route", "status"]
+))
+REGISTRY.register(Gauge(
+    "imagicle_peak_rss_bytes", "Peak resident set size of the process", peak_rss_bytes
+))
+
+
+# ---- tracing ----
+
+_current_traces: contextvars.ContextVar[Tuple["Trace", ...]] = contextvars.ContextVar(
+    "traces", default=()
+)
+
+
+class Trace:
+    """Where one request's time went: per span name, the count, total and max seconds."""
+
+    def __init__(self):
+        self.created = time.time()
+        self.spans: Dict[str, dict] = {}
+        self.attrs: dict = {}
+        self._lock = threading.Lock()
+
+    def set(self, **attrs):
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def add(self, name: str, seconds: float, attrs: dict):
+        self._add(name, 1, seconds, seconds, attrs)
+
+    def merge(self, summary: dict):
+        """Fold in the summary() of a trace recorded elsewhere, e.g. in a worker process."""
+        spans = summary.get("spans", {})
+        self.set(**{k: v for k, v in summary.items() if k != "spans"})
+        for name, entry in spans.items():
+            attrs = {k: v for k, v in entry.items() if k not in ("count", "seconds", "max_seconds")}
+            self._add(name, entry["count"], entry["seconds"], entry["max_seconds"], attrs)
+
+    def _add(self, name: str, count: int, seconds: float, max_seconds: float, attrs: dict):
+        with self._lock:
+            entry = self.spans.get(name)
+            if entry is None:
+                entry = self.spans[name] = {"count": 0, "seconds": 0.0, "max_seconds": 0.0}
+            entry["count"] += count
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], max_seconds)
+            for key, value in attrs.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    entry[key] = value
+                elif key in SUMMED_ATTRS:
+                    entry[key] = entry.get(key, 0) + value
+                else:
+                    entry[key] = max(entry.get(key, value), value)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {**self.attrs, "spans": {k: dict(v) for k, v in self.spans.items()}}
+
+
+@contextmanager
+def use_traces(traces: Iterable[Optional[Trace]]):
+    """Attribute the spans of this block (in this thread / task) to the given traces."""
+    token = _current_traces.set(tuple(t for t in traces if t is not None))
+    try:
+        yield
+    finally:
+        _current_traces.reset(token)
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "traces", "start", "_range")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self._range = None
+
+    def __enter__(self) -> "_Span":
+        self.traces = _current_traces.get()
+        if torch.autograd._profiler_enabled():
+            self._range = torch.profiler.record_function(self.name)
+            self._range.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        if self._range is not None:
+            self._range.__exit__(exc_type, exc, tb)
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attrs["error"] = exc_type.__name__
+        SPAN_SECONDS.observe(elapsed, self.name)
+        evals = self.attrs.get("model_evals")
+        if evals:
+            MODEL_EVALS.inc(evals, self.name)
+        if self.traces:
+            self.attrs["peak_rss_bytes"] = peak_rss_bytes()
+            for trace in self.traces:
+                trace.add(self.name, elapsed, self.attrs)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, n: float = 1):
+        self.attrs[key] = self.attrs.get(key, 0) + n
+
+
+class Tracer:
+    """step_spans: also time every solver step (see point_e.util.tracing)."""
+
+    def __init__(self, step_spans: bool = False):
+        self.step_spans = step_spans
+
+    def span(self, name: str, **attrs) -> _Span:
+        return _Span(name, attrs)
@@ -0,0 +1,549 @@
+# workers.py
+"""
+Multi-process generation for many-core CPU hosts.
+
+A single process can't keep 32+ cores busy: intra-op threading stops scaling
+at small batch sizes. WorkerPool runs one engine per group of cores instead:
+
+  * a zygote process (started with spawn, so it inherits none of the server's
+    threads) loads the models once, then does nothing but fork workers;
+  * each worker is a fork of the zygote, pinned to its own cores with as many
+    torch threads, serving an InferenceEngine with a single sampling thread.
+    Forked workers share the zygote's weights copy-on-write (the diffusion
+    weights are file-backed on top of that), so N workers don't hold N copies
+    of the models, and a crashed worker is replaced in milliseconds;
+  * in the server, WorkerPool is an InferenceEngine whose submit() queues
+    requests for a dispatcher thread that hands each one to the least busy
+    worker: idle ones first, and at most max_batch_size requests per worker,
+    which the worker micro-batches as usual. Progress, traces and metrics come
+    back over the worker's connection;
+  * when a worker exits, its requests fail with WorkerCrashed and the zygote
+    forks a replacement;
+  * adapters registered at runtime are loaded by the zygote (so later forks
+    have them) and by every running worker before any request can use them.
+
+The pool is CPU only: CUDA can't be used across fork.
+"""
+import dataclasses
+import itertools
+import os
+import pickle
+import signal
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError, get_context
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+from .engine import (
+    CancelEvent,
+    EngineNotReady,
+    GenerationCancelled,
+    GenerationRequest,
+    InferenceEngine,
+    Progress,
+)
+from .telemetry import REGISTRY, Trace, Tracer, peak_rss_bytes
+
+from point_e.diffusion.configs import DIFFUSION_CONFIGS, diffusion_from_config
+from point_e.util import tracing
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process running a request exited before finishing it."""
+
+
+def plan_cores(processes: int, cores_per_process: Optional[int] = None) -> List[List[int]]:
+    """Split the CPUs this process may use into one contiguous set per worker."""
+    if hasattr(os, "sched_getaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+    per = cores_per_process or max(1, len(available) // processes)
+    # More workers than cores (or an explicit overcommit) wraps around.
+    return [[available[(i * per + j) % len(available)] for j in range(per)] for i in range(processes)]
+
+
+class _Worker:
+    def __init__(self, index: int, cores: List[int]):
+        self.index = index
+        self.cores = cores
+        self.conn: Optional[Connection] = None  # None while (re)starting
+        self.pid: Optional[int] = None
+        self.pending: Dict[int, Tuple[GenerationRequest, Future]] = {}
+        self.cancelled = set()  # request ids whose cancellation was forwarded
+        self.send_lock = threading.Lock()
+        self.started = 0.0
+        self.restarts = 0
+        self.quick_exits = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.peak_rss_bytes: Optional[int] = None
+
+    def send(self, conn: Connection, *msg):
+        with self.send_lock:
+            conn.send(msg)
+
+
+class _AdapterNames:
+    """The server's view of the workers' adapter registries: names and digests only."""
+
+    def __init__(self, digests: Dict[str, str]):
+        self._digests = dict(digests)
+        self.active = None  # differs per worker
+
+    @property
+    def names(self):
+        return sorted(self._digests)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._digests
+
+    def digest(self, name: str) -> str:
+        return self._digests[name]
+
+    def add(self, name: str, digest: str):
+        self._digests[name] = digest
+
+    def stats(self) -> dict:
+        return {"adapters": self.names, "active": None, "switches": None}
+
+
+class WorkerPool(InferenceEngine):
+    def __init__(
+        self,
+        processes: int,
+        cores_per_process: Optional[int] = None,
+        **engine_options,
+    ):
+        """
+        :param processes: number of worker processes.
+        :param cores_per_process: cores pinned per worker (default: all of
+                                  them, split evenly).
+        :param engine_options: InferenceEngine options. num_threads sets the
+                               torch threads per worker (default: one per
+                               pinned core); concurrency is ignored.
+        """
+        super().__init__(**engine_options)
+        if self.device.type != "cpu":
+            raise ValueError(f"the worker pool runs on CPU only, not {self.device}")
+        assert processes > 0
+        self.processes = processes
+        self.concurrency = processes
+        self._workers = [_Worker(i, cores) for i, cores in enumerate(plan_cores(processes, cores_per_process))]
+        # Each worker queues at most max_batch_size requests (the dispatcher never sends more).
+        self._worker_options = dict(
+            engine_options, device=self.device, concurrency=1, num_threads=None,
+            max_queue=self.max_batch_size,
+        )
+        self._ids = itertools.count()
+        self._cond = threading.Condition()
+        self._authkey = os.urandom(32)
+        self._listener: Optional[Listener] = None
+        self._zygote = None
+        self._zygote_conn: Optional[Connection] = None
+        self._zygote_lock = threading.Lock()
+        self._registered: Dict[str, Tuple[str, float]] = {}  # runtime adapters: name -> (path, alpha)
+
+    # ------------------------- lifecycle -------------------------
+
+    def _load_and_serve(self):
+        t0 = time.perf_counter()
+        ctx = get_context("spawn")
+        self._listener = Listener(family="AF_UNIX", authkey=self._authkey)
+        self._zygote_conn, child_conn = ctx.Pipe()
+        self._zygote = ctx.Process(
+            target=_zygote_main,
+            args=(
+                self._worker_options,
+                tracing.enabled(),
+                tracing.steps_enabled(),
+                child_conn,
+                self._listener.address,
+                self._authkey,
+            ),
+            name="engine-zygote",
+            daemon=True,
+        )
+        self._zygote.start()
+        child_conn.close()
+        try:
+            kind, info = self._zygote_conn.recv()
+        except (EOFError, OSError):
+            self._zygote.join(5)
+            kind, info = "error", f"model process exited with code {self._zygote.exitcode}"
+        if kind == "error":
+            self.load_error = info
+            return
+
+        REGISTRY.merge(info["metrics"])
+        self.adapters = _AdapterNames(info["adapters"])
+        # The models live in the workers; these are enough for sampler_for() and settings().
+        self.base_model = self.upsampler_model = None
+        self.base_diffusion = diffusion_from_config(DIFFUSION_CONFIGS[self.base_name])
+        self.upsampler_diffusion = diffusion_from_config(DIFFUSION_CONFIGS[self.upsampler_name])
+
+        for target, name in ((self._accept, "engine-accept"), (self._dispatch, "engine-dispatch")):
+            t = threading.Thread(target=target, name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        for worker in self._workers:
+            self._fork(worker)
+        with self._cond:
+            while any(w.conn is None for w in self._workers) and self._zygote.is_alive():
+                self._cond.wait(1.0)
+        if not self._zygote.is_alive():
+            self.load_error = "model process exited while starting workers"
+            return
+        self.load_seconds = time.perf_counter() - t0
+        self._ready.set()
+
+    def shutdown(self, timeout: Optional[float] = None):
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(None)
+        except Exception:
+            pass
+        for worker in self._workers:
+            conn = worker.conn
+            if conn is not None:
+                try:
+                    worker.send(conn, "stop")
+                except OSError:
+                    pass
+        if self._zygote_conn is not None:
+            try:
+                with self._zygote_lock:
+                    self._zygote_conn.send(("stop",))
+            except OSError:
+                pass
+        if self._zygote is not None:
+            self._zygote.join(timeout)
+        if self._listener is not None:
+            self._listener.close()
+        with self._cond:
+            self._cond.notify_all()
+
+    def register_adapter(self, name: str, path: str, alpha: Optional[float] = None):
+        """Add or replace an adapter in the zygote and every worker; requests can use it right away."""
+        if self.adapters is None:
+            raise EngineNotReady(self.load_error or "models are still loading")
+        alpha = self.adapter_alpha if alpha is None else alpha
+        try:
+            with self._zygote_lock:
+                self._zygote_conn.send(("adapter", name, path, alpha))
+                kind, info = self._zygote_conn.recv()
+        except (EOFError, OSError):
+            raise EngineNotReady("model process exited")
+        if kind == "error":
+            raise ValueError(info)
+        # The name is published only once every worker has been sent the adapter, and
+        # a connecting worker gets it before it is visible to the dispatcher, so no
+        # request naming it can reach a worker ahead of it.
+        with self._cond:
+            self._registered[name] = (path, alpha)
+            for worker in self._workers:
+                if worker.conn is not None:
+                    self._send_adapter(worker, worker.conn, name)
+            self.adapters.add(name, info)
+            self.adapter_paths[name] = path
+
+    def stats(self) -> dict:
+        out = super().stats()
+        with self._cond:
+            workers = [
+                {
+                    "index": w.index,
+                    "pid": w.pid,
+                    "alive": w.conn is not None,
+                    "cores": w.cores,
+                    "in_flight": len(w.pending),
+                    "restarts": w.restarts,
+                    "batches": w.batches,
+                    "peak_rss_bytes": w.peak_rss_bytes,
+                }
+                for w in self._workers
+            ]
+            batches = sum(w.batches for w in self._workers)
+            batched = sum(w.batched_requests for w in self._workers)
+        out.update(
+            processes=self.processes,
+            in_flight=sum(w["in_flight"] for w in workers),
+            batches=batches,
+            mean_batch_size=batched / batches if batches else None,
+            workers=workers,
+        )
+        return out
+
+    # ------------------------- server side -------------------------
+
+    def _fork(self, worker: _Worker):
+        threads = self.num_threads or len(worker.cores)
+        try:
+            with self._zygote_lock:
+                self._zygote_conn.send(("fork", worker.index, worker.cores, threads))
+        except OSError:
+            self.load_error = "model process exited; workers can't be restarted"
+            with self._cond:
+                self._cond.notify_all()
+
+    def _accept(self):
+        while not self._stopping.is_set():
+            try:
+                conn = self._listener.accept()
+                _, index, pid = conn.recv()  # ("hello", index, pid)
+            except (EOFError, OSError, AuthenticationError):
+                if self._stopping.is_set():
+                    break
+                continue
+            worker = self._workers[index]
+            with self._cond:
+                # It may have been forked before a runtime adapter reached the zygote.
+                for name in self._registered:
+                    self._send_adapter(worker, conn, name)
+                worker.conn, worker.pid, worker.started = conn, pid, time.monotonic()
+                self._cond.notify_all()
+            t = threading.Thread(target=self._read, args=(worker, conn), name=f"engine-conn-{index}", daemon=True)
+            t.start()
+
+    def _send_adapter(self, worker: _Worker, conn: Connection, name: str):
+        try:
+            worker.send(conn, "adapter", name, *self._registered[name])
+        except OSError:
+            pass  # the worker is gone; its replacement gets the adapter on connecting
+
+    def _dispatch(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            req, fut = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            if req.cancelled:
+                fut.set_exception(GenerationCancelled("cancelled"))
+                continue
+            with self._cond:
+                while True:
+                    idle = [w for w in self._workers if w.conn is not None and len(w.pending) < self.max_batch_size]
+                    if idle or self._stopping.is_set() or not self._zygote.is_alive():
+                        break
+                    self._cond.wait(1.0)
+                if idle:
+                    worker = min(idle, key=lambda w: len(w.pending))
+                    rid = next(self._ids)
+                    worker.pending[rid] = (req, fut)
+                    conn = worker.conn
+            if not idle:
+                fut.set_exception(WorkerCrashed("no worker process is running"))
+                continue
+            # Hooks stay here; the worker reports progress and its trace back instead.
+            payload = dataclasses.replace(req, on_progress=None, cancel_event=None, trace=None)
+            payload.enqueued = req.enqueued  # same host, same monotonic clock
+            try:
+                worker.send(conn, "submit", rid, payload, req.on_progress is not None, req.trace is not None)
+            except OSError:
+                pass  # the worker is gone; _read() fails its requests
+            if isinstance(req.cancel_event, CancelEvent):
+                # Passed on as soon as it happens, also while the request waits in the
+                # worker's queue (where no progress messages come back to notice it).
+                req.cancel_event.add_callback(lambda worker=worker, rid=rid: self._cancel(worker, rid))
+
+    def _read(self, worker: _Worker, conn: Connection):
+        while True:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                break
+            if msg[0] == "progress":
+                self._on_progress(worker, conn, *msg[1:])
+            elif msg[0] == "done":
+                self._on_done(worker, *msg[1:])
+        self._lost(worker, conn)
+
+    def _on_progress(self, worker: _Worker, conn: Connection, rid, stage, num_stages, step, total_steps,
+                     samples, stage_done):
+        item = worker.pending.get(rid)
+        if item is None:
+            return
+        req, _ = item
+        if req.cancelled:
+            self._cancel(worker, rid)  # for plain threading.Event cancel_events
+        elif req.on_progress is not None:
+            try:
+                req.on_progress(
+                    Progress(stage, num_stages, step, total_steps, torch.from_numpy(samples), stage_done)
+                )
+            except Exception:
+                pass  # as in InferenceEngine._notify, a broken observer doesn't fail the request
+
+    def _cancel(self, worker: _Worker, rid: int):
+        with self._cond:
+            conn = worker.conn
+            if rid in worker.cancelled or rid not in worker.pending or conn is None:
+                return
+            worker.cancelled.add(rid)
+        try:
+            worker.send(conn, "cancel", rid)
+        except OSError:
+            pass
+
+    def _on_done(self, worker: _Worker, rid, result, error, trace, metrics, counters):
+        REGISTRY.merge(metrics)
+        with self._cond:
+            req, fut = worker.pending.pop(rid)
+            worker.cancelled.discard(rid)
+            worker.batches, worker.batched_requests, worker.peak_rss_bytes = counters
+            self._cond.notify_all()
+        if trace is not None and req.trace is not None:
+            req.trace.merge(trace)
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(result)
+
+    def _lost(self, worker: _Worker, conn: Connection):
+        with self._cond:
+            if worker.conn is not conn:
+                return
+            pending, worker.pending, worker.conn = worker.pending, {}, None
+            worker.cancelled.clear()
+            self._cond.notify_all()
+        conn.close()
+        for _, fut in pending.values():
+            fut.set_exception(WorkerCrashed(f"worker {worker.index} (pid {worker.pid}) exited"))
+        if self._stopping.is_set():
+            return
+        worker.restarts += 1
+        if time.monotonic() - worker.started < 10:
+            # Back off if a worker keeps dying right after it starts.
+            worker.quick_exits += 1
+            time.sleep(min(30.0, 0.5 * 2 ** worker.quick_exits))
+        else:
+            worker.quick_exits = 0
+        self._fork(worker)
+
+
+# ------------------------- zygote and worker processes -------------------------
+
+def _zygote_main(engine_options: dict, traced: bool, trace_steps: bool, conn: Connection, address, authkey: bytes):
+    """Load the models once, then fork a worker for every ("fork", ...) request."""
+    # A single thread keeps OpenMP from starting a thread pool that the forks would inherit broken.
+    torch.set_num_threads(1)
+    tracing.set_tracer(Tracer(step_spans=trace_steps) if traced else None)
+    engine = InferenceEngine(**engine_options)
+    if not engine.load_models():
+        conn.send(("error", engine.load_error))
+        return
+    adapters = {name: engine.adapters.digest(name) for name in engine.adapters.names}
+    conn.send(("ready", {"adapters": adapters, "metrics": REGISTRY.drain()}))
+
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # exited workers are reaped automatically
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break  # the server is gone
+        if msg[0] == "stop":
+            break
+        if msg[0] == "adapter":
+            _, name, path, alpha = msg
+            try:
+                engine.register_adapter(name, path, alpha)
+                conn.send(("ok", engine.adapters.digest(name)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+            continue
+        _, index, cores, threads = msg
+        if os.fork() == 0:
+            code = 0
+            try:
+                conn.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                _worker_main(engine, index, cores, threads, address, authkey)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+
+
+def _worker_main(engine: InferenceEngine, index: int, cores: List[int], threads: int, address, authkey: bytes):
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    conn = Client(address, authkey=authkey)
+    send_lock = threading.Lock()
+
+    def send(*msg):
+        with send_lock:
+            conn.send(msg)
+
+    cancel_events: Dict[int, threading.Event] = {}
+    futures: Dict[int, Future] = {}
+
+    def reply(rid: int, req: GenerationRequest, fut: Future):
+        cancel_events.pop(rid, None)
+        futures.pop(rid, None)
+        if fut.cancelled():
+            error, result = GenerationCancelled("cancelled"), None
+        else:
+            error = fut.exception()
+            result = fut.result() if error is None else None
+        counters = (engine._batches, engine._batched_requests, peak_rss_bytes())
+        trace = req.trace.summary() if req.trace is not None else None
+        send("done", rid, result, _picklable(error), trace, REGISTRY.drain(), counters)
+
+    def submit(rid: int, req: GenerationRequest, progress: bool, traced: bool):
+        req.cancel_event = cancel_events[rid] = threading.Event()
+        req.trace = Trace() if traced else None
+        if progress:
+            req.on_progress = lambda p: send(
+                "progress", rid, p.stage, p.num_stages, p.step, p.total_steps,
+                p.samples.detach().cpu().numpy(), p.stage_done,
+            )
+        try:
+            fut = engine.submit(req)
+        except Exception as e:
+            fut = Future()
+            fut.set_exception(e)
+        futures[rid] = fut
+        fut.add_done_callback(lambda fut: reply(rid, req, fut))
+
+    engine.serve()
+    send("hello", index, os.getpid())
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg[0] == "submit":
+            submit(*msg[1:])
+        elif msg[0] == "adapter":
+            try:
+                engine.register_adapter(*msg[1:])
+            except Exception:
+                traceback.print_exc()  # requests naming it fail with an unknown-adapter error
+        elif msg[0] == "cancel":
+            event, fut = cancel_events.get(msg[1]), futures.get(msg[1])
+            if event is not None:
+                event.set()
+            if fut is not None:
+                fut.cancel()  # still queued: dropped without sampling
+        elif msg[0] == "stop":
+            break
+    engine.shutdown(timeout=5)
+
+
+def _picklable(error: Optional[BaseException]) -> Optional[BaseException]:
+    if error is None:
+        return None
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return RuntimeError(f"{type(error).__name__}: {error}")
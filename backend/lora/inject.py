@@ -23,3 +23,6 @@ def inject_lora(model: nn.Module, r=16, alpha=16, dropout=0.0, verbose=True):
     if verbose: print(f"[LoRA] total wrapped: {c}")
     return model
 def lora_params(model): return [p for n,p in model.named_parameters() if "lora_" in n and p.requires_grad]
+def lora_state_dict(model):
+    """Only the adapter factors (what training should save and AdapterRegistry loads)."""
+    return {n: p.detach().cpu() for n,p in model.state_dict().items() if "lora_" in n}
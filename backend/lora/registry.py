@@ -0,0 +1,212 @@
+"""
+Named LoRA adapters over one shared base model.
+
+The registry keeps a single copy of the base model and only the low-rank
+factors of each adapter. Activating an adapter merges its deltas into the
+targeted nn.Linear weights in place, so sampling with it costs exactly as
+much as sampling with the base model (no extra matmuls or modules on the
+forward path). Switching restores the pristine weights of the touched layers
+first, so unmerging is exact and adapters never accumulate rounding error
+(subtracting the delta back out drifts by an ulp or so per switch, and the
+drift compounds). The pristine copies are written to a file in snapshot_dir
+and memory-mapped, so they live in the page cache (read back only when an
+adapter is switched out, and evictable) instead of duplicating the targeted
+layers in process or GPU memory. snapshot_dir should be on disk, not tmpfs.
+
+Adapters are the lora_A / lora_B tensors saved from a model wrapped with
+inject_lora() (see lora_state_dict()), keyed by the wrapped module's name,
+e.g. "backbone.resblocks.0.attn.c_qkv.lora_A".
+
+Since the weights are shared, a model can only serve one adapter at a time:
+use() lets any number of threads sample with the active adapter and waits for
+them all to finish before switching to another one.
+
+Merging needs float weights: it works under bfloat16/float16 inference (the
+delta is added in float32 and rounded once) and with traced or compiled
+backbones (the graphs read the same parameters), but not after dynamic int8
+quantization, whose packed weights are rejected at register().
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Mapping, Optional, Tuple, Union
+
+import torch
+import torch.nn as nn
+
+LoRAFactors = Dict[str, Tuple[torch.Tensor, torch.Tensor, float]]
+
+
+def load_adapter(
+    adapter: Union[str, Mapping[str, torch.Tensor]], alpha: float = 16
+) -> LoRAFactors:
+    """
+    Collect {layer name: (A, B, scaling)} from an adapter file or state dict.
+    Non-LoRA entries (e.g. a full model state dict) are ignored.
+    """
+    sd = torch.load(adapter, map_location="cpu") if isinstance(adapter, str) else adapter
+    factors = {}
+    for key, a in sd.items():
+        if not key.endswith(".lora_A"):
+            continue
+        layer = key[: -len(".lora_A")]
+        b = sd.get(f"{layer}.lora_B")
+        if b is None:
+            raise ValueError(f"adapter has {key} but no {layer}.lora_B")
+        if b.shape[1] != a.shape[0]:
+            raise ValueError(f"rank mismatch for {layer}: A {tuple(a.shape)}, B {tuple(b.shape)}")
+        factors[layer] = (a.detach().float().cpu(), b.detach().float().cpu(), alpha / a.shape[0])
+    if not factors:
+        raise ValueError("no lora_A / lora_B tensors found in adapter")
+    return factors
+
+
+class AdapterRegistry:
+    def __init__(self, model: nn.Module, snapshot_dir: Optional[str] = None):
+        self.model = model
+        self.snapshot_dir = snapshot_dir
+        self._adapters: Dict[str, LoRAFactors] = {}
+        self._digests: Dict[str, str] = {}
+        self._base: Dict[str, torch.Tensor] = {}  # pristine weights of every targeted layer (mmapped)
+        self._active: Optional[str] = None
+        self._users = 0
+        self._cond = threading.Condition()
+        self.switches = 0
+
+    @property
+    def names(self):
+        return sorted(self._adapters)
+
+    @property
+    def active(self) -> Optional[str]:
+        return self._active
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._adapters
+
+    def digest(self, name: str) -> str:
+        """Content hash of an adapter's factors, e.g. for cache keys."""
+        return self._digests[name]
+
+    def register(
+        self, name: str, adapter: Union[str, Mapping[str, torch.Tensor]], alpha: float = 16
+    ):
+        """
+        Add (or replace) a named adapter. Only its factors are kept; the base
+        weights of layers it touches are snapshotted the first time any
+        adapter targets them.
+        """
+        factors = load_adapter(adapter, alpha)
+        for layer, (a, b, _) in factors.items():
+            linear = self._linear(layer)
+            if (b.shape[0], a.shape[1]) != tuple(linear.weight.shape):
+                raise ValueError(
+                    f"adapter {name!r} does not fit {layer}: "
+                    f"{(b.shape[0], a.shape[1])} vs {tuple(linear.weight.shape)}"
+                )
+        with self._cond:
+            # Replacing the active adapter must not change weights under a running sampler.
+            while name == self._active and self._users:
+                self._cond.wait()
+            if name == self._active:
+                self._restore()
+            new_layers = [layer for layer in factors if layer not in self._base]
+            if new_layers:
+                self._base.update(self._snapshot(new_layers))
+            self._adapters[name] = factors
+            self._digests[name] = _digest(factors)
+
+    def unregister(self, name: str):
+        with self._cond:
+            while name == self._active and self._users:
+                self._cond.wait()
+            if name == self._active:
+                self._restore()
+            del self._adapters[name]
+            del self._digests[name]
+
+    def activate(self, name: Optional[str]):
+        """Merge `name` into the model (None: plain base model). Not thread-safe; see use()."""
+        if name == self._active:
+            return
+        if name is not None and name not in self._adapters:
+            raise KeyError(f"unknown adapter {name!r}")
+        self._restore()
+        if name is not None:
+            with torch.no_grad():
+                for layer, (a, b, scaling) in self._adapters[name].items():
+                    weight = self._linear(layer).weight
+                    base = self._base[layer]
+                    delta = (b.to(weight.device) @ a.to(weight.device)) * scaling
+                    weight.copy_((base.float() + delta).to(weight.dtype))
+        self._active = name
+        self.switches += 1
+
+    @contextmanager
+    def use(self, name: Optional[str]) -> Iterator[None]:
+        """
+        Hold the model with adapter `name` merged. Concurrent users of the
+        same adapter share it; a different adapter waits until they are done.
+        """
+        with self._cond:
+            while name != self._active and self._users:
+                self._cond.wait()
+            self.activate(name)
+            self._users += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._users -= 1
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {"adapters": self.names, "active": self._active, "switches": self.switches}
+
+    def _snapshot(self, layers) -> Dict[str, torch.Tensor]:
+        """Memory-mapped copies of the given layers' current weights."""
+        weights = {layer: self._linear(layer).weight.detach().cpu() for layer in layers}
+        if self.snapshot_dir is not None:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix="lora-base-", suffix=".pt", dir=self.snapshot_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                torch.save(weights, f)
+            return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+        finally:
+            try:
+                os.remove(path)  # the mapping stays valid; the space is freed with it
+            except OSError:
+                pass
+
+    def _restore(self):
+        if self._active is None:
+            return
+        with torch.no_grad():
+            for layer in self._adapters[self._active]:
+                self._linear(layer).weight.copy_(self._base[layer])
+        self._active = None
+
+    def _linear(self, layer: str) -> nn.Linear:
+        try:
+            module = self.model.get_submodule(layer)
+        except AttributeError:
+            raise ValueError(f"model has no layer {layer!r}")
+        # Dynamically quantized linears keep packed int8 weights that can't be merged into.
+        if type(module) is not nn.Linear or not module.weight.is_floating_point():
+            kind = f"{type(module).__module__}.{type(module).__name__}"
+            raise ValueError(f"{layer} is a {kind}, not a floating point nn.Linear")
+        return module
+
+
+def _digest(factors: LoRAFactors) -> str:
+    h = hashlib.sha256()
+    for layer in sorted(factors):
+        a, b, scaling = factors[layer]
+        h.update(layer.encode())
+        h.update(a.numpy().tobytes())
+        h.update(b.numpy().tobytes())
+        h.update(repr(scaling).encode())
+    return h.hexdigest()[:16]
@@ -1,3 +1,48 @@
-# Poisson->trim->decimate stub (fill Step 8 script later)
+#!/usr/bin/env python3
+"""
+Point cloud (.ply or .npz) -> decimated, vertex-coloured mesh (.glb), the
+same pipeline as the /api/mesh job: SDF model + narrow-band sparse marching
+cubes, then decimation (Open3D quadric if installed, else vertex clustering).
+
+    python scripts/pcd_to_glb.py data/outputs/pointclouds/<job>.ply --out mesh.glb
+"""
+import argparse, os, sys, time
+from pathlib import Path
+
+from tqdm.auto import tqdm
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.meshing import Mesher
+
+from point_e.util.point_cloud import PointCloud
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", type=str, help="point cloud .ply or .npz")
+    parser.add_argument("--out", type=str, default=None, help="output .glb (default: next to the input)")
+    parser.add_argument("--grid_size", type=int, default=256)
+    parser.add_argument("--target_faces", type=int, default=20000)
+    parser.add_argument("--no_z_up", action="store_true", help="keep +Z up instead of rotating to glTF's +Y")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    out_path = args.out or os.path.splitext(args.input)[0] + ".glb"
+    if args.input.endswith(".npz"):
+        pc = PointCloud.load(args.input)
+    else:
+        pc = PointCloud.load_ply(args.input)
+
+    mesher = Mesher(grid_size=args.grid_size, target_faces=args.target_faces)
+    t0 = time.perf_counter()
+    mesher.load()
+    t1 = time.perf_counter()
+    mesh = mesher.mesh(pc, progress=True)
+    t2 = time.perf_counter()
+    with open(out_path, "wb") as f:
+        mesh.write_glb(f, z_up=not args.no_z_up)
+    tqdm.write(f"model {t1 - t0:.1f}s, mesh {t2 - t1:.1f}s")
+    tqdm.write(f"Saved: {out_path} faces: {len(mesh.faces)} vertices: {len(mesh.verts)}")
+
 if __name__ == "__main__":
-    print("pcd_to_glb placeholder: implement with Open3D when ready.")
+    main()
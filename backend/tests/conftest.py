@@ -0,0 +1,9 @@
+# conftest.py
+"""Put the app package and the vendored point_e on sys.path; run from backend/ with `python -m pytest tests`."""
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+for path in (BACKEND_DIR, BACKEND_DIR / "vendor" / "point-e"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
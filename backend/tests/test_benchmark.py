@@ -0,0 +1,50 @@
+# test_benchmark.py
+"""The result handling of tools/benchmark.py; the suites themselves need the models."""
+import json
+from argparse import Namespace
+
+import pytest
+
+from tools import benchmark
+
+
+def _results(path, metrics):
+    doc = dict(meta={}, results=[dict(suite="sample", params=dict(batch=b), metrics=m) for b, m in metrics.items()])
+    path.write_text(json.dumps(doc))
+    return str(path)
+
+
+def test_direction_of_metrics():
+    assert benchmark.direction("points_per_s") == 1
+    for metric in ("stage_s", "step_ms", "step_ms_p90", "peak_rss_mb", "step_s_p50"):
+        assert benchmark.direction(metric) == -1
+    assert benchmark.direction("num_points") == 0
+
+
+def test_repeated_reports_medians_after_warmup():
+    calls = iter([100.0, 3.0, 1.0, 2.0])
+    assert benchmark.repeated(lambda: {"t_s": next(calls)}, repeat=3, warmup=1) == {"t_s": 2.0}
+    assert benchmark.percentile([5, 1, 4, 2, 3], 0.5) == 3
+    assert benchmark.percentile([5, 1, 4, 2, 3], 0.9) == 5
+
+
+def test_compare_flags_regressions_beyond_the_threshold(tmp_path, capsys):
+    before = _results(tmp_path / "a.json", {1: {"stage_s": 1.0, "points_per_s": 100.0}, 4: {"stage_s": 2.0}})
+    after = _results(tmp_path / "b.json", {1: {"stage_s": 1.05, "points_per_s": 80.0}, 8: {"stage_s": 2.0}})
+    with pytest.raises(SystemExit) as exit_info:
+        benchmark.compare(Namespace(baseline=before, candidate=after, threshold=0.1))
+    assert exit_info.value.code == 1
+    out = capsys.readouterr().out
+    (throughput,) = [line for line in out.splitlines() if "points_per_s" in line]
+    assert "REGRESSION" in throughput
+    (stage,) = [line for line in out.splitlines() if "stage_s" in line]
+    assert "REGRESSION" not in stage  # +5% is within 10%
+    assert "only in baseline" in out and "only in candidate" in out
+    assert out.strip().endswith("1 regression(s) beyond 10%")
+
+
+def test_compare_passes_improvements(tmp_path, capsys):
+    before = _results(tmp_path / "a.json", {1: {"stage_s": 2.0}})
+    after = _results(tmp_path / "b.json", {1: {"stage_s": 1.0}})
+    benchmark.compare(Namespace(baseline=before, candidate=after, threshold=0.1))
+    assert "improved" in capsys.readouterr().out
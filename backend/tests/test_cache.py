@@ -0,0 +1,76 @@
+# test_cache.py
+import os
+import tempfile
+
+from app.cache import ResultCache, cache_key
+
+
+def _disk_usage(root):
+    return sum(p.stat().st_size for p in root.glob("*/*") if p.is_file())
+
+
+def _ply(tmp_path, size):
+    # A new file each time, as the server writes every output to a fresh inode
+    fd, path = tempfile.mkstemp(suffix=".ply", dir=tmp_path)
+    with os.fdopen(fd, "wb") as f:
+        f.write(b"x" * size)
+    return path
+
+
+def test_cache_key_is_order_independent():
+    assert cache_key({"a": 1, "b": [2, 3]}) == cache_key({"b": [2, 3], "a": 1})
+    assert cache_key({"a": 1}) != cache_key({"a": 2})
+
+
+def test_put_get_and_ply_path(tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    key = cache_key({"prompt": "a chair"})
+    assert cache.get(key) is None
+    cache.put(key, object_path="pointclouds/u/j/output.ply", ply_path=_ply(tmp_path, 100))
+    assert cache.get(key)["object_path"] == "pointclouds/u/j/output.ply"
+    assert cache.ply_path(key).stat().st_size == 100
+    # A fresh instance finds the entry on disk.
+    assert ResultCache(tmp_path / "cache").get(key)["object_path"] == "pointclouds/u/j/output.ply"
+
+
+def test_overwrite_keeps_disk_accounting_exact(tmp_path):
+    root = tmp_path / "cache"
+    cache = ResultCache(root)
+    key = cache_key({"prompt": "a chair"})
+    for i, size in enumerate([100, 300, 50, 50]):
+        cache.put(key, object_path=f"p{i}", ply_path=_ply(tmp_path, size))
+        assert cache.stats()["disk_bytes"] == _disk_usage(root)
+    # Without a new PLY the old one stays, and stays counted once.
+    cache.put(key, object_path="p-meta-only")
+    assert cache.stats()["disk_bytes"] == _disk_usage(root)
+    assert cache.ply_path(key).stat().st_size == 50
+    # Nor does putting the PLY it already links to.
+    cache.put(key, object_path="p-same", ply_path=cache.ply_path(key))
+    assert cache.stats()["disk_bytes"] == _disk_usage(root)
+
+
+def test_overwrites_do_not_evict_other_entries(tmp_path):
+    root = tmp_path / "cache"
+    keys = [cache_key({"i": i}) for i in range(3)]
+    cache = ResultCache(root, max_disk_bytes=3 * 1000 + 3 * 200)
+    for key in keys:
+        cache.put(key, object_path=key, ply_path=_ply(tmp_path, 1000))
+    for _ in range(10):
+        cache.put(keys[0], object_path=keys[0], ply_path=_ply(tmp_path, 1000))
+    assert cache.stats()["disk_evictions"] == 0
+    assert all(cache.ply_path(key) is not None for key in keys)
+
+
+def test_evicts_least_recently_used_when_over_budget(tmp_path):
+    root = tmp_path / "cache"
+    cache = ResultCache(root, max_disk_bytes=2 * 1000 + 2 * 200)
+    keys = [cache_key({"i": i}) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, object_path=key, ply_path=_ply(tmp_path, 1000))
+        os.utime(cache._paths(key)[0], (i, i))  # deterministic LRU order
+        os.utime(cache._paths(key)[1], (i, i))
+    cache.put(keys[2], object_path=keys[2], ply_path=_ply(tmp_path, 1000))
+    assert cache.stats()["disk_evictions"] >= 1
+    assert cache.ply_path(keys[0]) is None
+    assert cache.ply_path(keys[2]) is not None
+    assert cache.stats()["disk_bytes"] == _disk_usage(root)
@@ -0,0 +1,60 @@
+# test_clip_cache.py
+import torch
+import torch.nn as nn
+
+from point_e.models.clip_cache import CachedCLIP
+from point_e.models.pretrained_clip import FrozenImageCLIP
+
+
+class _FakeImageCLIP(nn.Module):
+    """Stands in for ImageCLIP: embeds a prompt through a random projection."""
+
+    clip_name = "ViT-L/14"
+    device = torch.device("cpu")
+    feature_dim = 8
+
+    def __init__(self, seed: int):
+        super().__init__()
+        self.proj = nn.Linear(16, self.feature_dim, bias=False)
+        with torch.no_grad():
+            self.proj.weight.copy_(torch.randn(self.proj.weight.shape, generator=torch.Generator().manual_seed(seed)))
+        self.encoded = []
+
+    def embed_text(self, prompts):
+        prompts = list(prompts)
+        self.encoded.extend(prompts)
+        codes = torch.tensor([[float(ord(c)) for c in p.lower()[:16].ljust(16)] for p in prompts])
+        return self.proj(codes)
+
+
+def _clip(seed: int = 0) -> FrozenImageCLIP:
+    clip = FrozenImageCLIP.__new__(FrozenImageCLIP)  # skip loading real CLIP weights
+    clip.model = _FakeImageCLIP(seed)
+    return clip
+
+
+def test_prompts_differing_in_case_and_spaces_share_an_embedding():
+    clip = _clip()
+    cached = CachedCLIP(clip)
+    a, b = cached.embed_text(["A  red car", "a red car "])
+    assert torch.equal(a, b)
+    assert clip.model.encoded == ["A  red car"]
+    assert cached.stats()["misses"] == 1
+
+
+def test_disk_cache_survives_a_restart(tmp_path):
+    first = CachedCLIP(_clip(), cache_dir=str(tmp_path))
+    emb = first.embed_text(["a chair"])
+    clip = _clip()
+    second = CachedCLIP(clip, cache_dir=str(tmp_path))
+    torch.testing.assert_close(second.embed_text(["a chair"]), emb)
+    assert clip.model.encoded == [] and second.stats()["disk_hits"] == 1
+
+
+def test_disk_cache_is_per_model(tmp_path):
+    CachedCLIP(_clip(seed=0), cache_dir=str(tmp_path)).embed_text(["a chair"])
+    clip = _clip(seed=1)  # same name, other weights
+    cached = CachedCLIP(clip, cache_dir=str(tmp_path))
+    cached.embed_text(["a chair"])
+    assert clip.model.encoded == ["a chair"] and cached.stats()["disk_hits"] == 0
+    assert len(list(tmp_path.iterdir())) == 2
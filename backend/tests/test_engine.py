@@ -0,0 +1,104 @@
+# test_engine.py
+"""Micro-batching in InferenceEngine, without loading the real checkpoints."""
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+import torch
+
+from app.engine import BASE_POINTS, GenerationRequest, InferenceEngine
+from point_e.diffusion.configs import DIFFUSION_CONFIGS, diffusion_from_config
+from point_e.models.configs import MODEL_CONFIGS, model_from_config
+from point_e.models.inference import optimize_for_inference
+from point_e.util.point_cloud import PointCloud
+
+
+def _engine(**kwargs) -> InferenceEngine:
+    kwargs = dict(device=torch.device("cpu"), max_queue=16, max_batch_size=3, batch_window=0.05, **kwargs)
+    return InferenceEngine(**kwargs)
+
+
+def _queue(engine, *reqs):
+    for req in reqs:
+        engine._queue.put_nowait((req, Future()))
+
+
+def _prompts(batch):
+    return [req.prompt for req, _ in batch]
+
+
+def test_compatible_requests_share_a_batch():
+    engine = _engine()
+    _queue(engine, *(GenerationRequest(prompt=f"p{i}", seed=i) for i in range(4)))
+    assert _prompts(engine._next_batch()) == ["p0", "p1", "p2"]
+    assert _prompts(engine._next_batch()) == ["p3"]
+
+
+def test_skipped_requests_go_back_to_the_front_in_order():
+    engine = _engine()
+    _queue(
+        engine,
+        GenerationRequest(prompt="a"),
+        GenerationRequest(prompt="b", guidance=5.0),
+        GenerationRequest(prompt="c", no_upsample=True),
+        GenerationRequest(prompt="d"),
+        GenerationRequest(prompt="e", guidance=5.0),
+    )
+    assert _prompts(engine._next_batch()) == ["a", "d"]
+    assert _prompts(engine._next_batch()) == ["b", "e"]
+    assert _prompts(engine._next_batch()) == ["c"]
+
+
+def test_a_lone_request_waits_one_batch_window_for_company():
+    engine = _engine()
+    _queue(engine, GenerationRequest(prompt="a"))
+    threading.Timer(0.01, _queue, (engine, GenerationRequest(prompt="b"))).start()
+    t0 = time.monotonic()
+    assert _prompts(engine._next_batch()) == ["a", "b"]
+    assert time.monotonic() - t0 < 1
+
+
+def test_shutdown_sentinel_is_handed_back():
+    engine = _engine()
+    _queue(engine, GenerationRequest(prompt="a"))
+    engine._queue.put_nowait(None)
+    assert _prompts(engine._next_batch()) == ["a"]
+    assert engine._next_batch() is None
+
+
+@pytest.fixture(scope="module")
+def upsampling_engine():
+    """An engine whose upsampler is a tiny random model, for upsample-only requests."""
+    config = dict(MODEL_CONFIGS["upsample"], name="UpsamplePointDiffusionTransformer", width=32, layers=1, heads=2)
+    config.pop("cond_drop_prob")
+    torch.manual_seed(0)
+    engine = _engine(default_steps=(2,))
+    engine.base_model = engine.base_diffusion = None  # upsample-only requests never run it
+    engine.upsampler_model = optimize_for_inference(model_from_config(config, engine.device))
+    engine.upsampler_diffusion = diffusion_from_config(DIFFUSION_CONFIGS["upsample"])
+    return engine
+
+
+def _base(seed):
+    rng = np.random.default_rng(seed)
+    return PointCloud(
+        coords=rng.uniform(-0.5, 0.5, size=(BASE_POINTS, 3)).astype(np.float32),
+        channels={c: rng.uniform(size=BASE_POINTS).astype(np.float32) for c in "RGB"},
+    )
+
+
+def test_seeded_output_does_not_depend_on_the_batch(upsampling_engine):
+    engine = upsampling_engine
+    base = _base(0)
+    alone = engine._run_batch([GenerationRequest(prompt="", seed=1, base=base)])[0]
+    batch = engine._run_batch([
+        GenerationRequest(prompt="", seed=2, base=base),
+        GenerationRequest(prompt="", seed=1, base=base),
+        GenerationRequest(prompt="", seed=3, base=base, num_points=2 * 4096),
+    ])
+    np.testing.assert_allclose(batch[1].coords, alone.coords, atol=1e-5)
+    assert np.abs(batch[0].coords - alone.coords).max() > 1e-2
+    assert len(batch[2].coords) == 2 * 4096
+    np.testing.assert_allclose(batch[2].coords[:BASE_POINTS], base.coords, atol=1e-5)
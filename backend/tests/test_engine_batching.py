@@ -0,0 +1,51 @@
+# test_engine_batching.py
+from concurrent.futures import Future
+
+import torch
+
+from app.engine import GenerationRequest, InferenceEngine
+
+
+def _engine(**kwargs):
+    # Only the queue and batching are exercised: no models are loaded.
+    return InferenceEngine(device=torch.device("cpu"), batch_window=0, **kwargs)
+
+
+def _queue(engine, *guidances):
+    items = [(GenerationRequest(prompt=f"p{i}", guidance=g), Future()) for i, g in enumerate(guidances)]
+    for item in items:
+        engine._queue.put_nowait(item)
+    return items
+
+
+def test_batches_compatible_requests_in_arrival_order():
+    engine = _engine(max_batch_size=2)
+    a, b, c, d = _queue(engine, 3.0, 5.0, 3.0, 5.0)
+    assert engine._next_batch() == [a, c]
+    assert engine._next_batch() == [b, d]
+
+
+def test_skipped_request_goes_back_to_the_front():
+    engine = _engine(max_batch_size=4)
+    a, b, c = _queue(engine, 3.0, 5.0, 3.0)
+    assert engine._next_batch() == [a, c]
+    # b is visible to every worker again, ahead of newer requests
+    (e,) = _queue(engine, 3.0)
+    assert engine._next_batch() == [b]
+    assert engine._next_batch() == [e]
+
+
+def test_put_front_keeps_order_and_ignores_maxsize():
+    engine = _engine(max_queue=2)
+    a, b = _queue(engine, 3.0, 3.0)
+    front = [object(), object()]
+    engine._queue.put_front(front)
+    assert [engine._queue.get_nowait() for _ in range(4)] == [*front, a, b]
+
+
+def test_shutdown_sentinel_ends_the_batch():
+    engine = _engine(max_batch_size=4)
+    (a,) = _queue(engine, 3.0)
+    engine._queue.put_nowait(None)
+    assert engine._next_batch() == [a]
+    assert engine._next_batch() is None
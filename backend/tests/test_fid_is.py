@@ -0,0 +1,33 @@
+# test_fid_is.py
+import numpy as np
+import pytest
+
+from point_e.evals.fid_is import (
+    FIDStatisticsAccumulator,
+    InceptionScoreAccumulator,
+    compute_inception_score,
+    compute_statistics,
+)
+
+
+@pytest.mark.parametrize("batch_size", [1, 97, 5000])
+def test_fid_accumulator_matches_compute_statistics(batch_size):
+    rng = np.random.default_rng(0)
+    feats = (rng.normal(size=(1234, 16)) * 3 + 1).astype(np.float32)
+    acc = FIDStatisticsAccumulator()
+    for i in range(0, len(feats), batch_size):
+        acc.add(feats[i : i + batch_size])
+    ref, stats = compute_statistics(feats), acc.statistics()
+    np.testing.assert_allclose(stats.mu, ref.mu, rtol=0, atol=1e-5)
+    np.testing.assert_allclose(stats.sigma, ref.sigma, rtol=0, atol=1e-4)
+    assert stats.frechet_distance(ref) == pytest.approx(0, abs=1e-6)
+
+
+@pytest.mark.parametrize("batch_size", [1, 77, 300, 5000])
+def test_inception_score_accumulator_matches_compute_inception_score(batch_size):
+    rng = np.random.default_rng(1)
+    preds = rng.dirichlet(np.ones(10), size=1234).astype(np.float32)
+    acc = InceptionScoreAccumulator(split_size=300)
+    for i in range(0, len(preds), batch_size):
+        acc.add(preds[i : i + batch_size])
+    assert acc.score() == pytest.approx(compute_inception_score(preds, split_size=300), rel=1e-5)
@@ -0,0 +1,123 @@
+# test_gltf.py
+import io
+import json
+import struct
+
+import numpy as np
+
+from point_e.util.gltf_util import (
+    ARRAY_BUFFER,
+    CHUNK_BIN,
+    CHUNK_JSON,
+    ELEMENT_ARRAY_BUFFER,
+    GLB_MAGIC,
+    write_glb,
+)
+from point_e.util.mesh import TriMesh
+
+_COMPONENTS = {5123: np.uint16, 5125: np.uint32, 5126: np.float32}
+_WIDTHS = {"SCALAR": 1, "VEC3": 3, "VEC4": 4}
+
+
+def _parse(data: bytes):
+    """Split a .glb into its JSON document and a reader for its accessors."""
+    magic, version, length = struct.unpack_from("<III", data, 0)
+    assert (magic, version, length) == (GLB_MAGIC, 2, len(data))
+    json_len, json_type = struct.unpack_from("<II", data, 12)
+    assert json_type == CHUNK_JSON and json_len % 4 == 0
+    doc = json.loads(data[20 : 20 + json_len])
+    bin_len, bin_type = struct.unpack_from("<II", data, 20 + json_len)
+    assert bin_type == CHUNK_BIN and bin_len % 4 == 0
+    binary = data[28 + json_len :]
+    assert len(binary) == bin_len == doc["buffers"][0]["byteLength"]
+
+    def accessor(index):
+        acc = doc["accessors"][index]
+        view = doc["bufferViews"][acc["bufferView"]]
+        assert view["byteOffset"] % 4 == 0
+        dtype = _COMPONENTS[acc["componentType"]]
+        count = acc["count"] * _WIDTHS[acc["type"]]
+        arr = np.frombuffer(binary, dtype=dtype, count=count, offset=view["byteOffset"])
+        assert arr.nbytes == view["byteLength"]
+        return acc, view, arr.reshape(acc["count"], -1)
+
+    return doc, accessor
+
+
+def _tetrahedron():
+    verts = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype=np.float32)
+    faces = np.array([[0, 2, 1], [0, 1, 3], [0, 3, 2], [1, 2, 3]])
+    return verts, faces
+
+
+def _write(**kwargs) -> bytes:
+    f = io.BytesIO()
+    write_glb(f, **kwargs)
+    return f.getvalue()
+
+
+def test_round_trip_structure():
+    verts, faces = _tetrahedron()
+    normals = verts - verts.mean(axis=0)
+    rgb = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1], [0.5, 0.5, 0.5]])
+    doc, accessor = _parse(_write(verts=verts, faces=faces, rgb=rgb, normals=normals))
+
+    assert doc["asset"]["version"] == "2.0"
+    (primitive,) = doc["meshes"][0]["primitives"]
+    assert primitive["mode"] == 4
+    attrs = primitive["attributes"]
+    assert set(attrs) == {"POSITION", "NORMAL", "COLOR_0"}
+
+    acc, view, positions = accessor(attrs["POSITION"])
+    assert view["target"] == ARRAY_BUFFER
+    np.testing.assert_array_equal(positions, verts)
+    assert acc["min"] == [0, 0, 0] and acc["max"] == [1, 1, 1]
+    np.testing.assert_array_equal(accessor(attrs["NORMAL"])[2], normals)
+
+    acc, _, colors = accessor(attrs["COLOR_0"])
+    assert acc["normalized"] and acc["type"] == "VEC4"
+    assert colors[0].tolist() == [65535, 0, 0, 65535]
+    # sRGB 0.5 is ~0.214 linear
+    assert abs(colors[3, 0] / 65535 - 0.214) < 1e-3
+
+    acc, view, indices = accessor(primitive["indices"])
+    assert view["target"] == ELEMENT_ARRAY_BUFFER and acc["componentType"] == 5123
+    np.testing.assert_array_equal(indices.reshape(-1, 3), faces)
+
+
+def test_large_meshes_use_32_bit_indices():
+    verts = np.random.default_rng(0).normal(size=(2**16 + 1, 3))
+    faces = np.array([[0, 1, 2**16]])
+    doc, accessor = _parse(_write(verts=verts, faces=faces))
+    acc, _, indices = accessor(doc["meshes"][0]["primitives"][0]["indices"])
+    assert acc["componentType"] == 5125
+    assert indices.reshape(-1).tolist() == [0, 1, 2**16]
+
+
+def test_odd_sizes_are_padded():
+    # 3 uint16 indices are 6 bytes: the chunk and the views still end 4-byte aligned
+    verts, faces = _tetrahedron()
+    doc, accessor = _parse(_write(verts=verts, faces=faces[:1]))
+    assert accessor(doc["meshes"][0]["primitives"][0]["indices"])[1]["byteLength"] == 6
+
+
+def test_z_up_rotates_to_y_up():
+    verts, faces = _tetrahedron()
+    doc, accessor = _parse(_write(verts=verts, faces=faces, z_up=True))
+    positions = accessor(doc["meshes"][0]["primitives"][0]["attributes"]["POSITION"])[2]
+    np.testing.assert_array_equal(positions[3], [0, 1, 0])
+    np.testing.assert_array_equal(positions[2], [0, 0, -1])
+
+
+def test_trimesh_write_glb_adds_vertex_normals():
+    verts, faces = _tetrahedron()
+    mesh = TriMesh(verts=verts, faces=faces, vertex_channels={c: np.full(4, 0.25) for c in "RGB"})
+    f = io.BytesIO()
+    mesh.write_glb(f)
+    doc, accessor = _parse(f.getvalue())
+    attrs = doc["meshes"][0]["primitives"][0]["attributes"]
+    assert set(attrs) == {"POSITION", "NORMAL", "COLOR_0"}
+    normals = accessor(attrs["NORMAL"])[2]
+    np.testing.assert_allclose(np.linalg.norm(normals, axis=1), 1, rtol=1e-6)
+    # Outward: away from the centroid
+    assert (np.sum(normals * (verts - verts.mean(axis=0)), axis=1) > 0).all()
@@ -0,0 +1,59 @@
+# test_inference.py
+import copy
+
+import pytest
+import torch
+import torch.nn as nn
+
+from point_e.models.inference import optimize_for_inference
+from point_e.models.transformer import PointDiffusionTransformer
+
+
+def _model():
+    torch.manual_seed(0)
+    model = PointDiffusionTransformer(
+        device=torch.device("cpu"),
+        dtype=torch.float32,
+        input_channels=6,
+        output_channels=12,
+        n_ctx=32,
+        width=64,
+        layers=2,
+        heads=4,
+        init_scale=1.0,
+        time_token_cond=True,
+    )
+    # The output projection starts at zero, which would make every comparison trivial.
+    nn.init.normal_(model.output_proj.weight, std=0.1)
+    return model.eval()
+
+
+# Outputs are O(1) (std ~0.8); int8 and bfloat16 are only expected to stay close.
+@pytest.mark.parametrize(
+    "options, atol",
+    [
+        (dict(), 1e-5),
+        (dict(compile="trace"), 1e-5),
+        (dict(quantize=True), 0.25),
+        (dict(dtype="bfloat16"), 0.1),
+    ],
+)
+def test_matches_eager(options, atol):
+    eager = _model()
+    x = torch.randn(3, 6, 32)
+    t = torch.tensor([0, 500, 1023])
+    with torch.no_grad():
+        expected = eager(x, t)
+        model = optimize_for_inference(copy.deepcopy(eager), **options)
+        for _ in range(2):  # the second call reuses any traced graph
+            out = model(x, t)
+            assert out.dtype == torch.float32 and out.shape == expected.shape
+            torch.testing.assert_close(out, expected, atol=atol, rtol=0)
+    assert expected.abs().max() > 5 * atol
+
+
+def test_keeps_state_dict_keys():
+    eager = _model()
+    model = optimize_for_inference(copy.deepcopy(eager), compile="trace")
+    assert model.state_dict().keys() == eager.state_dict().keys()
+    assert model.inference_options["fused_attention"]
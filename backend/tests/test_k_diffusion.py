@@ -0,0 +1,101 @@
+# test_k_diffusion.py
+"""
+The solvers on data x0 ~ N(0, S^2), whose ideal denoiser is known in closed
+form: E[x0 | x] = x * S^2 / (S^2 + sigma^2). Following the probability-flow
+ODE from sigma_max to sigma_min then scales x_T by
+sqrt((S^2 + sigma_min^2) / (S^2 + sigma_max^2)).
+"""
+import functools
+
+import pytest
+import torch as th
+
+from point_e.diffusion.k_diffusion import SAMPLERS, get_sigmas_karras
+
+S = 0.5
+SIGMA_MIN, SIGMA_MAX = 1e-3, 120.0
+ODE_SOLVERS = ["heun", "dpm", "dpmpp_2m", "dpmpp_3m", "unipc"]
+
+
+def _denoiser(x, sigma):
+    sigma = sigma.view(-1, *([1] * (x.ndim - 1)))
+    return x * S**2 / (S**2 + sigma**2)
+
+
+class _Counted:
+    def __init__(self, fn):
+        self.fn, self.calls = fn, 0
+
+    def __call__(self, x, sigma):
+        self.calls += 1
+        return self.fn(x, sigma)
+
+
+def _x_T(batch_size=4, seed=0):
+    gen = th.Generator().manual_seed(seed)
+    return th.randn(batch_size, 6, 256, generator=gen, dtype=th.float64) * SIGMA_MAX
+
+
+def _exact(x_T):
+    scale = ((S**2 + SIGMA_MIN**2) / (S**2 + SIGMA_MAX**2)) ** 0.5
+    return x_T * scale * S**2 / (S**2 + SIGMA_MIN**2)
+
+
+def _run(sample_fn, x_T, steps, denoiser=_denoiser, **kwargs):
+    sigmas = get_sigmas_karras(steps, SIGMA_MIN, SIGMA_MAX).double()
+    out = None
+    for out in sample_fn(denoiser, x_T.clone(), sigmas, **kwargs):
+        pass
+    return out["pred_xstart"]
+
+
+def _rel_error(sample_fn, steps, **kwargs):
+    x_T = _x_T()
+    exact = _exact(x_T)
+    return float((_run(sample_fn, x_T, steps, **kwargs) - exact).abs().max() / exact.abs().max())
+
+
+@pytest.mark.parametrize("name", ODE_SOLVERS)
+def test_ode_solvers_converge_to_the_exact_solution(name):
+    coarse, fine = _rel_error(SAMPLERS[name], 20), _rel_error(SAMPLERS[name], 64)
+    assert fine < 1e-2
+    # Higher than first order: 3.2x the steps cut the error well over 3.2x
+    assert fine < coarse / 5
+
+
+@pytest.mark.parametrize(
+    "name,evals", [("heun", 2 * 16 - 1), ("dpm", 2 * 16), ("dpmpp_2m", 16), ("dpmpp_3m", 16), ("unipc", 16)]
+)
+def test_model_evaluations_per_run(name, evals):
+    denoiser = _Counted(_denoiser)
+    _run(SAMPLERS[name], _x_T(), 16, denoiser=denoiser)
+    assert denoiser.calls == evals
+
+
+def test_adaptive_meets_its_tolerance():
+    loose = _rel_error(SAMPLERS["adaptive"], 16)
+    tight = _rel_error(functools.partial(SAMPLERS["adaptive"], rtol=1e-3, atol=1e-4), 16)
+    assert loose < 0.1
+    assert tight < loose / 10
+
+
+def test_adaptive_rows_do_not_depend_on_the_batch():
+    x_T = _x_T(batch_size=4)
+    x_T[0] *= 0.01  # a very different row that needs other step sizes
+    batched = _run(SAMPLERS["adaptive"], x_T, 16)
+    alone = _run(SAMPLERS["adaptive"], x_T[2:3], 16)
+    th.testing.assert_close(batched[2:3], alone, rtol=0, atol=0)
+
+
+@pytest.mark.parametrize(
+    "name,steps,kwargs",
+    [
+        ("ancestral", 256, {}),  # first order: needs many steps
+        ("heun", 64, dict(s_churn=40.0, s_tmin=0.05, s_tmax=50.0)),
+    ],
+)
+def test_stochastic_samplers_sample_the_data_distribution(name, steps, kwargs):
+    generators = [th.Generator().manual_seed(i) for i in range(8)]
+    samples = _run(SAMPLERS[name], _x_T(batch_size=8), steps, generators=generators, **kwargs)
+    assert float(samples.std()) == pytest.approx(S, rel=0.05)
+    assert abs(float(samples.mean())) < 0.02
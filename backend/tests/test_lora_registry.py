@@ -0,0 +1,81 @@
+# test_lora_registry.py
+import copy
+
+import pytest
+import torch
+import torch.nn as nn
+
+from lora.inject import inject_lora, lora_state_dict
+from lora.registry import AdapterRegistry
+
+
+def _model():
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Linear(32, 64), nn.ReLU(), nn.Linear(64, 16))
+
+
+def _adapter(seed, rank=4):
+    g = torch.Generator().manual_seed(seed)
+    return {
+        "0.lora_A": torch.randn(rank, 32, generator=g),
+        "0.lora_B": torch.randn(64, rank, generator=g) * 0.01,
+        "2.lora_A": torch.randn(rank, 64, generator=g),
+        "2.lora_B": torch.randn(16, rank, generator=g) * 0.01,
+    }
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.bfloat16])
+def test_switching_restores_base_weights_exactly(tmp_path, dtype):
+    model = _model().to(dtype)
+    pristine = {k: v.clone() for k, v in model.state_dict().items()}
+    registry = AdapterRegistry(model, snapshot_dir=str(tmp_path))
+    registry.register("a", _adapter(1))
+    registry.register("b", _adapter(2))
+    for _ in range(50):
+        registry.activate("a")
+        registry.activate("b")
+    registry.activate(None)
+    for key, value in model.state_dict().items():
+        assert torch.equal(value, pristine[key]), key
+    assert list(tmp_path.iterdir()) == []  # snapshot files are unlinked once mapped
+
+
+def test_merged_weights_match_the_low_rank_update(tmp_path):
+    model = _model()
+    base = model[0].weight.detach().clone()
+    adapter = _adapter(1)
+    registry = AdapterRegistry(model, snapshot_dir=str(tmp_path))
+    registry.register("a", adapter, alpha=8)
+    with registry.use("a"):
+        expected = base + adapter["0.lora_B"] @ adapter["0.lora_A"] * (8 / 4)
+        torch.testing.assert_close(model[0].weight.detach(), expected)
+    assert registry.active == "a"
+
+
+def test_rejects_mismatched_shapes(tmp_path):
+    registry = AdapterRegistry(_model(), snapshot_dir=str(tmp_path))
+    bad = {"0.lora_A": torch.zeros(4, 31), "0.lora_B": torch.zeros(64, 4)}
+    with pytest.raises(ValueError):
+        registry.register("bad", bad)
+
+
+def test_merges_what_training_saves(tmp_path):
+    class MLP(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.fc1, self.fc2 = nn.Linear(32, 64), nn.Linear(64, 16)
+
+        def forward(self, x):
+            return self.fc2(torch.relu(self.fc1(x)))
+
+    torch.manual_seed(0)
+    model = MLP()
+    trained = inject_lora(copy.deepcopy(model), r=4, alpha=8, verbose=False)
+    for name, p in trained.named_parameters():
+        if name.endswith("lora_B"):
+            nn.init.normal_(p, std=0.05)
+    x = torch.randn(3, 32)
+    registry = AdapterRegistry(model, snapshot_dir=str(tmp_path))
+    registry.register("a", lora_state_dict(trained), alpha=8)
+    with torch.no_grad(), registry.use("a"):
+        torch.testing.assert_close(model(x), trained(x))
@@ -0,0 +1,65 @@
+# test_meta_init.py
+import threading
+
+import pytest
+import torch
+import torch.nn as nn
+
+from point_e.models.meta_init import check_materialized, empty_weights, real_weights
+
+
+def _model():
+    return nn.Sequential(nn.Linear(4, 8), nn.LayerNorm(8), nn.Linear(8, 2))
+
+
+def test_hooks_are_removed_on_exit():
+    originals = (nn.Module.register_parameter, nn.Module.register_buffer, nn.init.normal_)
+    with empty_weights():
+        assert nn.Module.register_parameter is not originals[0]
+        with empty_weights():
+            pass
+        assert nn.Module.register_parameter is not originals[0]  # still nested
+    assert (nn.Module.register_parameter, nn.Module.register_buffer, nn.init.normal_) == originals
+
+
+def test_hooks_are_removed_after_an_error():
+    original = nn.Module.register_parameter
+    with pytest.raises(RuntimeError):
+        with empty_weights():
+            raise RuntimeError
+    assert nn.Module.register_parameter is original
+
+
+def test_empty_model_adopts_loaded_weights():
+    reference = _model()
+    with empty_weights():
+        model = _model()
+        with real_weights():
+            real = nn.Linear(2, 2)
+    assert all(p.is_meta for p in model.parameters())
+    assert not any(p.is_meta for p in real.parameters())
+    with pytest.raises(RuntimeError, match="weights were never loaded"):
+        check_materialized(model)
+
+    model.load_state_dict(reference.state_dict(), assign=True)
+    check_materialized(model)
+    x = torch.randn(3, 4)
+    torch.testing.assert_close(model(x), reference(x))
+
+
+def test_other_threads_build_real_weights():
+    entered, done = threading.Event(), threading.Event()
+
+    def hold():
+        with empty_weights():
+            entered.set()
+            done.wait(5)
+
+    t = threading.Thread(target=hold)
+    t.start()
+    try:
+        assert entered.wait(5)
+        assert not any(p.is_meta for p in _model().parameters())
+    finally:
+        done.set()
+        t.join(5)
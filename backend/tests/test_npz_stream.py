@@ -0,0 +1,39 @@
+# test_npz_stream.py
+import numpy as np
+import pytest
+
+from point_e.evals.npz_stream import NpzShardWriter, NpzStreamer, prefetch
+
+
+def test_shards_round_trip_through_streamer(tmp_path):
+    arr = np.random.default_rng(0).normal(size=(1000, 8, 3)).astype(np.float32)
+    labels = np.arange(1000)
+    with NpzShardWriter(str(tmp_path), shard_size=64) as writer:
+        for i in range(0, len(arr), 50):
+            writer.write(arr_0=arr[i : i + 50], labels=labels[i : i + 50])
+    assert len(writer.paths) == 16
+    batches = list(NpzStreamer(writer.glob_path).stream(100, ["arr_0", "labels"]))
+    assert [len(b["arr_0"]) for b in batches] == [100] * 10
+    np.testing.assert_array_equal(np.concatenate([b["arr_0"] for b in batches]), arr)
+    np.testing.assert_array_equal(np.concatenate([b["labels"] for b in batches]), labels)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"shard_{i:06d}.npz" for i in range(16)]
+
+
+def test_prefetch_preserves_order_and_errors():
+    assert list(prefetch(range(10), depth=2)) == list(range(10))
+    assert list(prefetch(range(3), depth=0)) == [0, 1, 2]
+
+    def failing():
+        yield 1
+        raise KeyError("boom")
+
+    it = prefetch(failing())
+    assert next(it) == 1
+    with pytest.raises(KeyError):
+        next(it)
+
+
+def test_prefetch_can_be_closed_early():
+    it = prefetch(iter(range(100)), depth=2)
+    assert [next(it), next(it)] == [0, 1]
+    it.close()
@@ -0,0 +1,110 @@
+# test_objectstore.py
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pytest
+
+from app.objectstore import LocalStore, ObjectStore, Uploader
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStore(tmp_path / "objects", base_url="http://api/objects/", secret="s3cret")
+
+
+def _query(url):
+    parts = urlsplit(url)
+    query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+    return unquote(parts.path), int(query["expires"]), query["filename"], query["signature"]
+
+
+def test_incomplete_store_cannot_be_constructed():
+    class NoSign(ObjectStore):
+        def uri(self, path):
+            return path
+
+        def _put(self, path, data, content_type, cache_control, content_encoding):
+            pass
+
+    with pytest.raises(TypeError, match="_sign"):
+        NoSign()
+
+
+def test_put_writes_data_and_headers(store):
+    store.put("pointclouds/a.ply", b"ply", "application/octet-stream", content_encoding="gzip")
+    assert store.file("pointclouds/a.ply").read_bytes() == b"ply"
+    assert store.metadata("pointclouds/a.ply") == {
+        "content_type": "application/octet-stream",
+        "cache_control": None,
+        "content_encoding": "gzip",
+    }
+    assert store.uri("pointclouds/a.ply").startswith("file://")
+
+
+@pytest.mark.parametrize("path", ["../escape.ply", "pointclouds/../../escape.ply", "/etc/passwd"])
+def test_paths_outside_root_are_rejected(store, path):
+    with pytest.raises(ValueError):
+        store.file(path)
+    with pytest.raises(ValueError):
+        store.put(path, b"x", "text/plain")
+
+
+def test_signed_url_verifies(store):
+    path, expires, filename, signature = _query(store.signed_url("meshes/m.glb", filename="m.glb"))
+    assert path == "/objects/meshes/m.glb" and filename == "m.glb"
+    assert store.verify("meshes/m.glb", expires, filename, signature)
+
+
+def test_tampered_or_expired_urls_are_refused(store):
+    _, expires, filename, signature = _query(store.signed_url("meshes/m.glb", filename="m.glb"))
+    assert not store.verify("meshes/other.glb", expires, filename, signature)
+    assert not store.verify("meshes/m.glb", expires + 1, filename, signature)
+    assert not store.verify("meshes/m.glb", expires, "x.glb", signature)
+    assert not store.verify("meshes/m.glb", expires, filename, "0" * len(signature))
+
+    past = int(time.time()) - 1
+    assert not store.verify("meshes/m.glb", past, filename, store._signature("meshes/m.glb", past, filename))
+
+
+def test_other_secrets_dont_verify(store, tmp_path):
+    other = LocalStore(tmp_path / "objects", base_url="http://api/objects", secret="other")
+    _, expires, filename, signature = _query(store.signed_url("meshes/m.glb"))
+    assert not other.verify("meshes/m.glb", expires, filename, signature)
+
+
+def test_urls_are_reused_until_close_to_expiry(store):
+    store.url_ttl, store.url_refresh = 900, 300
+    url = store.signed_url("meshes/m.glb")
+    assert store.signed_url("meshes/m.glb") == url
+    assert store.signed_url("meshes/m.glb", filename="m.glb") != url
+    key = ("meshes/m.glb", "output.ply")
+    store._urls[key] = ("stale", time.time() + 200)  # less than url_refresh left
+    assert store.signed_url("meshes/m.glb") != "stale"
+    assert store._urls[key][1] > time.time() + 800
+
+
+class _FlakyStore(LocalStore):
+    def __init__(self, *args, failures, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.failures = failures
+
+    def _put(self, *args):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("transient")
+        super()._put(*args)
+
+
+def test_uploader_retries_then_reports(tmp_path):
+    store = _FlakyStore(tmp_path, base_url="http://api/objects", failures=2)
+    uploader = Uploader(store, attempts=3, backoff=0)
+    done = []
+    uploader.submit("pointclouds/a.ply", b"ply", "application/octet-stream", on_done=done.append).result(5)
+    assert done == [None] and store.file("pointclouds/a.ply").read_bytes() == b"ply"
+    assert uploader.stats() == {"pending": 0, "succeeded": 1, "failed": 0, "retries": 2}
+
+    store.failures = 5
+    with pytest.raises(OSError):
+        uploader.submit("pointclouds/b.ply", b"ply", "application/octet-stream", on_done=done.append).result(5)
+    assert isinstance(done[-1], OSError) and uploader.stats()["failed"] == 1
+    uploader.shutdown()
@@ -0,0 +1,55 @@
+# test_ply.py
+import io
+
+import numpy as np
+
+from point_e.util.ply_util import read_ply, write_compact_ply, write_ply
+
+
+def _cloud(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, 3)).astype(np.float32), rng.random((n, 3))
+
+
+def test_binary_round_trip_is_a_view_of_the_file(tmp_path):
+    coords, rgb = _cloud()
+    faces = np.array([[0, 1, 2], [2, 3, 4]], dtype=np.int32)
+    path = str(tmp_path / "cloud.ply")
+    with open(path, "wb") as f:
+        write_ply(f, coords=coords, rgb=rgb, faces=faces)
+
+    out = read_ply(path)
+    np.testing.assert_array_equal(out["coords"], coords)
+    np.testing.assert_array_equal(out["rgb"], np.round(rgb * 255.499).astype(np.uint8))
+    np.testing.assert_array_equal(out["faces"], faces)
+    for key in ("coords", "rgb", "faces"):
+        assert not out[key].flags.writeable  # backed by the read-only memory map
+        assert not out[key].flags.owndata
+
+
+def test_read_from_file_object_and_without_mmap(tmp_path):
+    coords, rgb = _cloud()
+    buf = io.BytesIO()
+    write_ply(buf, coords=coords, rgb=rgb)
+    path = tmp_path / "cloud.ply"
+    path.write_bytes(buf.getvalue())
+    for out in (read_ply(io.BytesIO(buf.getvalue())), read_ply(str(path), mmap_mode=False)):
+        np.testing.assert_array_equal(out["coords"], coords)
+        assert out["rgb"].shape == (len(coords), 3)
+
+
+def test_compact_round_trip_within_quantization_error():
+    coords, rgb = _cloud()
+    buf = io.BytesIO()
+    write_compact_ply(buf, coords=coords, rgb=rgb)
+    out = read_ply(io.BytesIO(buf.getvalue()))
+    extent = coords.max() - coords.min()
+    assert np.abs(out["coords"] - coords).max() <= extent / 65535
+    assert out["coords"].dtype == np.float32
+
+
+def test_empty_cloud(tmp_path):
+    path = str(tmp_path / "empty.ply")
+    with open(path, "wb") as f:
+        write_ply(f, coords=np.zeros((0, 3), np.float32))
+    assert read_ply(path)["coords"].shape == (0, 3)
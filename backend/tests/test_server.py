@@ -0,0 +1,182 @@
+# test_server.py
+"""The HTTP API over an engine stub that records what it's asked to sample."""
+import importlib
+import json
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+import torch
+from fastapi.testclient import TestClient
+
+from app.cache import ResultCache
+from app.engine import BASE_POINTS, InferenceEngine, Progress
+from app.jobs import RUNNING, SUCCEEDED
+from point_e.util.point_cloud import PointCloud
+
+
+class _Engine(InferenceEngine):
+    """A ready engine without models: submit() queues nothing and returns the future to the test."""
+
+    def __init__(self):
+        super().__init__(device=torch.device("cpu"))
+        # sampler_for() only needs these to exist; they're never run.
+        self.base_model = self.upsampler_model = None
+        self.base_diffusion = self.upsampler_diffusion = None
+        self._ready.set()
+        self.submitted = []
+
+    def submit(self, req):
+        fut = Future()
+        self.submitted.append((req, fut))
+        return fut
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    root = tmp_path_factory.mktemp("server")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("STORAGE_BACKEND", "local")
+        mp.setenv("STORAGE_LOCAL_DIR", str(root / "objects"))
+        mp.setenv("ARTIFACTS_DIR", str(root / "artifacts"))
+        mp.setenv("ENGINE_PROCESSES", "0")
+        mp.setenv("UPSAMPLE_MAX_VARIANTS", "4")
+        return importlib.import_module("app.server")
+
+
+@pytest.fixture
+def api(server, tmp_path, monkeypatch):
+    engine = _Engine()
+    monkeypatch.setattr(server, "engine", engine)
+    monkeypatch.setattr(server, "OUTPUT_DIR", tmp_path)
+    monkeypatch.setattr(server, "BASE_DIR", tmp_path / "base")
+    monkeypatch.setattr(server, "results", ResultCache(tmp_path / "cache"))
+    (tmp_path / "base").mkdir()
+    return server, engine, TestClient(server.app)
+
+
+def _finish_base_stage(server, job):
+    """What the engine reports when a job's 1024-point base stage is done."""
+    samples = torch.rand(6, BASE_POINTS, generator=torch.Generator().manual_seed(0)) * 2 - 1
+    server._on_progress(job, Progress(stage=0, num_stages=2, step=64, total_steps=64, samples=samples, stage_done=True))
+    job.base_saved.result(5)
+    return samples
+
+
+def test_upsample_resumes_from_the_saved_base(api):
+    server, engine, client = api
+    source = server.jobs.create(user="u", prompt="a red chair")
+    samples = _finish_base_stage(server, source)
+    assert source.status == RUNNING  # the base can be reused before the job finishes
+
+    r = client.post(f"/api/jobs/{source.id}/upsample", json={"seed": 5, "variants": 3, "num_points": 6000})
+    assert r.status_code == 202
+    body = r.json()
+    assert body["source_job_id"] == source.id and len(body["jobs"]) == 3
+
+    reqs = [req for req, _ in engine.submitted]
+    assert [req.seed for req in reqs] == [5, 6, 7]
+    for req in reqs:
+        assert req.prompt == "a red chair" and req.num_points == 6000
+        np.testing.assert_allclose(req.base.coords, samples[:3].t().numpy(), atol=1e-6)
+        assert set(req.base.channels) == {"R", "G", "B"}
+    # Identical settings: the engine can sample all the variants as one batch.
+    assert len({engine.batch_key(req) for req in reqs}) == 1
+    # And each caches under the base it resumed from, not the source prompt.
+    settings = engine.settings(reqs[0])
+    assert settings["prompt"] is None and settings["models"] == [engine.upsampler_name]
+
+
+def test_upsampled_variant_is_published(api):
+    server, engine, client = api
+    source = server.jobs.create(user="u", prompt="a red chair")
+    _finish_base_stage(server, source)
+    (job,) = client.post(f"/api/jobs/{source.id}/upsample", json={"seed": 1}).json()["jobs"]
+
+    (req, fut), = engine.submitted
+    coords = np.concatenate([req.base.coords, np.zeros((4096 - BASE_POINTS, 3), dtype=np.float32)])
+    fut.set_result(PointCloud(coords=coords, channels={c: np.full(4096, 0.5) for c in "RGB"}))
+    assert server.jobs.get(job["job_id"]).done.wait(5)
+
+    status = client.get(job["status_url"]).json()
+    assert status["status"] == SUCCEEDED
+    assert PointCloud.load_ply(str(server.OUTPUT_DIR / f"{job['job_id']}.ply")).coords.shape == (4096, 3)
+
+
+def test_upsample_needs_a_base(api):
+    server, engine, client = api
+    source = server.jobs.create(user="u", prompt="a red chair")
+    assert client.post(f"/api/jobs/{source.id}/upsample", json={}).status_code == 409
+    source.set_status(SUCCEEDED)  # e.g. served from before base clouds were kept
+    assert client.post(f"/api/jobs/{source.id}/upsample", json={}).status_code == 404
+    assert client.post("/api/jobs/missing/upsample", json={}).status_code == 404
+    assert not engine.submitted
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"variants": 5},
+        {"seeds": [1, 2], "num_points": BASE_POINTS},
+        {"seed": 1, "sampler": "nope"},
+    ],
+)
+def test_invalid_upsample_requests_start_nothing(api, body):
+    server, engine, client = api
+    source = server.jobs.create(user="u", prompt="a red chair")
+    _finish_base_stage(server, source)
+    assert client.post(f"/api/jobs/{source.id}/upsample", json=body).status_code == 422
+    assert not engine.submitted
+
+
+def _sse(text):
+    """Parse an event stream into (id, event, data) tuples."""
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        events.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_job_streams_progress_previews_and_result(api):
+    server, engine, client = api
+    r = client.post("/api/jobs", json={"prompt": "a red chair", "seed": 3})
+    assert r.status_code == 202
+    job_id = r.json()["job_id"]
+    (req, fut), = engine.submitted
+    assert req.cancel_event is server.jobs.get(job_id).cancel_event
+
+    samples = torch.rand(6, BASE_POINTS) * 2 - 1
+    for step in (1, server.JOB_PREVIEW_EVERY):
+        req.on_progress(Progress(stage=0, num_stages=2, step=step, total_steps=64, samples=samples))
+    assert client.get(f"/api/jobs/{job_id}").json()["step"] == server.JOB_PREVIEW_EVERY
+    pc = PointCloud(coords=np.zeros((4096, 3), dtype=np.float32), channels={c: np.zeros(4096) for c in "RGB"})
+    fut.set_result(pc)
+    assert server.jobs.get(job_id).done.wait(5)
+    server.jobs.get(job_id).upload.result(5)
+
+    events = _sse(client.get(r.json()["events_url"]).text)
+    assert [i for i, _, _ in events] == list(range(len(events)))
+    names = [name for _, name, _ in events]
+    assert names == ["status", "status", "progress", "preview", "result", "status", "upload"]
+    assert [data["status"] for _, name, data in events if name == "status"] == ["queued", "running", "succeeded"]
+    preview = events[3][2]
+    assert preview["step"] == server.JOB_PREVIEW_EVERY and len(preview["points"]) <= server.JOB_PREVIEW_POINTS
+    assert len(preview["points"][0]) == 6  # x, y, z, r, g, b
+    assert events[4][2]["url"].startswith(f"{server.PUBLIC_URL}/api/objects/")
+    assert events[6][2]["status"] == "done"
+
+    # Resuming skips what was already seen.
+    assert _sse(client.get(f"{r.json()['events_url']}?since=5").text) == events[5:]
+
+
+def test_cancelling_a_queued_job(api):
+    server, engine, client = api
+    job_id = client.post("/api/jobs", json={"prompt": "a red chair"}).json()["job_id"]
+    (req, fut), = engine.submitted
+
+    r = client.delete(f"/api/jobs/{job_id}")
+    assert r.status_code == 200 and r.json()["status"] == "cancelled"
+    assert fut.cancelled() and req.cancelled
+    assert client.delete(f"/api/jobs/{job_id}").status_code == 409
+    assert client.delete("/api/jobs/missing").status_code == 404
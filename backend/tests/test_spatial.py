@@ -0,0 +1,90 @@
+# test_spatial.py
+import numpy as np
+import pytest
+
+from point_e.util.point_cloud import PointCloud
+from point_e.util.spatial import SpatialIndex, farthest_point_sample_batch, voxel_grid
+
+
+def _brute_knn(coords, points, k):
+    dists = np.linalg.norm(points[:, None] - coords[None], axis=-1)
+    order = np.argsort(dists, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(dists, order, axis=1), order
+
+
+def _brute_fps(coords, num_points, init_idx):
+    indices = [init_idx]
+    cur = np.full(len(coords), np.inf)
+    for _ in range(num_points - 1):
+        cur = np.minimum(cur, np.sum((coords - coords[indices[-1]]) ** 2, axis=1))
+        indices.append(int(np.argmax(cur)))
+    return np.array(indices)
+
+
+@pytest.mark.parametrize("k", [1, 5])
+def test_knn_matches_brute_force(k):
+    rng = np.random.default_rng(0)
+    coords, points = rng.normal(size=(500, 3)), rng.normal(size=(50, 3))
+    dists, indices = SpatialIndex(coords).knn(points, k=k)
+    expected_dists, expected_indices = _brute_knn(coords, points, k)
+    assert dists.shape == indices.shape == (50, k)
+    np.testing.assert_allclose(dists, expected_dists, rtol=1e-12)
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_array_equal(SpatialIndex(coords).nearest(points), expected_indices[:, 0])
+
+
+def test_knn_max_distance_pads_missing_neighbors():
+    coords = np.array([[0.0, 0, 0], [1, 0, 0], [5, 0, 0]])
+    dists, indices = SpatialIndex(coords).knn(np.zeros((1, 3)), k=3, max_distance=2)
+    np.testing.assert_array_equal(dists, [[0, 1, np.inf]])
+    np.testing.assert_array_equal(indices, [[0, 1, 3]])
+
+
+def test_radius_matches_brute_force():
+    rng = np.random.default_rng(1)
+    coords, points = rng.uniform(size=(400, 3)), rng.uniform(size=(20, 3))
+    r = rng.uniform(0.05, 0.3, size=20)
+    index = SpatialIndex(coords)
+    within = np.linalg.norm(points[:, None] - coords[None], axis=-1) <= r[:, None]
+    for got, row in zip(index.radius(points, r, return_sorted=True), within):
+        np.testing.assert_array_equal(got, np.flatnonzero(row))
+    np.testing.assert_array_equal(index.radius_count(points, r), within.sum(axis=1))
+
+
+def test_fps_batch_matches_single_cloud_loop():
+    rng = np.random.default_rng(2)
+    clouds = [rng.normal(size=(n, 3)) for n in (300, 120, 65, 64)]
+    init_idx = [7, 0, 64, 3]
+    results = farthest_point_sample_batch(clouds, 64, init_idx=init_idx)
+    for cloud, init, got in zip(clouds[:3], init_idx, results):
+        np.testing.assert_array_equal(got, _brute_fps(cloud, 64, init))
+    # Clouds no larger than num_points are returned whole.
+    np.testing.assert_array_equal(results[3], np.arange(64))
+
+
+def test_fps_padding_is_never_selected():
+    rng = np.random.default_rng(3)
+    small, large = rng.normal(size=(20, 3)), rng.normal(size=(200, 3))
+    (got, _) = farthest_point_sample_batch([small, large], 19, init_idx=[5, 0])
+    assert got.max() < 20 and len(set(got.tolist())) == 19
+
+
+def test_voxel_grid_matches_unique_cells():
+    rng = np.random.default_rng(4)
+    coords = rng.uniform(-1, 1, size=(1000, 3))
+    inverse, num_voxels = voxel_grid(coords, 0.25)
+    cells = np.floor((coords - coords.min(axis=0)) / 0.25).astype(np.int64)
+    unique, expected = np.unique(cells, axis=0, return_inverse=True)
+    assert num_voxels == len(unique)
+    np.testing.assert_array_equal(inverse, expected.reshape(-1))
+
+
+def test_point_cloud_rebuilds_index_for_new_coords():
+    rng = np.random.default_rng(5)
+    pc = PointCloud(coords=rng.normal(size=(100, 3)), channels={})
+    index = pc.spatial_index
+    assert pc.spatial_index is index
+    pc.coords = rng.normal(size=(100, 3))
+    assert pc.spatial_index is not index
+    points = rng.normal(size=(10, 3))
+    np.testing.assert_array_equal(pc.nearest_points(points), _brute_knn(pc.coords, points, 1)[1][:, 0])
@@ -0,0 +1,96 @@
+# test_telemetry.py
+import pytest
+
+from app.telemetry import Counter, Gauge, Histogram, Registry, Trace, Tracer, use_traces
+from point_e.util import tracing
+
+
+@pytest.fixture
+def tracer():
+    previous = tracing._tracer
+    tracing.set_tracer(Tracer())
+    yield tracing._tracer
+    tracing.set_tracer(previous)
+
+
+def _series(lines, prefix):
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in lines if line.startswith(prefix)}
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram("t_seconds", "Test", ["span"], buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        h.observe(value, 'a"b')
+    lines = h.render()
+    assert lines[:2] == ["# HELP t_seconds Test", "# TYPE t_seconds histogram"]
+    assert _series(lines, "t_seconds") == {
+        't_seconds_bucket{span="a\\"b",le="0.1"}': 2,  # le is inclusive
+        't_seconds_bucket{span="a\\"b",le="1.0"}': 3,
+        't_seconds_bucket{span="a\\"b",le="+Inf"}': 4,
+        't_seconds_sum{span="a\\"b"}': 3.65,
+        't_seconds_count{span="a\\"b"}': 4,
+    }
+
+
+def test_counter_and_gauge_render():
+    c = Counter("t_total", "Test", ["span"])
+    c.inc(2, "x")
+    c.inc(1, "x")
+    assert c.render()[-1] == 't_total{span="x"} 3'
+    g = Gauge("t_jobs", "Test", lambda: {("queued",): 2, ("running",): None}, labels=["status"])
+    assert g.render()[2:] == ['t_jobs{status="queued"} 2.0']
+    assert Gauge("t_ready", "Test", lambda: True).render()[2:] == ["t_ready 1.0"]
+
+
+def test_drained_metrics_merge_into_another_registry():
+    worker, server = Registry(), Registry()
+    for registry in (worker, server):
+        registry.register(Histogram("t_seconds", "Test", buckets=(1,)))
+        registry.register(Counter("t_total", "Test"))
+    worker.metrics[0].observe(0.5)
+    worker.metrics[1].inc(4)
+    server.metrics[0].observe(2)
+    server.merge(worker.drain())
+    text = server.render()
+    assert 't_seconds_bucket{le="1.0"} 1' in text and 't_seconds_count 2' in text and "t_total 4" in text
+    assert worker.drain() == {"t_seconds": {}, "t_total": {}}
+
+
+def test_spans_are_attributed_to_the_current_traces(tracer):
+    a, b = Trace(), Trace()
+    with use_traces([a, None, b]):
+        for evals in (3, 4):
+            with tracing.span("stage", batch_size=2) as span:
+                span.add("model_evals", evals)
+        with pytest.raises(ValueError):
+            with tracing.span("publish", batch_size=1):
+                raise ValueError
+    with tracing.span("stage"):
+        pass  # no traces: only the metrics see it
+
+    for trace in (a, b):
+        stage = trace.summary()["spans"]["stage"]
+        assert stage["count"] == 2 and stage["model_evals"] == 7 and stage["batch_size"] == 2
+        assert 0 <= stage["max_seconds"] <= stage["seconds"]
+        assert trace.summary()["spans"]["publish"]["error"] == "ValueError"
+
+
+def test_trace_merge_adds_a_remote_summary():
+    local, remote = Trace(), Trace()
+    local.add("stage", 1.0, {"model_evals": 2, "batch_size": 1})
+    remote.add("stage", 3.0, {"model_evals": 5, "batch_size": 4})
+    remote.set(worker=1)
+    local.merge(remote.summary())
+    summary = local.summary()
+    assert summary["worker"] == 1
+    assert summary["spans"]["stage"] == {
+        "count": 2, "seconds": 4.0, "max_seconds": 3.0, "model_evals": 7, "batch_size": 4,
+    }
+
+
+def test_step_spans_are_opt_in(tracer):
+    assert tracing.enabled() and not tracing.steps_enabled()
+    tracing.set_tracer(Tracer(step_spans=True))
+    assert tracing.steps_enabled()
+    tracing.set_tracer(None)
+    assert tracing.span("karras.step") is tracing.NULL_SPAN
@@ -0,0 +1,113 @@
+# test_workers.py
+"""The server side of WorkerPool, with pipes standing in for the zygote and worker processes."""
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import Pipe
+
+import pytest
+import torch
+
+from app.engine import CancelEvent, GenerationCancelled, GenerationRequest
+from app.workers import WorkerPool, _AdapterNames
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(processes=2, device=torch.device("cpu"))
+    pool.adapters = _AdapterNames({})
+    ends = []
+    for worker in pool._workers:
+        worker.conn, end = Pipe()
+        ends.append(end)
+    pool._zygote_conn, zygote = Pipe()
+    return pool, zygote, ends
+
+
+def _zygote_replies(zygote, *replies):
+    def serve():
+        for reply in replies:
+            zygote.recv()
+            zygote.send(reply)
+
+    t = threading.Thread(target=serve, daemon=True)
+    t.start()
+    return t
+
+
+def test_register_adapter_reaches_zygote_and_workers(pool):
+    pool, zygote, ends = pool
+    _zygote_replies(zygote, ("ok", "digest-a"))
+    pool.register_adapter("a", "/adapters/a.pt", alpha=8)
+    for end in ends:
+        assert end.poll(1) and end.recv() == ("adapter", "a", "/adapters/a.pt", 8)
+    assert "a" in pool.adapters and pool.adapters.digest("a") == "digest-a"
+    assert pool.adapter_paths["a"] == "/adapters/a.pt"
+
+
+def test_register_adapter_error_publishes_nothing(pool):
+    pool, zygote, ends = pool
+    _zygote_replies(zygote, ("error", "FileNotFoundError: /adapters/b.pt"))
+    with pytest.raises(ValueError, match="FileNotFoundError"):
+        pool.register_adapter("b", "/adapters/b.pt")
+    assert "b" not in pool.adapters
+    assert not any(end.poll(0.1) for end in ends)
+
+
+@pytest.fixture
+def dispatcher(pool):
+    t = threading.Thread(target=pool[0]._dispatch, daemon=True)
+    t.start()
+    yield pool
+    pool[0]._queue.put_nowait(None)
+    t.join(5)
+
+
+def _submit(pool, cancel_event):
+    fut = Future()
+    pool._queue.put_nowait((GenerationRequest(prompt="a chair", cancel_event=cancel_event), fut))
+    return fut
+
+
+def _recv(ends, timeout=5):
+    """The next message sent to any worker, and which one got it."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for i, end in enumerate(ends):
+            if end.poll(0.01):
+                return i, end.recv()
+    raise AssertionError("no message sent to any worker")
+
+
+def test_cancel_reaches_worker_while_request_is_queued_there(dispatcher):
+    pool, _, ends = dispatcher
+    event = CancelEvent()
+    _submit(pool, event)
+    index, (kind, rid, *_) = _recv(ends)
+    assert kind == "submit"
+    # No progress has come back: the cancel is forwarded by the event itself.
+    event.set()
+    assert ends[index].poll(5) and ends[index].recv() == ("cancel", rid)
+    event.set()
+    assert not ends[index].poll(0.1)  # sent once
+
+
+def test_cancel_before_dispatch_never_reaches_a_worker(dispatcher):
+    pool, _, ends = dispatcher
+    event = CancelEvent()
+    event.set()
+    fut = _submit(pool, event)
+    with pytest.raises(GenerationCancelled):
+        fut.result(5)
+    assert not any(end.poll(0.1) for end in ends)
+
+
+def test_cancel_after_done_is_not_sent(dispatcher):
+    pool, _, ends = dispatcher
+    event = CancelEvent()
+    fut = _submit(pool, event)
+    index, (_, rid, *_) = _recv(ends)
+    pool._on_done(pool._workers[index], rid, "cloud", None, None, {}, (1, 1, None))
+    assert fut.result(5) == "cloud"
+    event.set()
+    assert not ends[index].poll(0.1)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark PointCloud's KD-tree queries and batched farthest point sampling
+against the brute-force implementations they replaced.
+
+For each cloud size N:
+  * nearest:  map Q query points (e.g. marching-cubes vertices) to their
+              closest cloud point, brute force (row-batched distance matrices) vs
+              PointCloud.nearest_points (index build + query);
+  * fps:      select M points with the O(NM) Python loop vs the vectorized
+              spatial.farthest_point_sample_batch;
+  * fps batch: the same for B clouds at once vs B separate loops;
+  * voxel:    PointCloud.voxel_downsample.
+
+Brute-force runs that would exceed --max_brute_pairs distance evaluations are
+timed on a subset of the queries and extrapolated (marked with ~).
+
+    python tools/bench_spatial_index.py --sizes 4096,100000,1000000 --queries 200000
+"""
+import argparse, json, sys, time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "vendor" / "point-e"))
+from point_e.util.point_cloud import PointCloud
+from point_e.util.spatial import farthest_point_sample_batch
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=str, default="4096,100000,1000000")
+    parser.add_argument("--queries", type=int, default=200000, help="query points for nearest")
+    parser.add_argument("--fps_points", type=int, default=1024)
+    parser.add_argument("--fps_batch", type=int, default=8, help="clouds per batched FPS (size 4096)")
+    parser.add_argument("--voxel_size", type=float, default=0.01)
+    parser.add_argument("--max_brute_pairs", type=float, default=2e10)
+    parser.add_argument("--json", type=str, default=None, help="also write results here")
+    return parser.parse_args()
+
+def brute_nearest(coords, points, batch_size=16384):
+    # The previous PointCloud.nearest_points.
+    norms = np.sum(coords**2, axis=-1)
+    out = []
+    for i in range(0, len(points), batch_size):
+        batch = points[i : i + batch_size]
+        dists = norms + np.sum(batch**2, axis=-1)[:, None] - 2 * (batch @ coords.T)
+        out.append(np.argmin(dists, axis=-1))
+    return np.concatenate(out, axis=0)
+
+def loop_fps(coords, num_points, init_idx):
+    # The previous PointCloud.farthest_point_sample.
+    indices = np.zeros([num_points], dtype=np.int64)
+    indices[0] = init_idx
+    sq_norms = np.sum(coords**2, axis=-1)
+    compute = lambda idx: sq_norms + sq_norms[idx] - 2 * (coords @ coords[idx])
+    cur = compute(init_idx)
+    for i in range(1, num_points):
+        idx = np.argmax(cur)
+        indices[i] = idx
+        cur = np.minimum(cur, compute(idx))
+    return indices
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+def surface_cloud(rng, n):
+    # Points near a unit sphere, like a sampled surface rather than a uniform volume.
+    x = rng.normal(size=(n, 3))
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    x += rng.normal(scale=0.01, size=(n, 3))
+    return (x * 0.5).astype(np.float32)
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(0)
+    results = []
+    # Marching-cubes vertices lie on (or near) the sampled surface.
+    queries = surface_cloud(rng, args.queries)
+    for n in [int(s) for s in args.sizes.split(",")]:
+        coords = surface_cloud(rng, n)
+        colors = rng.uniform(size=n).astype(np.float32)
+        row = dict(points=n, queries=args.queries)
+
+        pc = PointCloud(coords=coords, channels=dict(R=colors))
+        idx, t_index = timed(pc.nearest_points, queries)
+        _, t_cached = timed(pc.nearest_points, queries)
+        sub = max(1, min(args.queries, int(args.max_brute_pairs // n)))
+        # The old 16k-row default needs 16384 x N distances (6 GB at N=100k); cap at ~256 MB.
+        brute_batch = max(1, min(16384, 2**26 // n))
+        ref, t_brute = timed(brute_nearest, coords, queries[:sub], brute_batch)
+        t_brute *= args.queries / sub
+        d_new = np.linalg.norm(queries[:sub] - coords[idx[:sub]], axis=1)
+        d_ref = np.linalg.norm(queries[:sub] - coords[ref], axis=1)
+        row.update(
+            nearest_brute_s=t_brute, nearest_brute_extrapolated=sub < args.queries,
+            nearest_index_s=t_index, nearest_cached_s=t_cached,
+            nearest_max_dist_diff=float(np.max(d_new - d_ref)),
+        )
+
+        m = min(args.fps_points, n - 1)
+        ref_fps, t_loop = timed(loop_fps, coords, m, 0)
+        (new_fps,), t_vec = timed(farthest_point_sample_batch, [coords], m, [0])
+        row.update(fps_points=m, fps_loop_s=t_loop, fps_vectorized_s=t_vec,
+                   fps_same_selection=float(np.mean(ref_fps == new_fps)))
+
+        _, t_voxel = timed(pc.voxel_downsample, args.voxel_size)
+        row.update(voxel_s=t_voxel, voxels=len(pc.voxel_downsample(args.voxel_size).coords))
+        results.append(row)
+        print(
+            f"N={n:>8}  nearest: brute {'~' if row['nearest_brute_extrapolated'] else ''}{t_brute:8.3f}s"
+            f"  index {t_index:7.3f}s (cached {t_cached:.3f}s)  x{t_brute / t_index:7.1f}"
+            f"  | fps[{m}]: loop {t_loop:7.3f}s  vectorized {t_vec:7.3f}s"
+            f"  | voxel {t_voxel:.3f}s -> {row['voxels']}"
+        )
+
+    clouds = [surface_cloud(rng, 4096) for _ in range(args.fps_batch)]
+    _, t_loops = timed(lambda: [loop_fps(c, 1024, 0) for c in clouds])
+    _, t_batch = timed(farthest_point_sample_batch, clouds, 1024, [0] * len(clouds))
+    print(f"fps batch of {args.fps_batch} x 4096 -> 1024: loops {t_loops:.3f}s  batched {t_batch:.3f}s")
+    results.append(dict(fps_batch=args.fps_batch, fps_loops_s=t_loops, fps_batched_s=t_batch))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
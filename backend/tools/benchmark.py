@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+"""
+Reproducible speed benchmarks for generation, end to end and per stage.
+
+Suites (--suites, default all):
+  * cold:     a fresh interpreter per model: imports, building the model without
+              weights and materializing it from the memory-mapped checkpoint
+              (load_checkpoint, or a saved copy of random weights with --offline),
+              plus the peak RSS;
+  * clip:     CLIP conditioning (text, image or image grid, per model) by batch size;
+  * sample:   one diffusion stage per model: per-step latency (mean / p50 / p90),
+              the first step (which includes CLIP encoding) and the whole stage;
+  * pipeline: text -> 4096 points with the base40M-textvec + upsample pair, timed per stage;
+  * post:     output_to_point_clouds, PLY / compact PLY / NPZ writing and meshing;
+  * http:     concurrent POST /api/generate against app/server.py, either a live
+              server (--url) or one started in-process (with uvicorn if installed,
+              else through FastAPI's TestClient) on local storage.
+
+The sample and pipeline suites sweep every combination of --models, --batch,
+--steps, --samplers and --threads. Each measurement is repeated --repeat times
+after --warmup untimed runs and the median is reported.
+
+--offline replaces every checkpoint (including CLIP) with random weights, so
+the suites run on a plain CPU box without network access. Latency doesn't
+depend on the weights, but meshing does (a random SDF has no real surface).
+
+Results are JSON; `compare` matches two result files and flags regressions:
+
+    python tools/benchmark.py run --offline --json before.json
+    python tools/benchmark.py run --offline --json after.json
+    python tools/benchmark.py compare before.json after.json --threshold 0.1
+"""
+import argparse, io, itertools, json, os, platform, statistics, subprocess, sys, tempfile, threading, time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+for _path in (BACKEND_DIR / "vendor" / "point-e", BACKEND_DIR):
+    if str(_path) not in sys.path:
+        sys.path.insert(0, str(_path))
+
+SUITES = ("cold", "clip", "sample", "pipeline", "post", "http")
+
+# Conditioning each model family samples with (see point_e.models.transformer).
+CONDITIONING = {
+    "CLIPImagePointDiffusionTransformer": "texts",
+    "CLIPImageGridPointDiffusionTransformer": "images",
+    "CLIPImageGridUpsamplePointDiffusionTransformer": "low_res",
+}
+# The public CLIP architectures, for building them with random weights.
+CLIP_ARCHS = {
+    "ViT-L/14": dict(embed_dim=768, image_resolution=224, vision_layers=24, vision_width=1024,
+                     vision_patch_size=14, context_length=77, vocab_size=49408,
+                     transformer_width=768, transformer_heads=12, transformer_layers=12),
+    "ViT-B/32": dict(embed_dim=512, image_resolution=224, vision_layers=12, vision_width=768,
+                     vision_patch_size=32, context_length=77, vocab_size=49408,
+                     transformer_width=512, transformer_heads=8, transformer_layers=12),
+}
+PROMPT = "a red motorcycle"
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run the benchmarks")
+    run.add_argument("--suites", type=str, default=",".join(SUITES))
+    run.add_argument("--models", type=str, default="base40M-textvec,upsample",
+                     help="e.g. base40M-textvec,base300M,upsample")
+    run.add_argument("--batch", type=str, default="1,4")
+    run.add_argument("--steps", type=str, default="16")
+    run.add_argument("--samplers", type=str, default="heun")
+    run.add_argument("--threads", type=str, default=None, help="torch thread counts (default: torch's)")
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--warmup", type=int, default=1)
+    run.add_argument("--offline", action="store_true", help="random weights, no downloads")
+    run.add_argument("--mesh_grid", type=str, default="64,128")
+    run.add_argument("--http_requests", type=int, default=8)
+    run.add_argument("--http_concurrency", type=int, default=4)
+    run.add_argument("--http_steps", type=int, default=4, help="KARRAS_STEPS of the in-process server")
+    run.add_argument("--url", type=str, default=None, help="benchmark this server instead")
+    run.add_argument("--json", type=str, default=None, help="write results here (default: stdout)")
+
+    compare = sub.add_parser("compare", help="compare two result files")
+    compare.add_argument("baseline", type=str)
+    compare.add_argument("candidate", type=str)
+    compare.add_argument("--threshold", type=float, default=0.1,
+                         help="relative slowdown that counts as a regression")
+
+    # Internal: one cold start, in the interpreter it measures.
+    cold = sub.add_parser("_cold")
+    cold.add_argument("model", type=str)
+    cold.add_argument("--offline", action="store_true")
+    cold.add_argument("--weights", type=str, default=None, help="load this state dict instead of the checkpoint")
+    return parser.parse_args()
+
+def ints(s):
+    return [int(x) for x in s.split(",") if x.strip()]
+
+def names(s):
+    return [x.strip() for x in s.split(",") if x.strip()]
+
+# ------------------------- weights -------------------------
+
+def use_random_clip():
+    """Make clip.load() build the requested architecture with random weights instead of downloading it."""
+    import clip
+    from clip.clip import _transform
+    from clip.model import CLIP
+
+    def load(name, device="cpu", download_root=None, **_):
+        model = CLIP(**CLIP_ARCHS[name]).to(device).eval()
+        return model, _transform(CLIP_ARCHS[name]["image_resolution"])
+
+    clip.load = load
+
+def randomize(model):
+    import torch
+    # The zero-initialized output projections would make every output 0.
+    with torch.no_grad():
+        for p in model.parameters():
+            p.normal_(0.0, 0.02)
+    return model
+
+def random_checkpoint(name, device, cache_dir=None, **_):
+    """A drop-in for point_e.models.download.load_checkpoint with random weights."""
+    import torch
+    from point_e.models.configs import MODEL_CONFIGS, model_from_config
+
+    torch.manual_seed(0)
+    return randomize(model_from_config(MODEL_CONFIGS[name], device)).state_dict()
+
+def go_offline():
+    use_random_clip()
+    import app.engine, app.meshing
+    app.engine.load_checkpoint = random_checkpoint
+    app.meshing.load_checkpoint = random_checkpoint
+
+def load_model(name, device, offline):
+    import torch
+    from point_e.diffusion.configs import DIFFUSION_CONFIGS, diffusion_from_config
+    from point_e.models.configs import MODEL_CONFIGS, model_from_config
+    from point_e.models.download import load_checkpoint
+
+    torch.manual_seed(0)
+    model = model_from_config(MODEL_CONFIGS[name], device)
+    model.eval()
+    if offline:
+        randomize(model)
+    else:
+        model.load_state_dict(load_checkpoint(name, device))
+    return model, diffusion_from_config(DIFFUSION_CONFIGS[name])
+
+# ------------------------- measuring -------------------------
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def repeated(fn, repeat, warmup):
+    """Run fn() warmup + repeat times; return the median of each metric over the timed runs."""
+    for _ in range(warmup):
+        fn()
+    runs = [fn() for _ in range(repeat)]
+    return {k: statistics.median(run[k] for run in runs) for k in runs[0]}
+
+def record(results, suite, params, metrics):
+    results.append(dict(suite=suite, params=params, metrics=metrics))
+    shown = "  ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items())
+    print(f"[{suite}] {json.dumps(params, sort_keys=True)}  {shown}", file=sys.stderr)
+
+def sweep(args):
+    threads = ints(args.threads) if args.threads else [None]
+    return itertools.product(ints(args.batch), ints(args.steps), names(args.samplers), threads)
+
+def set_threads(n):
+    import torch
+    if n:
+        torch.set_num_threads(n)
+    return torch.get_num_threads()
+
+def conditioning(name, model, batch, device):
+    """Model kwargs for one stage of the given model, like the engine passes them."""
+    import numpy as np
+    import torch
+    from PIL import Image
+    from point_e.models.configs import MODEL_CONFIGS
+
+    kind = CONDITIONING.get(MODEL_CONFIGS[name]["name"])
+    if kind == "texts":
+        return dict(texts=[PROMPT] * batch), "texts"
+    if kind == "images":
+        rng = np.random.default_rng(0)
+        image = Image.fromarray(rng.integers(0, 256, (256, 256, 3), dtype=np.uint8))
+        return dict(images=[image] * batch), "images"
+    if kind == "low_res":
+        g = torch.Generator().manual_seed(0)
+        low_res = torch.randn(batch, 6, 1024, generator=g).to(device)
+        return dict(low_res=low_res), "*"
+    raise ValueError(f"don't know how to condition {name}")
+
+def stage_sampler(name, model, diffusion, device, steps, sampler, key_filter):
+    from point_e.diffusion.sampler import PointCloudSampler
+
+    upsample = "upsample" in name
+    return PointCloudSampler(
+        device=device,
+        models=[model],
+        diffusions=[diffusion],
+        num_points=[4096 - 1024 if upsample else 1024],
+        aux_channels=["R", "G", "B"],
+        guidance_scale=[0.0 if upsample else 3.0],
+        use_karras=[True],
+        karras_steps=[steps],
+        karras_sampler=[sampler],
+        sigma_min=[1e-3],
+        sigma_max=[160 if upsample else 120],
+        s_churn=[0 if upsample else 3],
+        model_kwargs_key_filter=[key_filter],
+    )
+
+def step_times(iterator):
+    """Wall time of every item of a progressive sampler, in ms."""
+    times = []
+    t0 = time.perf_counter()
+    for _ in iterator:
+        t1 = time.perf_counter()
+        times.append((t1 - t0) * 1000)
+        t0 = t1
+    return times
+
+# ------------------------- suites -------------------------
+
+def bench_cold(args, results):
+    import torch
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names(args.models):
+            cmd = [sys.executable, __file__, "_cold", name]
+            if args.offline:
+                # Random weights standing in for the cached checkpoint, written out here so
+                # that building them costs the measured interpreter neither time nor memory.
+                use_random_clip()
+                weights = os.path.join(tmp, f"{name}.pt")
+                torch.save(random_checkpoint(name, torch.device("cpu")), weights)
+                cmd += ["--offline", "--weights", weights]
+            def run():
+                out = subprocess.run(cmd, capture_output=True, text=True)
+                if out.returncode:
+                    raise RuntimeError(f"cold start of {name} failed:\n{out.stderr[-4000:]}")
+                return json.loads(out.stdout.strip().splitlines()[-1])
+            record(results, "cold", dict(model=name), repeated(run, args.repeat, 0))
+
+def cold_start(args):
+    t0 = time.perf_counter()
+    import torch
+    t1 = time.perf_counter()
+    from point_e.diffusion.configs import DIFFUSION_CONFIGS, diffusion_from_config
+    from point_e.diffusion.sampler import PointCloudSampler  # noqa: F401
+    from point_e.models.configs import MODEL_CONFIGS, model_from_config
+    from point_e.models.download import load_checkpoint
+    from point_e.models.meta_init import empty_weights
+    from app.telemetry import peak_rss_bytes
+    t2 = time.perf_counter()
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if args.offline:
+        use_random_clip()
+    # The engine's path: no weights until the checkpoint's mapped tensors are assigned.
+    with empty_weights():
+        model = model_from_config(MODEL_CONFIGS[args.model], device)
+    model.eval()
+    diffusion_from_config(DIFFUSION_CONFIGS[args.model])
+    t3 = time.perf_counter()
+    if args.weights:
+        state_dict = torch.load(args.weights, map_location=device, mmap=True, weights_only=True)
+    else:
+        state_dict = load_checkpoint(args.model, device, mmap=True)
+    model.load_state_dict(state_dict, assign=True)
+    t4 = time.perf_counter()
+    print(json.dumps(dict(
+        import_torch_s=t1 - t0, import_point_e_s=t2 - t1, build_model_s=t3 - t2,
+        load_weights_s=t4 - t3, total_s=t4 - t0, peak_rss_mb=(peak_rss_bytes() or 0) / 2**20,
+    )))
+
+def bench_clip(args, models, device, results):
+    import torch
+
+    for name, (model, _) in models.items():
+        if not hasattr(model, "clip"):
+            continue
+        kind = CONDITIONING.get(type(model).__name__)
+        for batch in ints(args.batch):
+            kwargs, _ = conditioning(name, model, batch, device)
+            if kind == "texts":
+                fn = lambda: model.clip.embed_text(kwargs["texts"])
+            elif kind == "images":
+                fn = lambda: model.clip.embed_images_grid(kwargs["images"])
+            else:
+                continue  # the upsampler conditions on points (and a zero grid) only
+            def run():
+                with torch.no_grad():
+                    _, elapsed = timed(fn)
+                return dict(encode_ms=elapsed * 1000, per_item_ms=elapsed * 1000 / batch)
+            record(results, "clip", dict(model=name, kind=kind, batch=batch),
+                   repeated(run, args.repeat, args.warmup))
+
+def bench_sample(args, models, device, results):
+    import torch
+
+    for name, (model, diffusion) in models.items():
+        for batch, steps, sampler_name, threads in sweep(args):
+            threads = set_threads(threads)
+            kwargs, key_filter = conditioning(name, model, batch, device)
+            sampler = stage_sampler(name, model, diffusion, device, steps, sampler_name, key_filter)
+
+            def run():
+                g = [torch.Generator().manual_seed(i) for i in range(batch)]
+                with torch.no_grad():
+                    times = step_times(sampler.sample_batch_progressive(batch, kwargs, generators=g))
+                # Every solver yields once per step, then the final sample (no model call).
+                steps_ms = times[:-1] or times
+                rest = steps_ms[1:] or steps_ms
+                return dict(
+                    stage_s=sum(times) / 1000, first_step_ms=steps_ms[0],
+                    step_ms_mean=statistics.mean(rest), step_ms_p50=percentile(rest, 0.5),
+                    step_ms_p90=percentile(rest, 0.9), rows_per_s=batch * 1000 / sum(times),
+                )
+            params = dict(model=name, batch=batch, steps=steps, sampler=sampler_name, threads=threads)
+            record(results, "sample", params, repeated(run, args.repeat, args.warmup))
+
+def bench_pipeline(args, device, results):
+    import torch
+    from point_e.diffusion.sampler import PointCloudSampler
+
+    base, base_diffusion = load_model("base40M-textvec", device, args.offline)
+    up, up_diffusion = load_model("upsample", device, args.offline)
+    for batch, steps, sampler_name, threads in sweep(args):
+        threads = set_threads(threads)
+        sampler = PointCloudSampler(
+            device=device,
+            models=[base, up],
+            diffusions=[base_diffusion, up_diffusion],
+            num_points=[1024, 4096 - 1024],
+            aux_channels=["R", "G", "B"],
+            guidance_scale=[3.0, 0.0],
+            use_karras=[True, True],
+            karras_steps=[steps, steps],
+            karras_sampler=[sampler_name],
+            model_kwargs_key_filter=("texts", ""),
+        )
+
+        def run():
+            g = [torch.Generator().manual_seed(i) for i in range(batch)]
+            kwargs = dict(texts=[PROMPT] * batch)
+            with torch.no_grad():
+                low_res, base_s = timed(sampler.sample_batch, batch, kwargs, generators=g, end_stage=1)
+                out, up_s = timed(sampler.sample_batch, batch, kwargs, generators=g,
+                                  start_stage=1, low_res=low_res)
+                _, post_s = timed(sampler.output_to_point_clouds, out)
+            total = base_s + up_s + post_s
+            return dict(base_s=base_s, upsample_s=up_s, post_s=post_s, total_s=total,
+                        points_per_s=batch * out.shape[-1] / total)
+        params = dict(batch=batch, steps=steps, sampler=sampler_name, threads=threads)
+        record(results, "pipeline", params, repeated(run, args.repeat, args.warmup))
+
+def bench_post(args, device, results):
+    import numpy as np
+    import torch
+    from point_e.util.pc_to_mesh import sparse_marching_cubes_mesh
+    from app.meshing import Mesher, decimate
+
+    # Only the output conversion is used; no model runs.
+    sampler = stage_sampler("upsample", None, None, device, 2, "heun", "*")
+    for batch in ints(args.batch):
+        g = torch.Generator().manual_seed(0)
+        output = torch.rand(batch, 6, 4096, generator=g) * torch.tensor([1, 1, 1, 255, 255, 255])[:, None]
+        output[:, :3] -= 0.5
+
+        def run():
+            pcs, convert_s = timed(sampler.output_to_point_clouds, output.to(device))
+            _, ply_s = timed(lambda: [pc.write_ply(io.BytesIO()) for pc in pcs])
+            _, compact_s = timed(lambda: [pc.write_compact_ply(io.BytesIO()) for pc in pcs])
+            _, npz_s = timed(lambda: [pc.save(io.BytesIO(), compressed=True) for pc in pcs])
+            return dict(to_point_clouds_ms=convert_s * 1000, write_ply_ms=ply_s * 1000,
+                        write_compact_ply_ms=compact_s * 1000, save_npz_ms=npz_s * 1000)
+        record(results, "post", dict(batch=batch, points=4096), repeated(run, args.repeat, args.warmup))
+
+    if args.offline:
+        go_offline()
+    mesher = Mesher(device=device)
+    _, load_s = timed(mesher.load)
+    pc = sampler.output_to_point_clouds(output[:1].to(device))[0]
+    rng = np.random.default_rng(0)
+    sphere = rng.normal(size=(4096, 3))
+    pc.coords = (0.4 * sphere / np.linalg.norm(sphere, axis=1, keepdims=True)).astype(np.float32)
+    for grid_size in ints(args.mesh_grid):
+        def run():
+            mesh, mesh_s = timed(sparse_marching_cubes_mesh, pc, mesher.model, grid_size=grid_size)
+            small, decimate_s = timed(decimate, mesh, mesher.target_faces)
+            buf = io.BytesIO()
+            _, glb_s = timed(small.write_glb, buf)
+            return dict(mesh_s=mesh_s, decimate_s=decimate_s, write_glb_ms=glb_s * 1000,
+                        faces=len(mesh.faces), glb_bytes=len(buf.getvalue()))
+        metrics = repeated(run, args.repeat, args.warmup)
+        record(results, "post", dict(mesh_grid=grid_size), dict(sdf_load_s=load_s, **metrics))
+
+def start_server(args):
+    """Start app/server.py in-process on local storage; returns (post(path, body), transport, stop())."""
+    os.environ.setdefault("KARRAS_STEPS", str(args.http_steps))
+    os.environ.setdefault("ARTIFACTS_DIR", tempfile.mkdtemp(prefix="bench-artifacts-"))
+    os.environ.setdefault("STORAGE_BACKEND", "local")
+    os.environ.setdefault("STORAGE_LOCAL_DIR", tempfile.mkdtemp(prefix="bench-objects-"))
+    if args.offline:
+        go_offline()
+    import app.server as server
+    try:
+        import uvicorn
+    except ImportError:
+        uvicorn = None
+    if uvicorn is None:
+        from fastapi.testclient import TestClient
+
+        client = TestClient(server.app)
+        client.__enter__()
+        post = lambda path, body: client.post(path, json=body).status_code
+        get = lambda path: client.get(path)
+        return post, get, "testclient", lambda: client.__exit__(None, None, None)
+
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    srv = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=srv.run, daemon=True)
+    thread.start()
+    while not srv.started:
+        time.sleep(0.05)
+    url = f"http://127.0.0.1:{port}"
+    post, get = http_client(url)
+
+    def stop():
+        srv.should_exit = True
+        thread.join(10)
+    return post, get, "uvicorn", stop
+
+def http_client(url):
+    import urllib.error
+    import urllib.request
+
+    class _Response:
+        def __init__(self, status, body):
+            self.status_code = status
+            self._body = body
+
+        def json(self):
+            return json.loads(self._body or b"null")
+
+    def request(path, body=None):
+        data = None if body is None else json.dumps(body).encode()
+        req = urllib.request.Request(url.rstrip("/") + path, data=data,
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=3600) as resp:
+                return _Response(resp.status, resp.read())
+        except urllib.error.HTTPError as e:
+            return _Response(e.code, e.read())
+
+    return (lambda path, body: request(path, body).status_code), (lambda path: request(path))
+
+def bench_http(args, results):
+    if args.url:
+        post, get = http_client(args.url)
+        transport, stop = "remote", lambda: None
+    else:
+        post, get, transport, stop = start_server(args)
+    try:
+        while get("/readyz").status_code != 200:
+            time.sleep(0.5)
+
+        def one(i, latencies, statuses):
+            # Distinct seeds: every request is sampled, never served from the cache.
+            body = dict(prompt=PROMPT, seed=int(time.time() * 1000) % 2**31 + i)
+            status, elapsed = timed(post, "/api/generate", body)
+            latencies.append(elapsed)
+            statuses.append(status)
+
+        def run():
+            latencies, statuses = [], []
+            t0 = time.perf_counter()
+            for chunk in range(0, args.http_requests, args.http_concurrency):
+                workers = [
+                    threading.Thread(target=one, args=(i, latencies, statuses))
+                    for i in range(chunk, min(chunk + args.http_concurrency, args.http_requests))
+                ]
+                for w in workers:
+                    w.start()
+                for w in workers:
+                    w.join()
+            wall = time.perf_counter() - t0
+            return dict(
+                requests_per_s=len(latencies) / wall, latency_s_p50=percentile(latencies, 0.5),
+                latency_s_p90=percentile(latencies, 0.9), errors=sum(s != 200 for s in statuses),
+            )
+        metrics = repeated(run, args.repeat, args.warmup)
+        engine = (get("/healthz").json() or {}).get("engine", {})
+        metrics["mean_batch_size"] = engine.get("mean_batch_size")
+        params = dict(transport=transport, requests=args.http_requests,
+                      concurrency=args.http_concurrency,
+                      steps=None if args.url else int(os.environ["KARRAS_STEPS"].split(",")[0]))
+        record(results, "http", params, metrics)
+    finally:
+        stop()
+
+# ------------------------- run / compare -------------------------
+
+def metadata(args):
+    import torch
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return dict(
+        created=time.strftime("%Y-%m-%dT%H:%M:%S%z"), commit=commit, python=platform.python_version(),
+        torch=torch.__version__, platform=platform.platform(), cpus=os.cpu_count(),
+        torch_threads=torch.get_num_threads(), cuda=torch.cuda.is_available(),
+        args={k: v for k, v in vars(args).items() if k != "command"},
+    )
+
+def run(args):
+    import torch
+
+    suites = names(args.suites)
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        raise SystemExit(f"unknown suites {sorted(unknown)}; expected some of {SUITES}")
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    meta = metadata(args)
+    results = []
+    if "cold" in suites:
+        bench_cold(args, results)
+    if args.offline:
+        use_random_clip()
+    if "clip" in suites or "sample" in suites:
+        models = {name: load_model(name, device, args.offline) for name in names(args.models)}
+        if "clip" in suites:
+            bench_clip(args, models, device, results)
+        if "sample" in suites:
+            bench_sample(args, models, device, results)
+        del models
+    if "pipeline" in suites:
+        bench_pipeline(args, device, results)
+    if "post" in suites:
+        bench_post(args, device, results)
+    if "http" in suites:
+        bench_http(args, results)
+
+    doc = json.dumps(dict(meta=meta, results=results), indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(doc)
+    else:
+        print(doc)
+
+def direction(metric):
+    """+1 if higher is better, -1 if lower is better, 0 if the metric isn't a speed or size."""
+    if metric.endswith("_per_s"):
+        return 1
+    if metric.endswith(("_s", "_ms", "_mb")) or "_s_p" in metric or "_ms_" in metric:
+        return -1
+    return 0
+
+def compare(args):
+    def load(path):
+        with open(path) as f:
+            doc = json.load(f)
+        return {(r["suite"], json.dumps(r["params"], sort_keys=True)): r["metrics"] for r in doc["results"]}
+
+    before, after = load(args.baseline), load(args.candidate)
+    regressions = 0
+    for key in sorted(before.keys() & after.keys()):
+        suite, params = key
+        lines = []
+        for metric, old in before[key].items():
+            new = after[key].get(metric)
+            sign = direction(metric)
+            if not sign or not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+                continue
+            change = (new - old) / abs(old)
+            worse = -sign * change > args.threshold
+            better = sign * change > args.threshold
+            regressions += worse
+            flag = "REGRESSION" if worse else ("improved" if better else "")
+            lines.append(f"    {metric:<22} {old:12.4g} -> {new:12.4g}  {change:+7.1%}  {flag}")
+        print(f"[{suite}] {params}")
+        print("\n".join(lines))
+    for key in sorted(before.keys() ^ after.keys()):
+        print(f"[{key[0]}] {key[1]}  only in {'baseline' if key in before else 'candidate'}")
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    if regressions:
+        raise SystemExit(1)
+
+def main():
+    args = parse_args()
+    if args.command == "_cold":
+        cold_start(args)
+    elif args.command == "compare":
+        compare(args)
+    else:
+        run(args)
+
+if __name__ == "__main__":
+    main()
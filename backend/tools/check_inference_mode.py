@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Parity and per-forward latency of the inference-optimized transformer path
+(point_e.models.inference.optimize_for_inference) against the reference path.
+
+For each model, the same weights and inputs are run through the reference
+module and through every requested variant; the script reports the max and
+relative error of the output and the mean latency per forward.
+
+Runs offline with random weights by default; --pretrained loads checkpoints.
+
+    python tools/check_inference_mode.py --models base40M-textvec,upsample --batch 2
+"""
+import argparse, copy, json, time
+import torch
+
+from point_e.models.configs import MODEL_CONFIGS, model_from_config
+from point_e.models.download import load_checkpoint
+from point_e.models.inference import optimize_for_inference
+
+VARIANTS = {
+    "fused": dict(),
+    "bf16": dict(dtype="bfloat16"),
+    "int8": dict(quantize=True),
+    "trace": dict(compile="trace"),
+    "inductor": dict(compile="inductor"),
+}
+# Outputs may drift this much (relative L2) before a variant counts as a mismatch.
+TOLERANCE = {"fused": 1e-4, "trace": 1e-4, "inductor": 1e-4, "bf16": 5e-2, "int8": 5e-2}
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", type=str, default="base40M-textvec,base300M,upsample")
+    parser.add_argument("--variants", type=str, default="fused,bf16,int8,trace")
+    parser.add_argument("--batch", type=int, default=2, help="rows per forward (x2 under guidance)")
+    parser.add_argument("--iters", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--pretrained", action="store_true")
+    parser.add_argument("--json", type=str, default=None, help="also write results here")
+    return parser.parse_args()
+
+def make_model(name, device, pretrained):
+    torch.manual_seed(0)
+    model = model_from_config(MODEL_CONFIGS[name], device)
+    model.eval()
+    if pretrained:
+        model.load_state_dict(load_checkpoint(name, device))
+    else:
+        # The zero-initialized output projection would make every output 0.
+        with torch.no_grad():
+            for p in model.parameters():
+                p.normal_(0.0, 0.02)
+    return model
+
+def make_inputs(name, model, batch, device):
+    g = torch.Generator().manual_seed(1)
+    config = MODEL_CONFIGS[name]
+    x = torch.randn(batch, config["input_channels"], model.n_ctx, generator=g).to(device)
+    t = torch.randint(0, 1024, (batch,), generator=g).to(device)
+    kwargs = {}
+    if config["name"] == "CLIPImagePointDiffusionTransformer":
+        kwargs["embeddings"] = list(torch.randn(batch, model.clip.feature_dim, generator=g).to(device))
+    elif "Grid" in config["name"]:
+        grid = (batch, model.clip.grid_feature_dim, model.clip.grid_size**2)
+        kwargs["embeddings"] = torch.randn(*grid, generator=g).to(device)
+    if "Upsample" in config["name"]:
+        kwargs["low_res"] = torch.randn(batch, config["input_channels"], 1024, generator=g).to(device)
+    return x, t, kwargs
+
+def latency(model, x, t, kwargs, iters):
+    with torch.no_grad():
+        out = model(x, t, **kwargs)  # warm-up (and trace/compile)
+        t0 = time.perf_counter()
+        for _ in range(iters):
+            model(x, t, **kwargs)
+    return out, (time.perf_counter() - t0) / iters
+
+def main():
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    results = []
+    for name in args.models.split(","):
+        reference = make_model(name, device, args.pretrained)
+        x, t, kwargs = make_inputs(name, reference, args.batch, device)
+        ref_out, ref_time = latency(reference, x, t, kwargs, args.iters)
+        print(f"{name}: reference {ref_time * 1000:.1f} ms/forward")
+        results.append(dict(model=name, variant="reference", ms=ref_time * 1000))
+        for variant in args.variants.split(","):
+            options = VARIANTS[variant]
+            if options.get("quantize") and device.type != "cpu":
+                continue
+            model = copy.deepcopy(reference)
+            optimize_for_inference(model, **options)
+            out, elapsed = latency(model, x, t, kwargs, args.iters)
+            max_err = (out - ref_out).abs().max().item()
+            rel_err = ((out - ref_out).norm() / ref_out.norm()).item()
+            ok = rel_err <= TOLERANCE[variant]
+            print(
+                f"  {variant:<9} {elapsed * 1000:8.1f} ms  x{ref_time / elapsed:4.2f}"
+                f"  max_err={max_err:.2e} rel_err={rel_err:.2e} {'ok' if ok else 'MISMATCH'}"
+            )
+            results.append(dict(model=name, variant=variant, ms=elapsed * 1000,
+                                speedup=ref_time / elapsed, max_err=max_err, rel_err=rel_err, ok=ok))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if not all(r.get("ok", True) for r in results):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
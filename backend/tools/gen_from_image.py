@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 import os, sys, numpy as np, torch
 from PIL import Image
-from plyfile import PlyData, PlyElement
 
 from point_e.diffusion.configs import DIFFUSION_CONFIGS, diffusion_from_config
 from point_e.diffusion.sampler import PointCloudSampler
+from point_e.models.clip_cache import cache_clip_embeddings
 from point_e.models.configs import MODEL_CONFIGS, model_from_config
 from point_e.models.download import load_checkpoint
 
@@ -17,21 +17,6 @@ def load_image_grid(path, size=224):
     img = Image.open(path).convert("RGB").resize((size, size))
     return [img]  # flat list (grid of 1 image)
 
-def write_ply(path, coords_f32, colors_u8):
-    assert coords_f32.shape[1] == 3 and colors_u8.shape[1] == 3
-    verts = np.empty(coords_f32.shape[0], dtype=[
-        ('x','f4'),('y','f4'),('z','f4'),
-        ('red','u1'),('green','u1'),('blue','u1')
-    ])
-    verts['x'] = coords_f32[:,0]
-    verts['y'] = coords_f32[:,1]
-    verts['z'] = coords_f32[:,2]
-    verts['red']   = colors_u8[:,0]
-    verts['green'] = colors_u8[:,1]
-    verts['blue']  = colors_u8[:,2]
-    el = PlyElement.describe(verts, 'vertex')
-    PlyData([el], text=True).write(path)  # ASCII PLY
-
 def main():
     img_path = os.environ.get("POINT_E_IMAGE", "").strip()
     out_dir  = os.environ.get("POINT_E_OUT", "backend/data/outputs/pointclouds")
@@ -53,14 +38,19 @@ def main():
     base_diff  = diffusion_from_config(DIFFUSION_CONFIGS[base_name])
     base_model.load_state_dict(load_checkpoint(base_name, device))
 
-    # Optional image-cond LoRA
+    # Optional image-cond LoRA, merged into the base weights (no per-step cost)
     lora_path = os.environ.get("POINT_E_LORA_IMAGE", "").strip()
     if lora_path:
-        from lora.inject import inject_lora
-        base_model = inject_lora(base_model, r=16, alpha=16, dropout=0.0, verbose=False)
-        sd = torch.load(lora_path, map_location="cpu")
-        base_model.load_state_dict(sd, strict=False)
-        print(f"[LoRA] loaded image-cond adapter: {lora_path}")
+        from lora.registry import AdapterRegistry
+        adapters = AdapterRegistry(base_model)
+        adapters.register("image", lora_path, alpha=16)
+        adapters.activate("image")
+        print(f"[LoRA] merged image-cond adapter: {lora_path}")
+
+    # Optional on-disk memo of CLIP image grids (skips the ViT pass for images seen before)
+    clip_cache_dir = os.environ.get("POINT_E_CLIP_CACHE_DIR", "").strip()
+    if clip_cache_dir:
+        cache_clip_embeddings(base_model, cache_dir=clip_cache_dir)
 
     up_model = model_from_config(MODEL_CONFIGS[upsampler_name], device); up_model.eval()
     up_diff  = diffusion_from_config(DIFFUSION_CONFIGS[upsampler_name])
@@ -84,11 +74,9 @@ def main():
         last = x
 
     pc = sampler.output_to_point_clouds(last)[0]
-    coords = pc.coords.astype(np.float32)
-    colors = np.stack([pc.channels['R'], pc.channels['G'], pc.channels['B']], axis=1).astype(np.uint8)
-
-    write_ply(out_path, coords, colors)
-    print("Saved:", out_path, "points:", len(coords))
+    with open(out_path, "wb") as f:
+        pc.write_ply(f)  # binary PLY, colours rescaled to 0..255
+    print("Saved:", out_path, "points:", len(pc.coords))
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import os, numpy as np, torch
-from plyfile import PlyData, PlyElement
 from point_e.diffusion.configs import DIFFUSION_CONFIGS, diffusion_from_config
 from point_e.diffusion.sampler import PointCloudSampler
 from point_e.models.configs import MODEL_CONFIGS, model_from_config
@@ -11,16 +10,6 @@ def get_device():
     if torch.backends.mps.is_available(): return torch.device("mps")
     return torch.device("cpu")
 
-def write_ply(path, coords_f32, colors_u8):
-    verts = np.empty(coords_f32.shape[0], dtype=[
-        ('x','f4'),('y','f4'),('z','f4'),
-        ('red','u1'),('green','u1'),('blue','u1')
-    ])
-    verts['x'], verts['y'], verts['z'] = coords_f32[:,0], coords_f32[:,1], coords_f32[:,2]
-    verts['red'], verts['green'], verts['blue'] = colors_u8[:,0], colors_u8[:,1], colors_u8[:,2]
-    el = PlyElement.describe(verts, 'vertex')
-    PlyData([el], text=True).write(path)
-
 def main():
     prompt = os.environ.get("POINT_E_PROMPT", "a bonsai tree in a pot")
     out_dir = os.environ.get("POINT_E_OUT", "backend/data/outputs/pointclouds")
@@ -56,10 +45,9 @@ def main():
         last = x
 
     pc = sampler.output_to_point_clouds(last)[0]
-    coords = pc.coords.astype(np.float32)
-    colors = np.stack([pc.channels['R'], pc.channels['G'], pc.channels['B']], axis=1).astype(np.uint8)
-    write_ply(out_path, coords, colors)
-    print("Saved:", out_path, "points:", len(coords))
+    with open(out_path, "wb") as f:
+        pc.write_ply(f)  # binary PLY, colours rescaled to 0..255
+    print("Saved:", out_path, "points:", len(pc.coords))
 
 if __name__ == "__main__":
     main()
@@ -61,50 +61,110 @@ const ImageGeneratorPage = () => {
     document.body.removeChild(link);
   };
 
-  // Simple PLY parser for basic geometry
+  // PLY parser (ASCII, binary little endian or 16-bit quantized) for basic geometry
   const parsePLY = async (url) => {
     try {
+      // Binary PLY (and the gzip'd compact variant, which the browser inflates
+      // transparently via Content-Encoding) is read straight from the buffer.
       const response = await fetch(url);
-      const text = await response.text();
-      const lines = text.split('\n');
-      
-      let vertexCount = 0;
-      let faceCount = 0;
-      let headerEnded = false;
-      const vertices = [];
-      const faces = [];
-      
-      for (let i = 0; i < lines.length; i++) {
-        const line = lines[i].trim();
-        
-        if (line === 'end_header') {
-          headerEnded = true;
-          continue;
+      const buffer = await response.arrayBuffer();
+      const bytes = new Uint8Array(buffer);
+
+      const head = new TextDecoder('latin1').decode(bytes.subarray(0, 4096));
+      const marker = head.indexOf('end_header');
+      if (marker < 0) throw new Error('missing end_header');
+      const headerEnd = head.indexOf('\n', marker) + 1;
+      const header = head.slice(0, headerEnd);
+      let format = 'ascii';
+      let quantize = null;
+      const elements = [];
+      for (const raw of header.split('\n')) {
+        const parts = raw.trim().split(/\s+/);
+        if (parts[0] === 'format') {
+          format = parts[1];
+        } else if (parts[0] === 'comment' && parts[1] === 'quantize') {
+          // 16-bit coords: value * scale + offset (see ply_util.write_compact_ply)
+          quantize = parts.slice(2, 6).map(parseFloat);
+        } else if (parts[0] === 'element') {
+          elements.push({ name: parts[1], count: parseInt(parts[2]), props: [] });
+        } else if (parts[0] === 'property') {
+          const el = elements[elements.length - 1];
+          if (parts[1] === 'list') {
+            el.props.push({ name: parts[4], list: true, countType: parts[2], type: parts[3] });
+          } else {
+            el.props.push({ name: parts[2], type: parts[1] });
+          }
         }
-        
-        if (!headerEnded) {
-          if (line.startsWith('element vertex')) {
-            vertexCount = parseInt(line.split(' ')[2]);
-          } else if (line.startsWith('element face')) {
-            faceCount = parseInt(line.split(' ')[2]);
+      }
+
+      const vertexEl = elements.find((el) => el.name === 'vertex') || { count: 0, props: [] };
+      const faceEl = elements.find((el) => el.name === 'face') || { count: 0, props: [] };
+      const vertices = new Float32Array(vertexEl.count * 3);
+      const faces = [];
+      const axes = ['x', 'y', 'z'].map((a) => vertexEl.props.findIndex((p) => p.name === a));
+
+      if (format === 'ascii') {
+        const lines = new TextDecoder().decode(bytes.subarray(headerEnd)).split('\n');
+        let line = 0;
+        for (const el of elements) {
+          for (let i = 0; i < el.count; i++, line++) {
+            const values = lines[line].trim().split(/\s+/).map(Number);
+            if (el === vertexEl) {
+              for (let a = 0; a < 3; a++) vertices[i * 3 + a] = values[axes[a]];
+            } else if (el === faceEl && values[0] === 3) {
+              faces.push(values[1], values[2], values[3]);
+            }
           }
-          continue;
         }
-        
-        if (vertices.length < vertexCount) {
-          const coords = line.split(' ').map(parseFloat);
-          if (coords.length >= 3) {
-            vertices.push(coords[0], coords[1], coords[2]);
+      } else if (format === 'binary_little_endian') {
+        const view = new DataView(buffer);
+        const sizes = { char: 1, uchar: 1, int8: 1, uint8: 1, short: 2, ushort: 2, int16: 2, uint16: 2,
+          int: 4, uint: 4, int32: 4, uint32: 4, float: 4, float32: 4, double: 8, float64: 8 };
+        const read = (type, offset) => {
+          switch (type) {
+            case 'char': case 'int8': return view.getInt8(offset);
+            case 'uchar': case 'uint8': return view.getUint8(offset);
+            case 'short': case 'int16': return view.getInt16(offset, true);
+            case 'ushort': case 'uint16': return view.getUint16(offset, true);
+            case 'int': case 'int32': return view.getInt32(offset, true);
+            case 'uint': case 'uint32': return view.getUint32(offset, true);
+            case 'double': case 'float64': return view.getFloat64(offset, true);
+            default: return view.getFloat32(offset, true);
           }
-        } else if (faces.length < faceCount * 4) {
-          const faceData = line.split(' ').map(parseInt);
-          if (faceData.length >= 4 && faceData[0] === 3) {
-            faces.push(faceData[1], faceData[2], faceData[3]);
+        };
+        let offset = headerEnd;
+        for (const el of elements) {
+          for (let i = 0; i < el.count; i++) {
+            const values = [];
+            for (const prop of el.props) {
+              if (prop.list) {
+                const n = read(prop.countType, offset);
+                offset += sizes[prop.countType];
+                const items = [];
+                for (let k = 0; k < n; k++, offset += sizes[prop.type]) items.push(read(prop.type, offset));
+                values.push(items);
+              } else {
+                values.push(read(prop.type, offset));
+                offset += sizes[prop.type];
+              }
+            }
+            if (el === vertexEl) {
+              for (let a = 0; a < 3; a++) vertices[i * 3 + a] = values[axes[a]];
+            } else if (el === faceEl && values[0].length === 3) {
+              faces.push(...values[0]);
+            }
           }
         }
+      } else {
+        throw new Error(`unsupported PLY format: ${format}`);
       }
-      
-      return { vertices: new Float32Array(vertices), indices: new Uint32Array(faces) };
+
+      if (quantize) {
+        const [scale, ...origin] = quantize;
+        for (let i = 0; i < vertices.length; i++) vertices[i] = vertices[i] * scale + origin[i % 3];
+      }
+
+      return { vertices, indices: new Uint32Array(faces) };
     } catch (error) {
       console.error('Error parsing PLY file:', error);
       return null;